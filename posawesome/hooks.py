@@ -14,6 +14,9 @@ app_license = "GPLv3"
 
 
 
+after_install = "posawesome.install.after_install"
+
+
 app_include_js = [
     "posawesome.bundle.js",
 ]
@@ -29,13 +32,91 @@ doctype_js = {
 
 doc_events = {
     "Sales Invoice": {
+        "autoname": "posawesome.posawesome.api.invoice_naming.autoname_from_block",
+        "validate": "posawesome.posawesome.api.returned_qty.validate_returned_qty",
+        "on_submit": "posawesome.posawesome.api.returned_qty.on_return_submit",
         "before_cancel": "posawesome.posawesome.api.before_cancel.before_cancel",
+        "on_cancel": "posawesome.posawesome.api.returned_qty.on_return_cancel",
+    },
+    "Item": {
+        "on_update": [
+            "posawesome.posawesome.api.item_cache.on_item_change",
+            "posawesome.posawesome.api.item_search.on_item_change",
+        ],
+        "on_trash": [
+            "posawesome.posawesome.api.item_cache.on_item_change",
+            "posawesome.posawesome.api.item_search.on_item_trash",
+        ],
+        "after_rename": [
+            "posawesome.posawesome.api.item_cache.on_item_change",
+            "posawesome.posawesome.api.item_search.on_item_change",
+        ],
+    },
+    "Item Price": {
+        "on_update": [
+            "posawesome.posawesome.api.item_cache.on_item_price_change",
+            "posawesome.posawesome.api.item_price.on_item_price_change",
+        ],
+        "on_trash": [
+            "posawesome.posawesome.api.item_cache.on_item_price_change",
+            "posawesome.posawesome.api.item_price.on_item_price_change",
+        ],
+    },
+    "POS Profile": {
+        "on_update": [
+            "posawesome.posawesome.api.barcode_rules.on_pos_profile_change",
+            "posawesome.posawesome.api.invoice_template.on_template_source_change",
+            "posawesome.posawesome.api.offer_index.on_offer_source_change",
+        ],
+        "on_trash": [
+            "posawesome.posawesome.api.barcode_rules.on_pos_profile_change",
+            "posawesome.posawesome.api.invoice_template.on_template_source_change",
+            "posawesome.posawesome.api.offer_index.on_offer_source_change",
+        ],
+    },
+    "POS Offer": {
+        "on_update": "posawesome.posawesome.api.offer_index.on_offer_source_change",
+        "on_trash": "posawesome.posawesome.api.offer_index.on_offer_source_change",
+    },
+    "Sales Taxes and Charges Template": {
+        "on_update": "posawesome.posawesome.api.invoice_template.on_template_source_change",
+        "on_trash": "posawesome.posawesome.api.invoice_template.on_template_source_change",
+    },
+    "Mode of Payment": {
+        "on_update": "posawesome.posawesome.api.invoice_template.on_template_source_change",
+        "on_trash": "posawesome.posawesome.api.invoice_template.on_template_source_change",
+    },
+    "Company": {
+        "on_update": "posawesome.posawesome.api.invoice_template.on_template_source_change",
+    },
+    "Account": {
+        "on_update": "posawesome.posawesome.api.invoice_template.on_template_source_change",
+        "on_trash": "posawesome.posawesome.api.invoice_template.on_template_source_change",
+    },
+    "POS Closing Shift": {
+        "on_submit": "posawesome.posawesome.api.invoice_naming.on_closing_shift_submit",
+    },
+    "Item Group": {
+        "on_update": "posawesome.posawesome.api.item_cache.on_item_group_change",
+        "on_trash": "posawesome.posawesome.api.item_cache.on_item_group_change",
+        "after_rename": "posawesome.posawesome.api.item_cache.on_item_group_change",
+    },
+    "Stock Ledger Entry": {
+        "on_submit": "posawesome.posawesome.api.item_cache.on_stock_ledger_change",
+        "on_cancel": "posawesome.posawesome.api.item_cache.on_stock_ledger_change",
     },
 }
 
 
 
 
+scheduler_events = {
+    "all": [
+        "posawesome.posawesome.api.item_cache.flush_stock_push",
+        "posawesome.posawesome.api.sales_invoice.requeue_stale_invoices",
+    ],
+}
+
 
 fixtures = [
     {"doctype": "Custom Field", "filters": [["module", "=", "POSAwesome"]]},
@@ -0,0 +1,6 @@
+from posawesome.posawesome.api.item_search import enqueue_search_index_rebuild
+
+
+def after_install():
+    """Patches are marked done on install - backfill what they would have built"""
+    enqueue_search_index_rebuild()
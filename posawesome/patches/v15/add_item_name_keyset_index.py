@@ -0,0 +1,6 @@
+import frappe
+
+
+def execute():
+    """Composite index backing keyset pagination of POS items on (item_name, name)"""
+    frappe.db.add_index("Item", ["item_name", "name"], index_name="posa_item_name_keyset_index")
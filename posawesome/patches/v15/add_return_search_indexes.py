@@ -0,0 +1,10 @@
+import frappe
+
+
+def execute():
+    """Composite index backing the POS return search (company filter, newest first)"""
+    frappe.db.add_index(
+        "Sales Invoice",
+        ["company", "docstatus", "is_return", "posting_date"],
+        index_name="posa_return_search_index"
+    )
@@ -0,0 +1,37 @@
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_field
+
+
+def execute():
+    """Fill Sales Invoice Item.posa_returned_qty from the submitted returns made so far"""
+    # Fixtures sync after post_model_sync patches - create the column first
+    # (no-op when it exists; the fixture sync brings it to its full definition)
+    create_custom_field(
+        "Sales Invoice Item",
+        {
+            "fieldname": "posa_returned_qty",
+            "label": "posa_returned_qty",
+            "fieldtype": "Float",
+            "insert_after": "stock_qty",
+            "no_copy": 1,
+            "print_hide": 1,
+            "read_only": 1,
+        },
+    )
+
+    frappe.db.sql(
+        """
+        UPDATE `tabSales Invoice Item` original
+        INNER JOIN (
+            SELECT return_item.sales_invoice_item, SUM(ABS(return_item.stock_qty)) AS stock_qty
+            FROM `tabSales Invoice Item` return_item
+            INNER JOIN `tabSales Invoice` return_invoice
+                ON return_invoice.name = return_item.parent
+            WHERE return_invoice.docstatus = 1
+                AND return_invoice.is_return = 1
+                AND IFNULL(return_item.sales_invoice_item, '') != ''
+            GROUP BY return_item.sales_invoice_item
+        ) returned ON returned.sales_invoice_item = original.name
+        SET original.posa_returned_qty = returned.stock_qty / IF(original.conversion_factor > 0, original.conversion_factor, 1)
+        """
+    )
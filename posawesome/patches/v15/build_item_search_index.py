@@ -0,0 +1,6 @@
+from posawesome.posawesome.api.item_search import enqueue_search_index_rebuild
+
+
+def execute():
+    """Backfill POS Item Search Token for existing items"""
+    enqueue_search_index_rebuild()
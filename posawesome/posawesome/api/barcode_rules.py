@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Barcode Rules Module
+Compiles the barcode settings of a POS Profile into a prefix trie so one
+walk over the scanned code picks the decoder, instead of re-reading and
+re-parsing profile fields for every format on every scan.
+"""
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import cint
+
+
+# Hash: pos_profile name -> {"modified": str, "format": int, "trie": dict}
+BARCODE_RULES_KEY = "posa_barcode_rules"
+
+# Bumped when compiled rules change shape, so cached tries recompile
+RULES_FORMAT = 2
+
+# Rule types (each has a decoder in api/item.py)
+RULE_WEIGHT = "weight"      # scale barcode: PREFIX + ITEM_CODE + WEIGHT
+RULE_PRIVATE = "private"    # PREFIX + ITEM_CODE + CUSTOM_DATA, qty 1
+RULE_PRICE = "price"        # EAN-13 price-embedded: PREFIX + ITEM_CODE + PRICE (+ check digit)
+RULE_GS1 = "gs1"            # GS1-128 element string starting with AI (01)
+
+# Prefixes that mark a GS1-128 element string with AI (01):
+# human-readable "(01)" and the "]C1" symbology identifier
+GS1_PREFIXES = ("(01)", "]C101")
+
+# A bare "01" (scanner without symbology identifier) also starts ordinary
+# EAN/UPC codes: its rule is a fallback, tried after the plain barcode
+# lookup and only on the exact GS1 shape (see item._extract_gs1)
+GS1_BARE_PREFIX = "01"
+
+# Priority when several rules share a prefix and length (legacy scan order)
+RULE_PRIORITY = {RULE_WEIGHT: 0, RULE_PRICE: 1, RULE_PRIVATE: 2, RULE_GS1: 3}
+
+
+# =============================================================================
+# COMPILATION
+# =============================================================================
+
+def _split_prefixes(value):
+    """Comma-separated prefixes ("91,92,93") -> ["91", "92", "93"]"""
+    return [prefix.strip() for prefix in str(value or "").split(",") if prefix.strip()]
+
+
+def get_profile_rules(profile):
+    """
+    Flat rule list from POS Profile fields.
+    Each rule: {type, prefix, length, item_code_length, value_length, decimals, fallback}
+    length None means variable length (GS1-128); fallback rules are tried
+    after the plain barcode lookup.
+    """
+    rules = []
+
+    if profile.get("posa_enable_scale_barcode") == 1:
+        prefix = str(profile.get("posa_scale_barcode_start", "") or "")
+        length = cint(profile.get("posa_scale_barcode_lenth"))
+        item_code_length = cint(profile.get("posa_scale_item_code_length"))
+        weight_length = cint(profile.get("posa_weight_length"))
+        if all([prefix, length, item_code_length, weight_length]):
+            rules.append({
+                "type": RULE_WEIGHT,
+                "prefix": prefix,
+                "length": length,
+                "item_code_length": item_code_length,
+                "value_length": weight_length,
+                "decimals": 3,  # grams -> kg
+            })
+
+    if profile.get("posa_enable_private_barcode") == 1:
+        length = cint(profile.get("posa_private_barcode_lenth"))
+        item_code_length = cint(profile.get("posa_private_item_code_length"))
+        if length and item_code_length:
+            for prefix in _split_prefixes(profile.get("posa_private_barcode_prefixes")):
+                rules.append({
+                    "type": RULE_PRIVATE,
+                    "prefix": prefix,
+                    "length": length,
+                    "item_code_length": item_code_length,
+                    "value_length": 0,
+                    "decimals": 0,
+                })
+
+    if profile.get("posa_enable_price_barcode") == 1:
+        length = cint(profile.get("posa_price_barcode_length"))
+        item_code_length = cint(profile.get("posa_price_item_code_length"))
+        price_length = cint(profile.get("posa_price_length"))
+        if length and item_code_length and price_length:
+            for prefix in _split_prefixes(profile.get("posa_price_barcode_prefixes")):
+                rules.append({
+                    "type": RULE_PRICE,
+                    "prefix": prefix,
+                    "length": length,
+                    "item_code_length": item_code_length,
+                    "value_length": price_length,
+                    "decimals": cint(profile.get("posa_price_decimals")),
+                })
+
+    if profile.get("posa_enable_gs1_barcode") == 1:
+        for prefix in GS1_PREFIXES + (GS1_BARE_PREFIX,):
+            rules.append({
+                "type": RULE_GS1,
+                "prefix": prefix,
+                "length": None,
+                "item_code_length": 0,
+                "value_length": 0,
+                "decimals": 0,
+                "fallback": 1 if prefix == GS1_BARE_PREFIX else 0,
+            })
+
+    return rules
+
+
+def compile_barcode_rules(profile):
+    """
+    Prefix trie of the profile's rules.
+    Node: {"rules": {length: [rule, ...]}, "children": {char: node}}
+    """
+    trie = {"rules": {}, "children": {}}
+
+    for rule in get_profile_rules(profile):
+        node = trie
+        for char in rule["prefix"]:
+            node = node["children"].setdefault(char, {"rules": {}, "children": {}})
+        node["rules"].setdefault(rule["length"], []).append(rule)
+
+    for node in _iter_nodes(trie):
+        for length_rules in node["rules"].values():
+            length_rules.sort(key=lambda rule: RULE_PRIORITY[rule["type"]])
+
+    return trie
+
+
+def _iter_nodes(node):
+    yield node
+    for child in node["children"].values():
+        yield from _iter_nodes(child)
+
+
+def get_barcode_rules(profile):
+    """
+    Compiled trie for a POS Profile dict.
+    Cached per profile and recompiled when the profile's modified stamp changes.
+    """
+    name = profile.get("name")
+    if not name:
+        return compile_barcode_rules(profile)
+
+    modified = str(profile.get("modified") or "")
+    cache = frappe.cache()
+    cached = cache.hget(BARCODE_RULES_KEY, name)
+    if cached and cached.get("modified") == modified and cached.get("format") == RULES_FORMAT:
+        return cached["trie"]
+
+    trie = compile_barcode_rules(profile)
+    cache.hset(BARCODE_RULES_KEY, name, {"modified": modified, "format": RULES_FORMAT, "trie": trie})
+    return trie
+
+
+# =============================================================================
+# DISPATCH
+# =============================================================================
+
+def match_barcode_rules(trie, barcode):
+    """
+    Rules matching barcode by prefix and length, longest prefix first.
+    A single walk over the barcode characters.
+    """
+    matches = []
+    length = len(barcode)
+    node = trie
+
+    for char in barcode:
+        node = node["children"].get(char)
+        if not node:
+            break
+        matches[:0] = node["rules"].get(length, []) + node["rules"].get(None, [])
+
+    return matches
+
+
+def on_pos_profile_change(doc, method=None):
+    """POS Profile on_update / on_trash - drop the compiled rules"""
+    frappe.cache().hdel(BARCODE_RULES_KEY, doc.name)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Invoice Naming Module
+Opt-in block allocation of Sales Invoice numbers per POS Opening Shift.
+
+Normally every invoice insert takes a row lock on its `tabSeries` counter,
+so concurrent checkouts serialize on one row. With POS Profile
+"posa_invoice_number_block" > 0, a background job reserves a block of
+numbers for the shift (one counter update per block) and keeps them in a
+Redis list; the autoname hook pops the next one without touching the DB.
+
+Numbers are unique but not gapless nor chronological across terminals:
+numbers still pooled when the shift closes are skipped. When the pool is
+empty the invoice falls back to the regular naming series.
+"""
+from __future__ import unicode_literals
+import frappe
+import redis
+from frappe.model.naming import parse_naming_series
+from frappe.utils import cint
+
+
+# Raw Redis list of reserved numbers: "posa_invoice_numbers::<shift>::<series prefix>"
+NUMBER_POOL_PREFIX = "posa_invoice_numbers"
+
+# Pools of shifts that never closed expire on their own
+NUMBER_POOL_TTL = 2 * 24 * 60 * 60
+
+# Refill when this share of a block is left
+REFILL_THRESHOLD = 0.25
+
+MAX_BLOCK_SIZE = 1000
+
+# Digits of the counter when the naming series has no "#" part (same as set_name_by_naming_series)
+DEFAULT_SERIES_DIGITS = 5
+
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+def _pool_key(pos_opening_shift, prefix):
+    return f"{NUMBER_POOL_PREFIX}::{pos_opening_shift}::{prefix}"
+
+
+def get_block_size(pos_profile):
+    """Block size configured on the POS Profile, 0 when block allocation is off"""
+    if not pos_profile:
+        return 0
+    block_size = cint(frappe.get_cached_value("POS Profile", pos_profile, "posa_invoice_number_block"))
+    return min(max(block_size, 0), MAX_BLOCK_SIZE)
+
+
+def split_naming_series(naming_series, doc=None):
+    """
+    (`tabSeries` key, digits) a naming series resolves to, the way
+    make_autoname() would build it. None when the counter is not the last
+    part of the name (e.g. "SINV-.#####.-.YY"), which is left to Frappe.
+    """
+    series = naming_series if "#" in naming_series else f"{naming_series.rstrip('.')}.{'#' * DEFAULT_SERIES_DIGITS}"
+    parts = series.split(".")
+
+    hash_index = next(index for index, part in enumerate(parts) if part.startswith("#"))
+    if any(parts[hash_index + 1:]):
+        return None
+
+    prefix = parse_naming_series(parts[:hash_index], doc=doc)
+    return prefix, len(parts[hash_index])
+
+
+# =============================================================================
+# AUTONAME
+# =============================================================================
+
+def autoname_from_block(doc, method=None):
+    """
+    Sales Invoice autoname - take the next reserved number of the invoice's
+    opening shift. Leaves doc.name unset (regular naming series) when block
+    allocation is off or the pool is empty.
+    """
+    if doc.name or not doc.get("is_pos") or not doc.get("naming_series"):
+        return
+
+    pos_opening_shift = doc.get("posa_pos_opening_shift")
+    block_size = get_block_size(doc.get("pos_profile"))
+    if not pos_opening_shift or not block_size:
+        return
+
+    try:
+        split = split_naming_series(doc.naming_series, doc)
+        if not split:
+            return
+
+        prefix, digits = split
+        number = take_invoice_number(pos_opening_shift, prefix, block_size)
+        if number:
+            doc.name = f"{prefix}{str(number).zfill(digits)}"
+    except Exception as e:
+        # Never block a sale on the pool - the naming series still works
+        frappe.logger().error(f"Error in autoname_from_block: {str(e)}")
+
+
+def take_invoice_number(pos_opening_shift, prefix, block_size):
+    """Pop the next reserved number, scheduling a refill when the pool runs low"""
+    cache = frappe.cache()
+    key = cache.make_key(_pool_key(pos_opening_shift, prefix))
+
+    number = redis.Redis.lpop(cache, key)
+    remaining = redis.Redis.llen(cache, key)
+
+    if remaining <= block_size * REFILL_THRESHOLD:
+        frappe.enqueue(
+            "posawesome.posawesome.api.invoice_naming.reserve_invoice_numbers",
+            queue="short",
+            job_id=f"posa_invoice_numbers::{pos_opening_shift}::{prefix}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+            pos_opening_shift=pos_opening_shift,
+            prefix=prefix,
+            block_size=block_size
+        )
+
+    return cint(frappe.safe_decode(number)) if number is not None else None
+
+
+# =============================================================================
+# RESERVATION
+# =============================================================================
+
+def reserve_invoice_numbers(pos_opening_shift, prefix, block_size):
+    """
+    Background job - advance the `tabSeries` counter by block_size in one
+    short transaction and append the reserved numbers to the shift's pool.
+    """
+    block_size = min(max(cint(block_size), 1), MAX_BLOCK_SIZE)
+
+    if frappe.db.get_value("POS Opening Shift", pos_opening_shift, "status") != "Open":
+        return
+
+    current = frappe.db.sql(
+        "SELECT `current` FROM `tabSeries` WHERE `name` = %s FOR UPDATE",
+        prefix
+    )
+    if current and current[0][0] is not None:
+        start = cint(current[0][0])
+        frappe.db.sql(
+            "UPDATE `tabSeries` SET `current` = %s WHERE `name` = %s",
+            (start + block_size, prefix)
+        )
+    else:
+        start = 0
+        frappe.db.sql(
+            "INSERT INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)",
+            (prefix, block_size)
+        )
+
+    # Release the counter row before touching Redis; a crash after this
+    # point only leaves a gap in the numbering
+    frappe.db.commit()
+
+    cache = frappe.cache()
+    key = cache.make_key(_pool_key(pos_opening_shift, prefix))
+    redis.Redis.rpush(cache, key, *range(start + 1, start + block_size + 1))
+    redis.Redis.expire(cache, key, NUMBER_POOL_TTL)
+
+
+def on_closing_shift_submit(doc, method=None):
+    """POS Closing Shift on_submit - discard the shift's unused numbers"""
+    pos_opening_shift = doc.get("pos_opening_shift")
+    if pos_opening_shift:
+        frappe.db.after_commit.add(lambda: discard_invoice_numbers(pos_opening_shift))
+
+
+def discard_invoice_numbers(pos_opening_shift):
+    frappe.cache().delete_keys(f"{NUMBER_POOL_PREFIX}::{pos_opening_shift}::")
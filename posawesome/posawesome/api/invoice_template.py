@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Invoice Template Module
+Invoice rows that depend only on (POS Profile, company) - the profile's
+tax rows and the payment accounts - resolved once and cached, then copied
+into every incoming invoice before set_missing_values().
+
+Only what set_missing_values() keeps belongs here: it builds tax rows only
+when the invoice has none and looks up a payment account only when the row
+has none. Header fields (currency, write off account, cost center,
+taxes_and_charges, ...) are re-read from the POS Profile by set_pos_fields()
+on every insert, so caching them saves nothing.
+"""
+from __future__ import unicode_literals
+import frappe
+from erpnext.controllers.accounts_controller import get_taxes_and_charges
+from posawesome.posawesome.api.pos_profile import get_payment_account
+
+
+# Hash: "pos_profile::company" -> template dict
+INVOICE_TEMPLATE_KEY = "posa_invoice_template"
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def build_invoice_template(pos_profile, company):
+    """Resolve the (POS Profile, company) rows with the same queries set_missing_values runs"""
+    profile = frappe.get_cached_doc("POS Profile", pos_profile)
+
+    taxes = []
+    if profile.taxes_and_charges:
+        # Same rows set_taxes() would copy
+        taxes = get_taxes_and_charges("Sales Taxes and Charges Template", profile.taxes_and_charges)
+
+    payment_accounts = {
+        payment.mode_of_payment: get_payment_account(payment.mode_of_payment, company).get("account")
+        for payment in profile.payments
+    }
+
+    return {
+        "company": company,
+        "taxes_and_charges": profile.taxes_and_charges,
+        "taxes": taxes,
+        "payment_accounts": payment_accounts,
+    }
+
+
+def get_invoice_template(pos_profile, company):
+    """Cached template for (POS Profile, company)"""
+    key = f"{pos_profile}::{company}"
+    cache = frappe.cache()
+
+    template = cache.hget(INVOICE_TEMPLATE_KEY, key)
+    if template is None:
+        template = build_invoice_template(pos_profile, company)
+        cache.hset(INVOICE_TEMPLATE_KEY, key, template)
+
+    return template
+
+
+# =============================================================================
+# APPLY
+# =============================================================================
+
+def apply_invoice_template(invoice_doc):
+    """
+    Fill missing tax rows and payment accounts of an invoice dict in place
+    from its profile's template. Values sent by the terminal always win.
+    """
+    pos_profile = invoice_doc.get("pos_profile")
+    company = invoice_doc.get("company")
+    if not pos_profile or not company:
+        return invoice_doc
+
+    try:
+        template = get_invoice_template(pos_profile, company)
+    except Exception as e:
+        # set_missing_values() still resolves everything on its own
+        frappe.logger().error(f"Error in apply_invoice_template: {str(e)}")
+        return invoice_doc
+
+    # set_pos_fields() sets the profile's taxes_and_charges; these are its rows
+    if (
+        not invoice_doc.get("taxes")
+        and template.get("taxes")
+        and invoice_doc.get("taxes_and_charges") in (None, "", template.get("taxes_and_charges"))
+    ):
+        invoice_doc["taxes"] = [dict(row) for row in template["taxes"]]
+
+    for payment in invoice_doc.get("payments") or []:
+        if not payment.get("account"):
+            payment["account"] = template["payment_accounts"].get(payment.get("mode_of_payment"))
+
+    return invoice_doc
+
+
+# =============================================================================
+# INVALIDATION
+# =============================================================================
+
+def on_template_source_change(doc, method=None):
+    """
+    POS Profile / Sales Taxes and Charges Template / Mode of Payment /
+    Company / Account changes - drop all templates (rare, admin-side edits)
+    """
+    frappe.db.after_commit.add(clear_invoice_templates)
+
+
+def clear_invoice_templates():
+    frappe.cache().delete_value(INVOICE_TEMPLATE_KEY)
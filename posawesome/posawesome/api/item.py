@@ -6,11 +6,40 @@ from __future__ import unicode_literals
 import json
 import frappe
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import flt, cint
+from posawesome.posawesome.api.item_cache import (
+    get_catalog_snapshot,
+    get_catalog_export,
+    get_catalog_rows,
+    get_catalog_version,
+    get_changed_item_codes,
+    roll_catalog_day,
+    ensure_barcode_index,
+    get_barcode_entries,
+    get_indexed_items,
+    get_item_group_tree,
+    get_item_group_bounds,
+)
+from posawesome.posawesome.api.barcode_rules import (
+    RULE_WEIGHT,
+    RULE_PRIVATE,
+    RULE_PRICE,
+    RULE_GS1,
+    get_barcode_rules,
+    match_barcode_rules,
+)
+from posawesome.posawesome.api.item_search import get_search_condition, get_search_rank_sql, is_search_index_ready
+from posawesome.posawesome.api.item_price import get_customer_priced_items, resolve_item_prices
+from werkzeug.wrappers import Response
+
+
+# Keyset pagination (get_items_page / export_items_ndjson)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
 
 @frappe.whitelist()
-def get_items(pos_profile, price_list=None, item_group="", search_value="", customer=None):
+def get_items(pos_profile, price_list=None, item_group="", search_value="", customer=None, search_mode="ranked"):
     """
     GET - Get items for POS
     Returns items with prices and stock qty in a single optimized query
@@ -28,6 +57,11 @@ def get_items(pos_profile, price_list=None, item_group="", search_value="", cust
     5. search_barcode_from_server() - line 898 (barcode search)
 
     Uses JOIN to avoid N+1 query problem (1 query instead of 51)
+
+    search_mode:
+    - "ranked" (default): indexed search through POS Item Search Token,
+      ordered exact code > code prefix > name prefix > substring
+    - "like": legacy full-scan LIKE filter ordered by item_name
     """
     try:
         pos_profile = json.loads(pos_profile)
@@ -38,87 +72,457 @@ def get_items(pos_profile, price_list=None, item_group="", search_value="", cust
         # Get warehouse from POS Profile
         warehouse = pos_profile.get("warehouse", "")
 
-        # Build WHERE conditions dynamically
-        where_conditions = [
-            "`tabItem`.disabled = 0",
-            "`tabItem`.is_sales_item = 1",
-            "`tabItem`.has_variants = 0"
-        ]
+        where_conditions, params, rank_sql = _build_items_filters(
+            price_list, warehouse, item_group, search_value, search_mode
+        )
+
+        order_by = "`tabItem`.item_name ASC, `tabItem`.name ASC"
+        if rank_sql:
+            order_by = f"{rank_sql}, {order_by}"
+
+        items = _query_items(where_conditions, params, order_by, 50)
+
+        # Customer / customer group price lists and customer-specific prices
+        if customer and items:
+            prices = resolve_item_prices(
+                [{"item_code": item.item_code, "uom": item.stock_uom} for item in items],
+                price_list,
+                customer
+            )
+            for item, price in zip(items, prices):
+                _apply_resolved_price(item, price)
+
+        return items
 
-        # Build parameters dictionary
-        params = {
-            "price_list": price_list,
-            "warehouse": warehouse
+    except Exception as e:
+        return []
+
+
+@frappe.whitelist()
+def get_items_page(pos_profile, price_list=None, item_group="", search_value="", cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    GET - One page of items, keyset-paginated on (item_name, item_code)
+    Same filters and columns as get_items, ordered by item_name; deep pages
+    cost the same as the first one (no OFFSET scan).
+
+    Args:
+        cursor: JSON {"item_name", "item_code"} of the last row of the
+                previous page (next_cursor), empty for the first page
+        page_size: rows per page (1 - MAX_PAGE_SIZE)
+
+    Returns:
+        dict: {"items": list, "next_cursor": dict or None}
+    """
+    try:
+        pos_profile = json.loads(pos_profile)
+
+        if not price_list:
+            price_list = pos_profile.get("selling_price_list")
+
+        if isinstance(cursor, str):
+            cursor = json.loads(cursor) if cursor else None
+
+        page_size = min(max(cint(page_size) or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+        items = _get_items_after(
+            pos_profile.get("warehouse", ""), price_list, item_group, search_value, cursor, page_size
+        )
+
+        return {
+            "items": items,
+            "next_cursor": _get_next_cursor(items, page_size)
         }
 
-        # Add item_group filter if provided (case-insensitive)
-        if item_group and item_group.strip():
+    except Exception as e:
+        frappe.log_error(f"Error in get_items_page: {str(e)}", "POS Items Error")
+        return {"items": [], "next_cursor": None}
+
+
+@frappe.whitelist()
+def export_items_ndjson(pos_profile, price_list=None, item_group="", page_size=MAX_PAGE_SIZE):
+    """
+    GET - Full item list (e.g. a whole category) as NDJSON, one item per line
+    Streamed: each keyset page of page_size rows is read and sent as its own
+    chunk while the client consumes the previous one, so memory stays at one
+    page whatever the item count.
+    """
+    try:
+        pos_profile = json.loads(pos_profile)
+
+        if not price_list:
+            price_list = pos_profile.get("selling_price_list")
+
+        page_size = min(max(cint(page_size) or MAX_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+        chunks = _stream_items_ndjson(
+            frappe.local.site,
+            frappe.local.sites_path,
+            frappe.session.user,
+            pos_profile.get("warehouse", ""),
+            price_list,
+            item_group,
+            page_size
+        )
+
+        return Response(chunks, mimetype="application/x-ndjson", direct_passthrough=True)
+
+    except Exception as e:
+        frappe.log_error(f"Error in export_items_ndjson: {str(e)}", "POS Items Error")
+        return Response(b"", mimetype="application/x-ndjson")
+
+
+def _stream_items_ndjson(site, sites_path, user, warehouse, price_list, item_group, page_size):
+    """
+    NDJSON chunks of export_items_ndjson, one per keyset page.
+    The WSGI server iterates the response after the request's site context
+    is destroyed, so the generator opens (and closes) its own.
+    """
+    frappe.init(site=site, sites_path=sites_path)
+    try:
+        frappe.connect()
+        frappe.set_user(user)
+
+        try:
+            cursor = None
+            while True:
+                items = _get_items_after(warehouse, price_list, item_group, "", cursor, page_size)
+                if items:
+                    yield "".join(frappe.as_json(item, indent=None) + "\n" for item in items).encode("utf-8")
+
+                cursor = _get_next_cursor(items, page_size)
+                if not cursor:
+                    break
+
+        except Exception as e:
+            # Headers are sent already - log and end the stream
+            frappe.log_error(f"Error in export_items_ndjson: {str(e)}", "POS Items Error")
+            frappe.db.commit()
+
+    finally:
+        frappe.destroy()
+
+
+def _build_items_filters(price_list, warehouse, item_group="", search_value="", search_mode="ranked"):
+    """
+    WHERE conditions and params shared by the get_items family.
+
+    search_mode:
+    - "ranked": indexed search through POS Item Search Token (LIKE until
+      the index has been fully built)
+    - "like": legacy full-scan LIKE filter
+
+    Returns:
+        tuple: (where_conditions, params, rank_sql or None)
+    """
+    # Build WHERE conditions dynamically
+    where_conditions = [
+        "`tabItem`.disabled = 0",
+        "`tabItem`.is_sales_item = 1",
+        "`tabItem`.has_variants = 0"
+    ]
+
+    # Build parameters dictionary
+    params = {
+        "price_list": price_list,
+        "warehouse": warehouse
+    }
+
+    # Add item_group filter if provided (case-insensitive)
+    # Known groups use the cached nested set: a leaf is an indexed equality,
+    # a parent group matches all descendants through an lft/rgt range
+    if item_group and item_group.strip():
+        bounds = get_item_group_bounds(item_group)
+        if not bounds:
             where_conditions.append("`tabItem`.item_group LIKE %(item_group)s")
             params["item_group"] = f"%{item_group}%"
-
-        # Add search filter (item_code OR item_name)
-        if search_value:
+        elif not bounds[3]:
+            where_conditions.append("`tabItem`.item_group = %(item_group)s")
+            params["item_group"] = bounds[0]
+        else:
+            where_conditions.append(
+                """`tabItem`.item_group IN (
+                    SELECT `tabItem Group`.name
+                    FROM `tabItem Group`
+                    WHERE `tabItem Group`.lft >= %(group_lft)s AND `tabItem Group`.rgt <= %(group_rgt)s
+                )"""
+            )
+            params["group_lft"] = bounds[1]
+            params["group_rgt"] = bounds[2]
+
+    # Add search filter (item_code OR item_name)
+    rank_sql = None
+    if search_value:
+        search_condition = None
+        if search_mode == "ranked" and is_search_index_ready():
+            search_condition = get_search_condition(search_value, params)
+
+        if search_condition:
+            where_conditions.append(search_condition)
+            rank_sql = get_search_rank_sql()
+        else:
             where_conditions.append("(`tabItem`.name LIKE %(search)s OR `tabItem`.item_name LIKE %(search)s)")
             params["search"] = f"%{search_value}%"
 
-        where_clause = " AND ".join(where_conditions)
-
-        # Single optimized query with JOINs for price and stock
-        items = frappe.db.sql(
-            f"""
-            SELECT
-                `tabItem`.name as item_code,
-                `tabItem`.item_name,
-                `tabItem`.item_group,
-                `tabItem`.stock_uom,
-                `tabItem Price`.price_list_rate,
-                `tabItem Price`.price_list_rate as rate,
-                `tabItem Price`.price_list_rate as base_rate,
-                `tabItem Price`.currency,
-                COALESCE(`tabBin`.actual_qty, 0) as actual_qty
-            FROM `tabItem`
-            LEFT JOIN `tabItem Price`
-                ON `tabItem`.name = `tabItem Price`.item_code
-                AND `tabItem Price`.selling = 1
-                AND `tabItem Price`.price_list = %(price_list)s
-                AND (`tabItem Price`.valid_from IS NULL OR `tabItem Price`.valid_from <= CURDATE())
-                AND (`tabItem Price`.valid_upto IS NULL OR `tabItem Price`.valid_upto >= CURDATE())
-            LEFT JOIN `tabBin`
-                ON `tabItem`.name = `tabBin`.item_code
-                AND `tabBin`.warehouse = %(warehouse)s
-            WHERE {where_clause}
-            ORDER BY `tabItem`.item_name ASC
-            LIMIT 50
-            """,
-            params,
-            as_dict=True
+    return where_conditions, params, rank_sql
+
+
+def _query_items(where_conditions, params, order_by, limit):
+    """Single optimized query with JOINs for price and stock"""
+    return frappe.db.sql(
+        f"""
+        SELECT
+            `tabItem`.name as item_code,
+            `tabItem`.item_name,
+            `tabItem`.item_group,
+            `tabItem`.stock_uom,
+            `tabItem Price`.price_list_rate,
+            `tabItem Price`.price_list_rate as rate,
+            `tabItem Price`.price_list_rate as base_rate,
+            `tabItem Price`.currency,
+            COALESCE(`tabBin`.actual_qty, 0) as actual_qty
+        FROM `tabItem`
+        LEFT JOIN `tabItem Price`
+            ON `tabItem`.name = `tabItem Price`.item_code
+            AND `tabItem Price`.selling = 1
+            AND `tabItem Price`.price_list = %(price_list)s
+            AND (`tabItem Price`.valid_from IS NULL OR `tabItem Price`.valid_from <= CURDATE())
+            AND (`tabItem Price`.valid_upto IS NULL OR `tabItem Price`.valid_upto >= CURDATE())
+        LEFT JOIN `tabBin`
+            ON `tabItem`.name = `tabBin`.item_code
+            AND `tabBin`.warehouse = %(warehouse)s
+        WHERE {" AND ".join(where_conditions)}
+        ORDER BY {order_by}
+        LIMIT {cint(limit)}
+        """,
+        params,
+        as_dict=True
+    )
+
+
+def _get_items_after(warehouse, price_list, item_group, search_value, cursor, page_size):
+    """
+    Keyset page: rows strictly after cursor in (item_name, item_code) order.
+    Served by the (item_name, name) index on tabItem.
+    """
+    where_conditions, params, _rank_sql = _build_items_filters(price_list, warehouse, item_group, search_value)
+
+    if cursor:
+        where_conditions.append(
+            "(`tabItem`.item_name > %(after_item_name)s"
+            " OR (`tabItem`.item_name = %(after_item_name)s AND `tabItem`.name > %(after_item_code)s))"
         )
+        params["after_item_name"] = cursor.get("item_name") or ""
+        params["after_item_code"] = cursor.get("item_code") or ""
 
-        return items
+    return _query_items(where_conditions, params, "`tabItem`.item_name ASC, `tabItem`.name ASC", page_size)
+
+
+def _get_next_cursor(items, page_size):
+    """Cursor after the last row, or None when this was the last page"""
+    if len(items) < page_size:
+        return None
+
+    last = items[-1]
+    return {"item_name": last.item_name, "item_code": last.item_code}
+
+
+@frappe.whitelist()
+def get_item_catalog(pos_profile, price_list=None):
+    """
+    GET - Full item catalog snapshot for a terminal
+    Served from the shared Redis snapshot of (price_list, warehouse),
+    so 40 terminals loading the catalog cost one JOIN, not 40.
+
+    Returns:
+        dict: {"version": int, "items": [rows like get_items]}
+    """
+    try:
+        pos_profile = json.loads(pos_profile)
+
+        if not price_list:
+            price_list = pos_profile.get("selling_price_list")
+
+        snapshot = get_catalog_snapshot(price_list, pos_profile.get("warehouse", ""))
+
+        return {
+            "version": snapshot["version"],
+            "items": sorted(snapshot["items"].values(), key=lambda row: row.get("item_name") or "")
+        }
+
+    except Exception as e:
+        frappe.log_error(f"Error in get_item_catalog: {str(e)}", "POS Item Catalog Error")
+        return {"version": 0, "items": []}
+
+
+@frappe.whitelist()
+def export_item_catalog(pos_profile, price_list=None):
+    """
+    GET - Full catalog as gzipped columnar JSON, for the client IndexedDB cache
+    Same rows as get_item_catalog; string columns with few distinct values
+    are indexes into "strings". Sent with Content-Encoding: gzip, so the
+    browser inflates it before parsing. Keep it current with
+    get_item_catalog_delta(since_version=version).
+
+    Returns:
+        Response: {"version", "price_list", "warehouse", "count",
+                   "strings": [...], "columns": {column: [...]}}
+    """
+    pos_profile = json.loads(pos_profile)
+
+    if not price_list:
+        price_list = pos_profile.get("selling_price_list")
+
+    version, blob = get_catalog_export(price_list, pos_profile.get("warehouse", ""))
+    etag = f'"{version}"'
+
+    if frappe.request and frappe.request.headers.get("If-None-Match") == etag:
+        return Response(status=304, headers={"ETag": etag})
+
+    return Response(
+        blob,
+        mimetype="application/json",
+        headers={
+            "Content-Encoding": "gzip",
+            "ETag": etag,
+            "Cache-Control": "private, no-cache"
+        }
+    )
+
+
+@frappe.whitelist()
+def get_item_catalog_delta(pos_profile, since_version, price_list=None):
+    """
+    GET - Items changed since the terminal's catalog version
+    Covers Item, Item Price and stock (Bin) changes. Costs one sorted-set
+    range and one query for the changed rows - O(changes), not O(catalog).
+
+    Returns:
+        dict: {
+            "version": int,
+            "reset": bool,      # True - since_version too old, items is the full catalog
+            "items": list,      # changed rows (upserts)
+            "removed": list     # item codes no longer sellable
+        }
+    """
+    try:
+        pos_profile = json.loads(pos_profile)
+        since_version = cint(since_version)
+
+        if not price_list:
+            price_list = pos_profile.get("selling_price_list")
+
+        warehouse = pos_profile.get("warehouse", "")
+
+        # Version read first: a change recorded after it is sent again next poll
+        roll_catalog_day()
+        version = get_catalog_version()
+        changed = get_changed_item_codes(since_version)
+
+        if changed is None:
+            snapshot = get_catalog_snapshot(price_list, warehouse)
+            return {
+                "version": snapshot["version"],
+                "reset": True,
+                "items": list(snapshot["items"].values()),
+                "removed": []
+            }
+
+        rows = {row.item_code: row for row in get_catalog_rows(price_list, warehouse, changed)}
+        return {
+            "version": version,
+            "reset": False,
+            "items": list(rows.values()),
+            "removed": [code for code in changed if code not in rows]
+        }
+
+    except Exception as e:
+        frappe.log_error(f"Error in get_item_catalog_delta: {str(e)}", "POS Item Catalog Error")
+        return {"version": cint(since_version), "reset": False, "items": [], "removed": []}
+
+
+@frappe.whitelist()
+def get_item_prices(pos_profile, items, customer=None, price_list=None, transaction_date=None):
+    """
+    GET - Effective rates for a batch of cart lines in one call
+
+    Args:
+        items: JSON list of {"item_code", "uom"}
+        customer: adds customer / customer group price lists and
+                  customer-specific Item Price rows
+        transaction_date: validity date (default today)
+
+    Returns:
+        list: aligned with items,
+              {"item_code", "uom", "price_list", "price_list_rate", "conversion_factor"}
+    """
+    try:
+        pos_profile = json.loads(pos_profile)
+
+        if isinstance(items, str):
+            items = json.loads(items)
+
+        if not price_list:
+            price_list = pos_profile.get("selling_price_list")
+
+        return resolve_item_prices(items or [], price_list, customer, transaction_date)
 
     except Exception as e:
+        frappe.log_error(f"Error in get_item_prices: {str(e)}", "POS Item Price Error")
         return []
 
 
 @frappe.whitelist()
-def get_items_groups():
+def get_customer_item_prices(pos_profile, customer, price_list=None):
+    """
+    GET - Stock UOM rates of the items priced specifically for a customer
+    (customer / customer group price lists, customer-specific Item Price
+    rows). The terminal loads them once per customer / price list change
+    and applies them to the shared local catalog.
+
+    Returns:
+        dict: {item_code: price_list_rate}
+    """
+    try:
+        pos_profile = json.loads(pos_profile)
+
+        if not price_list:
+            price_list = pos_profile.get("selling_price_list")
+
+        item_codes = get_customer_priced_items(price_list, customer)
+        prices = resolve_item_prices([{"item_code": item_code} for item_code in item_codes], price_list, customer)
+        return {price["item_code"]: price["price_list_rate"] for price in prices if price["price_list"]}
+
+    except Exception as e:
+        frappe.log_error(f"Error in get_customer_item_prices: {str(e)}", "POS Item Price Error")
+        return {}
+
+
+@frappe.whitelist()
+def get_items_groups(include_groups=0):
     """
     GET - Get item groups
+    Served from the cached Item Group tree.
+
+    Args:
+        include_groups: 1 - all groups in tree order with lft/rgt/is_group,
+                        0 - leaf groups only, sorted by name
     """
     try:
-        result = frappe.get_all(
-            "Item Group",
-            filters={"is_group": 0},
-            fields=["name", "parent_item_group"],
-            order_by="name"
-        )
-        return result
+        tree = get_item_group_tree()
+
+        if cint(include_groups):
+            return [dict(node, name=name) for name, node in tree.items()]
+
+        return [
+            {"name": name, "parent_item_group": node["parent_item_group"]}
+            for name, node in sorted(tree.items(), key=lambda group: group[0].lower())
+            if not node["is_group"]
+        ]
     except Exception as e:
         return []
 
 
 @frappe.whitelist()
-def get_barcode_item(pos_profile, barcode_value):
+def get_barcode_item(pos_profile, barcode_value, customer=None):
     """
     Main entry point for all barcode scanning.
     Automatically determines barcode type and returns item with price.
@@ -126,6 +530,7 @@ def get_barcode_item(pos_profile, barcode_value):
     Args:
         pos_profile: JSON string of POS Profile with settings
         barcode_value: Scanned barcode string
+        customer: Optional customer for customer / customer group pricing
 
     Returns:
         dict: Item details {item_code, item_name, uom, rate, qty, etc.}
@@ -137,28 +542,41 @@ def get_barcode_item(pos_profile, barcode_value):
             pos_profile = json.loads(pos_profile)
 
         # Process barcode scan - no logging needed for normal operations
+        return _resolve_barcodes(pos_profile, [barcode_value], customer)[0]
 
-        # Try scale barcode first (highest priority - specific format)
-        result = _get_scale_barcode(pos_profile, barcode_value)
-        if result:
-            return result
+    except Exception as e:
+        frappe.logger().error(f"Barcode processing error: {str(e)} - Barcode: {barcode_value}")
+        return {}
 
-        # Try private barcode second (medium priority - specific prefixes)
-        result = _get_private_barcode(pos_profile, barcode_value)
-        if result:
-            return result
 
-        # Try normal barcode last (fallback - search Item Barcode table)
-        result = _get_normal_barcode(pos_profile, barcode_value)
-        if result:
-            return result
+@frappe.whitelist()
+def get_barcode_items(pos_profile, barcodes, customer=None):
+    """
+    Resolve a batch of barcodes (scanner bursts, offline cart replay).
+    Same rules as get_barcode_item, but the profile is parsed once and all
+    lookups are set-based (IN queries or one Redis HMGET per table).
 
-        # Not found - return empty dict
-        return {}
+    Args:
+        pos_profile: JSON string of POS Profile with settings
+        barcodes: JSON list of scanned barcode strings
+        customer: Optional customer for customer / customer group pricing
+
+    Returns:
+        list: One result per input barcode, in input order
+              ({} for barcodes that match no item)
+    """
+    try:
+        if isinstance(pos_profile, str):
+            pos_profile = json.loads(pos_profile)
+
+        if isinstance(barcodes, str):
+            barcodes = json.loads(barcodes)
+
+        return _resolve_barcodes(pos_profile, [str(barcode or "").strip() for barcode in barcodes or []], customer)
 
     except Exception as e:
-        frappe.logger().error(f"Barcode processing error: {str(e)} - Barcode: {barcode_value}")
-        return {}
+        frappe.logger().error(f"Bulk barcode processing error: {str(e)}")
+        return [{} for _barcode in barcodes or []] if isinstance(barcodes, list) else []
 
 
 @frappe.whitelist()
@@ -183,211 +601,345 @@ def process_batch_selection(item_code, current_item_row_id, existing_items_data,
         }
 
 
-def _get_scale_barcode(profile, barcode):
+# =============================================================================
+# BARCODE RESOLUTION
+# =============================================================================
+# Every barcode type is decoded in two steps:
+#   extract(rule, barcode) -> [(LOOKUP_ITEM | LOOKUP_BARCODE, key), ...]
+#   apply(rule, barcode, elements, item_data) -> sets qty/rate on the result
+# so a whole batch can run its lookups together before any result is built.
+
+LOOKUP_ITEM = "item"        # key is an item code
+LOOKUP_BARCODE = "barcode"  # key is an Item Barcode value
+
+
+def _resolve_barcodes(profile, barcodes, customer=None):
+    """
+    Resolve barcodes to item results, in input order.
+    Candidates per barcode: matching profile rules (longest prefix first),
+    then the normal Item Barcode lookup, then fallback rules (bare "01" GS1).
+    Rates come from the price resolver for the barcode's UOM (customer and
+    validity aware); 0 when nothing applies.
+    """
+    price_list = profile.get("selling_price_list")
+    trie = get_barcode_rules(profile)
+
+    # Step 1: candidate lookups for every barcode
+    plans = []
+    for barcode in barcodes:
+        candidates = []
+        fallbacks = []
+        for rule in match_barcode_rules(trie, barcode):
+            extract, _apply = BARCODE_DECODERS[rule["type"]]
+            target = fallbacks if rule.get("fallback") else candidates
+            target.extend((rule, kind, key) for kind, key in extract(rule, barcode))
+        candidates.append((None, LOOKUP_BARCODE, barcode))
+        plans.append(candidates + fallbacks)
+
+    # Step 2: set-based lookups
+    barcode_keys = {key for candidates in plans for _rule, kind, key in candidates if kind == LOOKUP_BARCODE}
+    barcode_items = _lookup_barcodes(barcode_keys)
+
+    item_codes = {key for candidates in plans for _rule, kind, key in candidates if kind == LOOKUP_ITEM}
+    item_codes.update(entry["item_code"] for entry in barcode_items.values())
+    indexed = {}
+    items = _fetch_barcode_items(item_codes, indexed)
+
+    # Step 3: first candidate that resolves to an item wins
+    matches = []
+    for candidates in plans:
+        match = None
+        for rule, kind, key in candidates:
+            entry = {"item_code": key, "uom": None} if kind == LOOKUP_ITEM else barcode_items.get(key)
+            if entry and entry["item_code"] in items:
+                match = (rule, entry["item_code"], entry["uom"] or items[entry["item_code"]]["stock_uom"])
+                break
+        matches.append(match)
+
+    # Step 4: one batched price resolution for all matched (item, uom);
+    # indexed items without customer-specific prices need no query
+    prices = resolve_item_prices(
+        [{"item_code": match[1], "uom": match[2]} for match in matches if match],
+        price_list,
+        customer,
+        indexed=indexed
+    )
+    prices = iter(prices)
+
+    results = []
+    for barcode, match in zip(barcodes, matches):
+        if not match:
+            results.append({})
+            continue
+
+        rule, item_code, uom = match
+        item_data = dict(items[item_code])
+        item_data["qty"] = 1
+        _apply_resolved_price(item_data, next(prices))
+
+        if rule:
+            try:
+                BARCODE_DECODERS[rule["type"]][1](rule, barcode, item_data)
+            except Exception as e:
+                frappe.logger().error(f"Barcode decode error: {str(e)} - Barcode: {barcode}")
+        results.append(item_data)
+
+    return results
+
+
+def _apply_resolved_price(row, price):
+    """Copy a resolve_item_prices result onto an item row (kept as is when no price applies)"""
+    row["uom"] = price["uom"]
+    row["conversion_factor"] = price["conversion_factor"]
+    if price["price_list"]:
+        row["price_list_rate"] = row["rate"] = row["base_rate"] = price["price_list_rate"]
+
+
+def _extract_item_code(rule, barcode):
+    """PREFIX + ITEM_CODE + ... formats (scale, private, price)"""
+    prefix_len = len(rule["prefix"])
+    return [(LOOKUP_ITEM, barcode[prefix_len:prefix_len + rule["item_code_length"]])]
+
+
+def _embedded_value(rule, barcode):
+    """Digits following the item code part"""
+    start = len(rule["prefix"]) + rule["item_code_length"]
+    return barcode[start:start + rule["value_length"]]
+
+
+def _apply_weight(rule, barcode, item_data):
     """
     Handle scale/weight barcodes.
     Format: PREFIX + ITEM_CODE + WEIGHT
     Example: 44 + 12003 + 10010 = "4412003100100"
 
-    Returns item with calculated weight as qty
+    Sets calculated weight as qty
     """
+    # Calculate weight (convert grams to kg, remove trailing zeros)
     try:
-        # Get scale barcode configuration
-        enabled = profile.get("posa_enable_scale_barcode")
-        if not enabled or enabled != 1:
-            return None
-
-        # Get format settings (convert to string if needed)
-        prefix = str(profile.get("posa_scale_barcode_start", ""))
-        total_length = profile.get("posa_scale_barcode_lenth")
-        item_code_length = profile.get("posa_scale_item_code_length")
-        weight_length = profile.get("posa_weight_length")
-
-        # Validate configuration
-        if not all([prefix, total_length, item_code_length, weight_length]):
-            return None
-
-        # Check if barcode matches scale format
-        if not barcode.startswith(prefix) or len(barcode) != total_length:
-            return None
-
-        # Extract item code and weight
-        prefix_len = len(prefix)
-        item_code_part = barcode[prefix_len:prefix_len + item_code_length]
-        weight_part = barcode[prefix_len + item_code_length:prefix_len + item_code_length + weight_length]
-
-        # Extract scale barcode components
-
-        # Fetch item with price using ORM
-        item_data = _fetch_item_with_price(item_code_part, profile.get("selling_price_list"))
-        if not item_data:
-            return None
-
-        # Calculate weight (convert grams to kg, remove trailing zeros)
-        try:
-            weight_value = flt(weight_part) / 1000  # Convert to kg
-            # Remove trailing zeros: 10010 → 10.01 kg (not 10.010)
-            item_data["qty"] = flt(weight_value, 3)
-        except:
-            item_data["qty"] = 1
-
-        return item_data
-
-    except Exception as e:
-        frappe.logger().error(f"Scale barcode error: {str(e)}")
-        return None
+        weight_value = flt(_embedded_value(rule, barcode)) / 1000  # Convert to kg
+        # Remove trailing zeros: 10010 → 10.01 kg (not 10.010)
+        item_data["qty"] = flt(weight_value, 3)
+    except:
+        item_data["qty"] = 1
 
 
-def _get_private_barcode(profile, barcode):
+def _apply_private(rule, barcode, item_data):
     """
     Handle private barcodes with custom prefixes.
     Format: PREFIX + ITEM_CODE + CUSTOM_DATA
     Example: 91 + 12003 + 100100 = "9112003100100"
 
-    Supports multiple prefixes: 91, 92, 93, etc.
-    Returns item with qty=1
+    Private barcodes always have qty=1
     """
-    try:
-        # Get private barcode configuration
-        enabled = profile.get("posa_enable_private_barcode")
-        if not enabled or enabled != 1:
-            return None
-
-        # Get format settings
-        prefixes_str = str(profile.get("posa_private_barcode_prefixes", ""))
-        total_length = profile.get("posa_private_barcode_lenth")
-        item_code_length = profile.get("posa_private_item_code_length")
-
-        # Validate configuration
-        if not all([prefixes_str, total_length, item_code_length]):
-            return None
-
-        # Check barcode length
-        if len(barcode) != total_length:
-            return None
-
-        # Parse prefixes (comma-separated: "91,92,93")
-        prefixes = [p.strip() for p in prefixes_str.split(",")]
-
-        # Check if barcode starts with any valid prefix
-        matched_prefix = None
-        for prefix in prefixes:
-            if barcode.startswith(prefix):
-                matched_prefix = prefix
-                break
+    item_data["qty"] = 1
 
-        if not matched_prefix:
-            return None
 
-        # Extract item code
-        prefix_len = len(matched_prefix)
-        item_code_part = barcode[prefix_len:prefix_len + item_code_length]
+def _apply_price(rule, barcode, item_data):
+    """
+    Handle price-embedded barcodes (EAN-13 in-store range 20-29).
+    Format: PREFIX + ITEM_CODE + PRICE (+ CHECK DIGIT)
+    Example: 22 + 12003 + 01250 + 7 = "2212003012507" (price 12.50, 2 decimals)
 
-        # Extract private barcode components
+    Sets qty = embedded price / unit rate,
+    or qty=1 at the embedded price when the item has no rate
+    """
+    price = flt(_embedded_value(rule, barcode)) / (10 ** rule["decimals"])
+    rate = flt(item_data.get("rate"))
+    if rate:
+        item_data["qty"] = flt(price / rate, 3)
+    else:
+        item_data["qty"] = 1
+        item_data["rate"] = item_data["price_list_rate"] = item_data["base_rate"] = price
 
-        # Fetch item with price using ORM
-        item_data = _fetch_item_with_price(item_code_part, profile.get("selling_price_list"))
-        if not item_data:
-            return None
 
-        # Private barcodes always have qty=1
-        item_data["qty"] = 1
+def _extract_gs1(rule, barcode):
+    """
+    GS1-128 element string: the (01) GTIN is looked up like a normal
+    barcode, as GTIN-14 and as EAN-13 without the leading zero.
+    Without "(01)" / "]C1" markers the code must have the exact GS1 shape.
+    """
+    if rule.get("fallback") and not _is_gs1_shape(barcode):
+        return []
 
-        return item_data
+    gtin = _parse_gs1_elements(barcode).get("01")
+    if not gtin:
+        return []
 
-    except Exception as e:
-        frappe.logger().error(f"Private barcode error: {str(e)}")
-        return None
+    lookups = [(LOOKUP_BARCODE, gtin)]
+    if gtin.startswith("0"):
+        lookups.append((LOOKUP_BARCODE, gtin[1:]))
+    return lookups
 
 
-def _get_normal_barcode(profile, barcode):
+def _apply_gs1(rule, barcode, item_data):
     """
-    Handle normal barcodes from Item Barcode table.
-    Searches for exact barcode match in child table.
+    Handle GS1-128 element strings: (01) GTIN + optional (310n) net weight
+    in kg and (392n) price to pay.
+    Example: "(01)06291041500213(3103)001250" → GTIN 06291041500213, qty 1.25
+    """
+    elements = _parse_gs1_elements(barcode)
+    weight_ai = next((ai for ai in elements if ai.startswith("310")), None)
+    price_ai = next((ai for ai in elements if ai.startswith("392")), None)
+
+    if weight_ai:
+        # Net weight in kg with the decimals given by the AI's last digit
+        item_data["qty"] = flt(flt(elements[weight_ai]) / (10 ** cint(weight_ai[3])), 3)
+    elif price_ai and flt(item_data.get("rate")):
+        price = flt(elements[price_ai]) / (10 ** cint(price_ai[3]))
+        item_data["qty"] = flt(price / flt(item_data["rate"]), 3)
+
 
-    Returns item with qty=1
+# GS1 application identifiers with a fixed data length; others run to FNC1/end
+GS1_FIXED_LENGTH_AIS = {"00": 18, "01": 14, "02": 14, "11": 6, "13": 6, "15": 6, "17": 6}
+GS1_SEPARATOR = "\x1d"
+
+
+def _parse_gs1_elements(barcode):
     """
-    try:
-        # Search Item Barcode table using ORM
-        barcode_entry = frappe.db.get_value(
-            "Item Barcode",
-            filters={"barcode": barcode},
-            fieldname="parent"
-        )
+    Split a GS1-128 element string into {ai: value}.
+    Accepts "]C1" symbology identifier, "(AI)" human-readable form and
+    FNC1 (GS) separators between variable-length fields.
+    """
+    code = barcode[3:] if barcode.startswith("]C1") else barcode
+
+    if code.startswith("("):
+        elements = {}
+        for part in code.split("(")[1:]:
+            ai, _sep, value = part.partition(")")
+            elements[ai] = value.rstrip(GS1_SEPARATOR)
+        return elements
+
+    elements = {}
+    position = 0
+    while position < len(code):
+        if code[position] == GS1_SEPARATOR:
+            position += 1
+            continue
+
+        ai = code[position:position + 2]
+        if ai in ("31", "32", "39"):
+            ai = code[position:position + 4]
+        position += len(ai)
+
+        if ai in GS1_FIXED_LENGTH_AIS:
+            length = GS1_FIXED_LENGTH_AIS[ai]
+        elif ai[:2] in ("31", "32"):
+            length = 6
+        else:
+            end = code.find(GS1_SEPARATOR, position)
+            length = (end if end != -1 else len(code)) - position
+
+        elements[ai] = code[position:position + length]
+        position += length
+
+    return elements
+
+
+def _is_gs1_shape(barcode):
+    """
+    "01" + GTIN-14 with a valid check digit, then nothing, an FNC1 or
+    another AI - not an EAN/UPC code that happens to start with "01".
+    """
+    gtin = barcode[2:16]
+    if not (barcode.startswith("01") and len(gtin) == 14 and gtin.isdigit()):
+        return False
 
-        if not barcode_entry:
-            return None
+    rest = barcode[16:]
+    if rest and not (rest.startswith(GS1_SEPARATOR) or rest[:2].isdigit()):
+        return False
 
-        # Process normal barcode
+    digits = [int(digit) for digit in gtin]
+    total = sum(digit * (3 if index % 2 == 0 else 1) for index, digit in enumerate(reversed(digits[:-1])))
+    return (10 - total % 10) % 10 == digits[-1]
 
-        # Fetch item with price using ORM
-        item_data = _fetch_item_with_price(barcode_entry, profile.get("selling_price_list"))
-        if not item_data:
-            return None
 
-        # Normal barcodes always have qty=1
-        item_data["qty"] = 1
+# (extract, apply) per compiled rule type - add new formats here
+BARCODE_DECODERS = {
+    RULE_WEIGHT: (_extract_item_code, _apply_weight),
+    RULE_PRIVATE: (_extract_item_code, _apply_private),
+    RULE_PRICE: (_extract_item_code, _apply_price),
+    RULE_GS1: (_extract_gs1, _apply_gs1),
+}
+
+
+def _lookup_barcodes(barcodes):
+    """
+    Normal barcodes -> item codes from the Item Barcode table.
+    Served from the site barcode index when ready (no SQL), otherwise
+    one IN query.
 
-        return item_data
+    Returns:
+        dict: {barcode: {"item_code", "uom"}} for barcodes that exist
+    """
+    barcodes = [barcode for barcode in barcodes if barcode]
+    if not barcodes:
+        return {}
+
+    try:
+        if ensure_barcode_index():
+            return get_barcode_entries(barcodes)
+
+        rows = frappe.get_all(
+            "Item Barcode",
+            filters={"barcode": ["in", barcodes]},
+            fields=["barcode", "parent", "uom"],
+            limit_page_length=0
+        )
+        return {row.barcode: {"item_code": row.parent, "uom": row.uom} for row in rows}
 
     except Exception as e:
         frappe.logger().error(f"Normal barcode error: {str(e)}")
-        return None
+        return {}
 
 
-def _fetch_item_with_price(item_code, price_list):
+def _fetch_barcode_items(item_codes, indexed=None):
     """
     Central query for all barcode types.
-    Returns only required fields for invoice creation.
+    Returns only required fields for invoice creation, at rate 0: rates
+    come from resolve_item_prices (customer, UOM and validity aware), and
+    an item it finds no price for stays at 0, like get_items.
+    Served from the site barcode index when ready, otherwise one query.
+    indexed, when given, receives the barcode index entries used.
 
     Returns:
-        dict: {item_code, item_name, stock_uom, max_discount, price_list_rate}
-              or None if not found/invalid
+        dict: {item_code: {item_code, item_name, stock_uom, uom, max_discount,
+                           price_list_rate, rate, base_rate}}
+              valid (enabled, non fixed asset) items only
     """
+    item_codes = [item_code for item_code in item_codes if item_code]
+    if not item_codes:
+        return {}
+
     try:
-        # Single optimized query joining Item and Item Price
-        result = frappe.db.sql(
-            """
-            SELECT
-                `tabItem`.name as item_code,
-                `tabItem`.item_name,
-                `tabItem`.stock_uom,
-                `tabItem`.max_discount,
-                COALESCE(`tabItem Price`.price_list_rate, 0) as price_list_rate
-            FROM `tabItem`
-            LEFT JOIN `tabItem Price`
-                ON `tabItem`.name = `tabItem Price`.item_code
-                AND `tabItem Price`.selling = 1
-                AND `tabItem Price`.price_list = %(price_list)s
-            WHERE `tabItem`.name = %(item_code)s
-                AND `tabItem`.disabled = 0
-                AND `tabItem`.is_fixed_asset = 0
-            LIMIT 1
-            """,
-            {
-                "item_code": item_code,
-                "price_list": price_list
-            },
-            as_dict=True
+        if ensure_barcode_index():
+            entries = get_indexed_items(item_codes)
+            if indexed is not None:
+                indexed.update(entries)
+            return {item_code: _build_barcode_result(entry, 0) for item_code, entry in entries.items()}
+
+        rows = frappe.get_all(
+            "Item",
+            filters={"name": ["in", item_codes], "disabled": 0, "is_fixed_asset": 0},
+            fields=["name as item_code", "item_name", "stock_uom", "max_discount"],
+            limit_page_length=0
         )
+        return {row.item_code: _build_barcode_result(row, 0) for row in rows}
 
-        if not result:
-            return None
+    except Exception as e:
+        frappe.logger().error(f"Error fetching items: {item_codes} - Error: {str(e)}")
+        return {}
 
-        item = result[0]
 
-        # Return clean response
-        return {
-            "item_code": item.get("item_code"),
-            "item_name": item.get("item_name"),
-            "stock_uom": item.get("stock_uom"),
-            "uom": item.get("stock_uom"),  # Default UOM
-            "max_discount": item.get("max_discount", 0),
-            "price_list_rate": item.get("price_list_rate", 0),
-            "rate": item.get("price_list_rate", 0),  # Same as price_list_rate
-            "base_rate": item.get("price_list_rate", 0),  # Same as price_list_rate
-        }
-
-    except Exception as e:
-        frappe.logger().error(f"Error fetching item: {item_code} - Error: {str(e)}")
-        return None
+def _build_barcode_result(item, rate):
+    """Barcode response for an item row or barcode index entry"""
+    return {
+        "item_code": item.get("item_code"),
+        "item_name": item.get("item_name"),
+        "stock_uom": item.get("stock_uom"),
+        "uom": item.get("stock_uom"),  # Default UOM
+        "max_discount": item.get("max_discount") or 0,
+        "price_list_rate": rate or 0,
+        "rate": rate or 0,  # Same as price_list_rate
+        "base_rate": rate or 0,  # Same as price_list_rate
+    }
@@ -0,0 +1,786 @@
+# -*- coding: utf-8 -*-
+"""
+Item Cache Module
+Site-wide Redis caches for the POS item path and the doc_events that keep
+them in sync with Item, Item Price and stock changes.
+"""
+from __future__ import unicode_literals
+import gzip
+import pickle
+import time
+import frappe
+import redis
+from frappe.utils import cint, nowdate
+
+
+# Monotonic catalog version (raw Redis counter)
+CATALOG_VERSION_KEY = "posa_item_catalog_version"
+
+# Sorted set: item_code scored by the catalog version of its last change
+CATALOG_CHANGES_KEY = "posa_item_catalog_change_log"
+
+# Oldest version still covered by the change log (raw; older clients must reload)
+CATALOG_FLOOR_KEY = "posa_item_catalog_change_floor"
+
+# Last day whose Item Price validity changes were recorded (raw date string)
+CATALOG_DAY_KEY = "posa_item_catalog_day"
+
+# Hash: "price_list::warehouse" -> catalog version of its snapshot rows
+CATALOG_SNAPSHOT_KEY = "posa_item_catalog_snapshot_version"
+
+# Hash per "price_list::warehouse": item_code -> catalog row
+CATALOG_ROWS_KEY = "posa_item_catalog_rows"
+
+# Held while a snapshot is brought up to date
+CATALOG_LOCK_KEY = "posa_item_catalog_lock"
+CATALOG_LOCK_TIMEOUT = 120
+
+# Hash: "price_list::warehouse" -> {"version": int, "built": epoch, "blob": gzip bytes}
+CATALOG_EXPORT_KEY = "posa_item_catalog_export"
+
+# An export this young is served even if the version moved since (stock
+# moves with every sale); terminals catch up with get_item_catalog_delta
+CATALOG_EXPORT_MAX_AGE = 120
+
+# Export columns: plain arrays, and low-cardinality strings stored as
+# indexes into one shared string dictionary
+CATALOG_VALUE_COLUMNS = ("item_code", "item_name", "price_list_rate", "actual_qty")
+CATALOG_DICT_COLUMNS = ("item_group", "stock_uom", "currency")
+
+# Upper bound on tracked item changes before the oldest half is pruned
+MAX_TRACKED_CHANGES = 20000
+
+# Hash: barcode -> {"item_code", "uom"}
+BARCODE_INDEX_KEY = "posa_barcode_index"
+
+# Hash: item_code -> {item fields, "barcodes": [...],
+#   "price_rows": {price_list: [generic selling rows]}, "price_customers": [...],
+#   "conversions": {uom: factor}} - price_rows / conversions feed item_price
+BARCODE_ITEMS_KEY = "posa_barcode_items"
+
+# Set once the barcode index is fully built
+BARCODE_INDEX_READY_KEY = "posa_barcode_index_ready"
+
+# Raw flag held from scheduling a build until it finishes (expires if the job is lost)
+BARCODE_INDEX_BUILD_KEY = "posa_barcode_index_build"
+BARCODE_INDEX_BUILD_TIMEOUT = 1800
+
+# Set: item codes changed while a build runs, replayed after the swap
+BARCODE_INDEX_PENDING_KEY = "posa_barcode_index_pending"
+
+# Raw flag set by a failed build; no new build is scheduled until it expires
+BARCODE_INDEX_FAILED_KEY = "posa_barcode_index_failed"
+BARCODE_INDEX_RETRY_AFTER = 300
+
+# Hash fields written per HSET when building large hashes
+HASH_WRITE_CHUNK_SIZE = 5000
+
+# Set of warehouses with pending stock pushes
+STOCK_DIRTY_WAREHOUSES_KEY = "posa_stock_dirty_warehouses"
+
+# Set per warehouse: item codes whose qty changed since the last push
+STOCK_DIRTY_ITEMS_KEY = "posa_stock_dirty_items"
+
+# Realtime event received by terminals subscribed to the Warehouse doc room
+STOCK_UPDATE_EVENT = "posa_stock_update"
+
+# Item codes popped per SPOP while flushing a warehouse
+STOCK_PUSH_BATCH_SIZE = 1000
+
+# Value: {item_group: {"lft", "rgt", "parent_item_group", "is_group"}}
+ITEM_GROUP_TREE_KEY = "posa_item_group_tree"
+
+# INCR + ZADD in one step so no reader sees the new version before its
+# changes; past ARGV[1] entries the oldest half is dropped and the floor raised
+_RECORD_CHANGES_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+for index = 2, #ARGV do
+    redis.call('ZADD', KEYS[2], version, ARGV[index])
+end
+local size = redis.call('ZCARD', KEYS[2])
+if size > tonumber(ARGV[1]) then
+    local cut = math.floor(size / 2)
+    local last = redis.call('ZRANGE', KEYS[2], cut - 1, cut - 1, 'WITHSCORES')
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, cut - 1)
+    redis.call('SET', KEYS[3], last[2])
+end
+return version
+"""
+
+
+# =============================================================================
+# CATALOG VERSIONING
+# =============================================================================
+
+def get_catalog_version():
+    """Current catalog version (0 when nothing has changed yet)"""
+    cache = frappe.cache()
+    return cint(frappe.safe_decode(cache.get(cache.make_key(CATALOG_VERSION_KEY)) or 0))
+
+
+def get_catalog_floor():
+    """Oldest version a client may still sync deltas from"""
+    cache = frappe.cache()
+    return cint(frappe.safe_decode(cache.get(cache.make_key(CATALOG_FLOOR_KEY)) or 0))
+
+
+def bump_catalog_version(item_codes):
+    """
+    Record a change for the given items.
+    Deferred until commit so a concurrent reader never stamps a snapshot
+    with a version whose rows it could not see yet.
+    """
+    item_codes = [code for code in set(item_codes or []) if code]
+    if not item_codes:
+        return
+
+    frappe.db.after_commit.add(lambda: _record_catalog_changes(item_codes))
+
+
+def _record_catalog_changes(item_codes):
+    try:
+        cache = frappe.cache()
+        cache.eval(
+            _RECORD_CHANGES_SCRIPT,
+            3,
+            cache.make_key(CATALOG_VERSION_KEY),
+            cache.make_key(CATALOG_CHANGES_KEY),
+            cache.make_key(CATALOG_FLOOR_KEY),
+            MAX_TRACKED_CHANGES,
+            *item_codes
+        )
+
+    except Exception as e:
+        frappe.log_error(f"Error in _record_catalog_changes: {str(e)}", "POS Item Cache Error")
+
+
+def get_changed_item_codes(since_version):
+    """
+    Item codes changed after since_version (one ZRANGEBYSCORE), or None if
+    the log no longer covers it - or since_version is ahead of the catalog,
+    i.e. the counter was reset.
+    """
+    since_version = cint(since_version)
+    if since_version < get_catalog_floor() or since_version > get_catalog_version():
+        return None
+
+    cache = frappe.cache()
+    item_codes = redis.Redis.zrangebyscore(
+        cache, cache.make_key(CATALOG_CHANGES_KEY), f"({since_version}", "+inf"
+    )
+    return [frappe.safe_decode(item_code) for item_code in item_codes]
+
+
+def roll_catalog_day():
+    """
+    Catalog rows apply Item Price validity against CURDATE. On the first
+    catalog access of a day, record a change for the items whose price
+    validity started or ended since the last recorded day, so snapshots and
+    deltas pick those up like any other change (no per-day rebuild).
+    """
+    try:
+        cache = frappe.cache()
+        today = nowdate()
+        last_day = frappe.safe_decode(redis.Redis.getset(cache, cache.make_key(CATALOG_DAY_KEY), today))
+        if not last_day or last_day == today:
+            return
+
+        item_codes = frappe.db.sql_list(
+            """
+            SELECT DISTINCT item_code
+            FROM `tabItem Price`
+            WHERE selling = 1
+                AND ((valid_from > %(last_day)s AND valid_from <= %(today)s)
+                    OR (valid_upto >= %(last_day)s AND valid_upto < %(today)s))
+            """,
+            {"last_day": last_day, "today": today}
+        )
+        if item_codes:
+            _record_catalog_changes(item_codes)
+
+    except Exception as e:
+        frappe.log_error(f"Error in roll_catalog_day: {str(e)}", "POS Item Cache Error")
+
+
+# =============================================================================
+# CATALOG SNAPSHOT
+# =============================================================================
+
+def get_catalog_rows(price_list, warehouse, item_codes=None):
+    """
+    Catalog rows for a (price_list, warehouse) pair.
+    Same columns and filters as get_items, optionally restricted to item_codes.
+    """
+    conditions = [
+        "`tabItem`.disabled = 0",
+        "`tabItem`.is_sales_item = 1",
+        "`tabItem`.has_variants = 0"
+    ]
+    params = {
+        "price_list": price_list,
+        "warehouse": warehouse
+    }
+
+    if item_codes is not None:
+        if not item_codes:
+            return []
+        conditions.append("`tabItem`.name IN %(item_codes)s")
+        params["item_codes"] = tuple(item_codes)
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            `tabItem`.name as item_code,
+            `tabItem`.item_name,
+            `tabItem`.item_group,
+            `tabItem`.stock_uom,
+            `tabItem Price`.price_list_rate,
+            `tabItem Price`.price_list_rate as rate,
+            `tabItem Price`.price_list_rate as base_rate,
+            `tabItem Price`.currency,
+            COALESCE(`tabBin`.actual_qty, 0) as actual_qty
+        FROM `tabItem`
+        LEFT JOIN `tabItem Price`
+            ON `tabItem`.name = `tabItem Price`.item_code
+            AND `tabItem Price`.selling = 1
+            AND `tabItem Price`.price_list = %(price_list)s
+            AND (`tabItem Price`.valid_from IS NULL OR `tabItem Price`.valid_from <= CURDATE())
+            AND (`tabItem Price`.valid_upto IS NULL OR `tabItem Price`.valid_upto >= CURDATE())
+        LEFT JOIN `tabBin`
+            ON `tabItem`.name = `tabBin`.item_code
+            AND `tabBin`.warehouse = %(warehouse)s
+        WHERE {" AND ".join(conditions)}
+        ORDER BY `tabItem`.item_name ASC
+        """,
+        params,
+        as_dict=True
+    )
+
+
+def get_catalog_snapshot(price_list, warehouse):
+    """
+    Cached catalog snapshot, brought up to the current version.
+
+    Returns:
+        dict: {"version": int, "items": {item_code: row}}
+    """
+    version = refresh_catalog_snapshot(price_list, warehouse)
+    return {"version": version, "items": _hgetall(_catalog_rows_key(price_list, warehouse))}
+
+
+def _catalog_rows_key(price_list, warehouse):
+    return f"{CATALOG_ROWS_KEY}:{price_list}::{warehouse}"
+
+
+def refresh_catalog_snapshot(price_list, warehouse):
+    """
+    Bring the snapshot rows of (price_list, warehouse) up to the current
+    version: only items changed since the stored version are re-queried and
+    rewritten field by field. A full rebuild is written to a staging key
+    and swapped in with RENAME, so readers never see a partial snapshot.
+
+    Returns:
+        int: the version the rows are at
+    """
+    snapshot_key = f"{price_list}::{warehouse}"
+    rows_key = _catalog_rows_key(price_list, warehouse)
+    cache = frappe.cache()
+
+    roll_catalog_day()
+    version = get_catalog_version()
+    if _get_snapshot_version(snapshot_key) == version:
+        return version
+
+    with cache.lock(
+        cache.make_key(f"{CATALOG_LOCK_KEY}:{snapshot_key}"),
+        timeout=CATALOG_LOCK_TIMEOUT,
+        blocking_timeout=CATALOG_LOCK_TIMEOUT
+    ):
+        # Another worker may have brought it up to date while we waited
+        stored = _get_snapshot_version(snapshot_key)
+        version = get_catalog_version()
+        if stored == version:
+            return version
+
+        changed = get_changed_item_codes(stored) if stored is not None else None
+
+        if changed is None:
+            rows = get_catalog_rows(price_list, warehouse)
+            staging_key = f"{rows_key}:staging"
+            cache.delete_value(staging_key)
+            _write_hash(staging_key, {row.item_code: row for row in rows})
+            if rows:
+                redis.Redis.rename(cache, cache.make_key(staging_key), cache.make_key(rows_key))
+            else:
+                cache.delete_value(rows_key)
+        elif changed:
+            rows = {row.item_code: row for row in get_catalog_rows(price_list, warehouse, changed)}
+            removed = [item_code for item_code in changed if item_code not in rows]
+            if removed:
+                redis.Redis.hdel(cache, cache.make_key(rows_key), *removed)
+            _write_hash(rows_key, rows)
+
+        redis.Redis.hset(cache, cache.make_key(CATALOG_SNAPSHOT_KEY), snapshot_key, pickle.dumps(version))
+
+    return version
+
+
+def _get_snapshot_version(snapshot_key):
+    """Stored snapshot version, read from Redis (not the request-local hget cache)"""
+    return _hmget(CATALOG_SNAPSHOT_KEY, [snapshot_key]).get(snapshot_key)
+
+
+def encode_catalog_columns(rows):
+    """
+    Columnar form of catalog rows, sorted by item_name.
+    rate / base_rate are not sent - they equal price_list_rate.
+
+    Returns:
+        dict: {"count", "strings": [...], "columns": {column: [...]}}
+    """
+    rows = sorted(rows, key=lambda row: (row.get("item_name") or "", row.get("item_code")))
+    strings = []
+    string_index = {}
+    columns = {column: [] for column in CATALOG_VALUE_COLUMNS + CATALOG_DICT_COLUMNS}
+
+    for row in rows:
+        for column in CATALOG_VALUE_COLUMNS:
+            columns[column].append(row.get(column))
+        for column in CATALOG_DICT_COLUMNS:
+            value = row.get(column) or ""
+            if value not in string_index:
+                string_index[value] = len(strings)
+                strings.append(value)
+            columns[column].append(string_index[value])
+
+    return {"count": len(rows), "strings": strings, "columns": columns}
+
+
+def get_catalog_export(price_list, warehouse):
+    """
+    Gzipped columnar JSON of the catalog snapshot.
+    Compressed once and shared by all terminals; rebuilt when the version
+    moved and the export is older than CATALOG_EXPORT_MAX_AGE.
+
+    Returns:
+        tuple: (version, gzip bytes)
+    """
+    export_key = f"{price_list}::{warehouse}"
+    cache = frappe.cache()
+    version = get_catalog_version()
+    export = cache.hget(CATALOG_EXPORT_KEY, export_key)
+
+    if export and (
+        export.get("version") == version
+        or time.time() - export.get("built", 0) < CATALOG_EXPORT_MAX_AGE
+    ):
+        return export["version"], export["blob"]
+
+    snapshot = get_catalog_snapshot(price_list, warehouse)
+    payload = dict(
+        encode_catalog_columns(snapshot["items"].values()),
+        version=snapshot["version"],
+        price_list=price_list,
+        warehouse=warehouse
+    )
+    blob = gzip.compress(frappe.as_json(payload, indent=None).encode("utf-8"))
+
+    cache.hset(CATALOG_EXPORT_KEY, export_key, {
+        "version": snapshot["version"],
+        "built": time.time(),
+        "blob": blob
+    })
+    return snapshot["version"], blob
+
+
+# =============================================================================
+# BARCODE INDEX
+# =============================================================================
+
+def is_barcode_index_ready():
+    """True once build_barcode_index has completed"""
+    cache = frappe.cache()
+    return bool(redis.Redis.exists(cache, cache.make_key(BARCODE_INDEX_READY_KEY)))
+
+
+def ensure_barcode_index():
+    """
+    Check the index and schedule a build when it is missing.
+    Callers fall back to SQL while this returns False. One build is
+    scheduled at a time, and none while a failed build's backoff runs.
+    """
+    if is_barcode_index_ready():
+        return True
+
+    cache = frappe.cache()
+    if redis.Redis.exists(cache, cache.make_key(BARCODE_INDEX_FAILED_KEY)):
+        return False
+
+    if not redis.Redis.set(
+        cache, cache.make_key(BARCODE_INDEX_BUILD_KEY), 1, nx=True, ex=BARCODE_INDEX_BUILD_TIMEOUT
+    ):
+        return False
+
+    frappe.enqueue(
+        "posawesome.posawesome.api.item_cache.build_barcode_index",
+        queue="long",
+        job_id="posa_build_barcode_index",
+        deduplicate=True,
+    )
+    return False
+
+
+def get_indexed_item(item_code):
+    """Indexed sellable item (see BARCODE_ITEMS_KEY) or None"""
+    return frappe.cache().hget(BARCODE_ITEMS_KEY, item_code)
+
+
+def _hmget(name, fields):
+    """{field: value} for the fields present in a pickled hash, in one round trip"""
+    fields = list(fields)
+    if not fields:
+        return {}
+
+    cache = frappe.cache()
+    values = redis.Redis.hmget(cache, cache.make_key(name), fields)
+    return {field: pickle.loads(value) for field, value in zip(fields, values) if value}
+
+
+def _hgetall(name):
+    """{field: value} of a whole pickled hash"""
+    cache = frappe.cache()
+    values = redis.Redis.hgetall(cache, cache.make_key(name))
+    return {frappe.safe_decode(field): pickle.loads(value) for field, value in values.items()}
+
+
+def get_barcode_entries(barcodes):
+    """Indexed {barcode: {"item_code", "uom"}} for the barcodes that exist"""
+    return _hmget(BARCODE_INDEX_KEY, barcodes)
+
+
+def get_indexed_items(item_codes):
+    """Indexed {item_code: entry} for the sellable items among item_codes"""
+    return _hmget(BARCODE_ITEMS_KEY, item_codes)
+
+
+def _load_barcode_items(item_codes=None):
+    """Index entries for sellable items, optionally restricted to item_codes"""
+    item_filters = {"disabled": 0, "is_fixed_asset": 0}
+    child_filters = {}
+    price_filters = {"selling": 1}
+    if item_codes is not None:
+        item_filters["name"] = ["in", item_codes]
+        child_filters["parent"] = ["in", item_codes]
+        price_filters["item_code"] = ["in", item_codes]
+
+    entries = {}
+    for item in frappe.get_all(
+        "Item",
+        filters=item_filters,
+        fields=["name", "item_name", "stock_uom", "max_discount"],
+        limit_page_length=0
+    ):
+        entries[item.name] = {
+            "item_code": item.name,
+            "item_name": item.item_name,
+            "stock_uom": item.stock_uom,
+            "max_discount": item.max_discount or 0,
+            "barcodes": [],
+            "price_rows": {},
+            "price_customers": [],
+            "conversions": {}
+        }
+
+    for row in frappe.get_all(
+        "Item Barcode",
+        filters=child_filters,
+        fields=["parent", "barcode", "uom"],
+        limit_page_length=0
+    ):
+        if row.parent in entries and row.barcode:
+            entries[row.parent]["barcodes"].append({"barcode": row.barcode, "uom": row.uom})
+
+    for row in frappe.get_all(
+        "UOM Conversion Detail",
+        filters=dict(child_filters, parenttype="Item"),
+        fields=["parent", "uom", "conversion_factor"],
+        limit_page_length=0
+    ):
+        if row.parent in entries:
+            entries[row.parent]["conversions"][row.uom] = row.conversion_factor
+
+    # Latest valid_from first, like item_price's resolver
+    for row in frappe.get_all(
+        "Item Price",
+        filters=price_filters,
+        fields=["item_code", "price_list", "price_list_rate", "uom", "customer", "valid_from", "valid_upto"],
+        order_by="valid_from desc",
+        limit_page_length=0
+    ):
+        entry = entries.get(row.item_code)
+        if not entry:
+            continue
+
+        if row.customer:
+            if row.customer not in entry["price_customers"]:
+                entry["price_customers"].append(row.customer)
+        else:
+            entry["price_rows"].setdefault(row.price_list, []).append({
+                "uom": row.uom,
+                "price_list_rate": row.price_list_rate,
+                "valid_from": row.valid_from,
+                "valid_upto": row.valid_upto,
+            })
+
+    return entries
+
+
+def _write_hash(name, mapping):
+    """HSET a large mapping in chunks, pickled the way RedisWrapper.hget expects"""
+    cache = frappe.cache()
+    key = cache.make_key(name)
+    items = list(mapping.items())
+    for start in range(0, len(items), HASH_WRITE_CHUNK_SIZE):
+        chunk = items[start:start + HASH_WRITE_CHUNK_SIZE]
+        redis.Redis.hset(cache, key, mapping={field: pickle.dumps(value) for field, value in chunk})
+
+
+def build_barcode_index():
+    """
+    Build the site barcode index from Item, Item Barcode and Item Price.
+    The new index is written to staging keys and swapped in atomically, so
+    scans keep using the previous index meanwhile. Items changed during the
+    build are recorded by refresh_barcode_items and replayed after the swap.
+    """
+    cache = frappe.cache()
+    build_key = cache.make_key(BARCODE_INDEX_BUILD_KEY)
+    staging = {
+        BARCODE_ITEMS_KEY: f"{BARCODE_ITEMS_KEY}:staging",
+        BARCODE_INDEX_KEY: f"{BARCODE_INDEX_KEY}:staging",
+    }
+
+    try:
+        # Before reading the DB: changes from here on are recorded as pending
+        redis.Redis.set(cache, build_key, 1, ex=BARCODE_INDEX_BUILD_TIMEOUT)
+        cache.delete_value([BARCODE_INDEX_PENDING_KEY] + list(staging.values()))
+
+        entries = _load_barcode_items()
+        barcodes = {}
+        for entry in entries.values():
+            for row in entry["barcodes"]:
+                barcodes[row["barcode"]] = {"item_code": entry["item_code"], "uom": row["uom"]}
+
+        _write_hash(staging[BARCODE_ITEMS_KEY], entries)
+        _write_hash(staging[BARCODE_INDEX_KEY], barcodes)
+
+        pipe = redis.Redis.pipeline(cache)
+        for name, mapping in ((BARCODE_ITEMS_KEY, entries), (BARCODE_INDEX_KEY, barcodes)):
+            if mapping:
+                pipe.rename(cache.make_key(staging[name]), cache.make_key(name))
+            else:
+                pipe.delete(cache.make_key(name))
+        pipe.set(cache.make_key(BARCODE_INDEX_READY_KEY), pickle.dumps(True))
+        pipe.delete(cache.make_key(BARCODE_INDEX_FAILED_KEY))
+        pipe.execute()
+
+    except Exception as e:
+        frappe.log_error(f"Error in build_barcode_index: {str(e)}", "POS Item Cache Error")
+        redis.Redis.set(cache, cache.make_key(BARCODE_INDEX_FAILED_KEY), 1, ex=BARCODE_INDEX_RETRY_AFTER)
+        cache.delete_value([BARCODE_INDEX_BUILD_KEY] + list(staging.values()))
+        return
+
+    # Index is live: later changes apply directly; replay those made meanwhile
+    redis.Redis.delete(cache, build_key)
+    pending_key = cache.make_key(BARCODE_INDEX_PENDING_KEY)
+    while True:
+        item_codes = redis.Redis.spop(cache, pending_key, HASH_WRITE_CHUNK_SIZE)
+        if not item_codes:
+            break
+        refresh_barcode_items([frappe.safe_decode(item_code) for item_code in item_codes])
+
+
+def refresh_barcode_items(item_codes):
+    """
+    Re-read the index entries of changed items. While a build runs they are
+    also recorded for replay (the build may have read them before the change);
+    no-op on the index until it is built.
+    """
+    try:
+        cache = frappe.cache()
+        if redis.Redis.exists(cache, cache.make_key(BARCODE_INDEX_BUILD_KEY)):
+            redis.Redis.sadd(cache, cache.make_key(BARCODE_INDEX_PENDING_KEY), *item_codes)
+
+        if not is_barcode_index_ready():
+            return
+
+        entries = _load_barcode_items(item_codes)
+
+        for item_code in item_codes:
+            old_entry = get_indexed_item(item_code)
+            if old_entry:
+                for row in old_entry["barcodes"]:
+                    cache.hdel(BARCODE_INDEX_KEY, row["barcode"])
+
+            entry = entries.get(item_code)
+            if not entry:
+                cache.hdel(BARCODE_ITEMS_KEY, item_code)
+                continue
+
+            cache.hset(BARCODE_ITEMS_KEY, item_code, entry)
+            for row in entry["barcodes"]:
+                cache.hset(BARCODE_INDEX_KEY, row["barcode"], {"item_code": item_code, "uom": row["uom"]})
+
+    except Exception as e:
+        frappe.log_error(f"Error in refresh_barcode_items: {str(e)}", "POS Item Cache Error")
+
+
+# =============================================================================
+# REALTIME STOCK PUSH
+# =============================================================================
+
+def _dirty_items_key(warehouse):
+    return frappe.cache().make_key(f"{STOCK_DIRTY_ITEMS_KEY}:{warehouse}")
+
+
+def queue_stock_push(item_code, warehouse):
+    """
+    Mark (item_code, warehouse) dirty and schedule a flush.
+    Changes that arrive while a flush is queued are coalesced into it.
+    """
+    try:
+        cache = frappe.cache()
+        redis.Redis.sadd(cache, _dirty_items_key(warehouse), item_code)
+        redis.Redis.sadd(cache, cache.make_key(STOCK_DIRTY_WAREHOUSES_KEY), warehouse)
+
+        frappe.enqueue(
+            "posawesome.posawesome.api.item_cache.flush_stock_push",
+            queue="short",
+            job_id="posa_flush_stock_push",
+            deduplicate=True,
+        )
+
+    except Exception as e:
+        frappe.log_error(f"Error in queue_stock_push: {str(e)}", "POS Item Cache Error")
+
+
+def flush_stock_push():
+    """
+    Publish {item_code: actual_qty} per dirty warehouse to the terminals
+    subscribed to that Warehouse. Also runs from the scheduler to pick up
+    changes that raced with a finishing flush.
+    """
+    cache = frappe.cache()
+    warehouses_key = cache.make_key(STOCK_DIRTY_WAREHOUSES_KEY)
+
+    while True:
+        warehouse = redis.Redis.spop(cache, warehouses_key)
+        if not warehouse:
+            break
+
+        warehouse = frappe.safe_decode(warehouse)
+        try:
+            item_codes = redis.Redis.spop(cache, _dirty_items_key(warehouse), STOCK_PUSH_BATCH_SIZE)
+            if not item_codes:
+                continue
+
+            # More left than one batch: keep the warehouse dirty for the next pass
+            if redis.Redis.scard(cache, _dirty_items_key(warehouse)):
+                redis.Redis.sadd(cache, warehouses_key, warehouse)
+
+            item_codes = [frappe.safe_decode(code) for code in item_codes]
+            qty = dict.fromkeys(item_codes, 0)
+            for row in frappe.get_all(
+                "Bin",
+                filters={"warehouse": warehouse, "item_code": ["in", item_codes]},
+                fields=["item_code", "actual_qty"]
+            ):
+                qty[row.item_code] = row.actual_qty
+
+            frappe.publish_realtime(
+                STOCK_UPDATE_EVENT,
+                {"warehouse": warehouse, "qty": qty},
+                doctype="Warehouse",
+                docname=warehouse
+            )
+
+        except Exception as e:
+            frappe.log_error(f"Error in flush_stock_push: {str(e)}", "POS Item Cache Error")
+
+
+# =============================================================================
+# ITEM GROUP TREE
+# =============================================================================
+
+def get_item_group_tree():
+    """Cached Item Group nested-set tree, ordered by lft"""
+    return frappe.cache().get_value(ITEM_GROUP_TREE_KEY, generator=_load_item_group_tree)
+
+
+def _load_item_group_tree():
+    groups = frappe.get_all(
+        "Item Group",
+        fields=["name", "lft", "rgt", "parent_item_group", "is_group"],
+        order_by="lft asc",
+        limit_page_length=0
+    )
+    return {
+        group.name: {
+            "lft": group.lft,
+            "rgt": group.rgt,
+            "parent_item_group": group.parent_item_group,
+            "is_group": group.is_group
+        }
+        for group in groups
+    }
+
+
+def get_item_group_bounds(item_group):
+    """
+    (name, lft, rgt, is_group) of an Item Group, matched case-insensitively
+    (the POS sends lowercased group names), or None if unknown.
+    """
+    tree = get_item_group_tree()
+    if item_group in tree:
+        name = item_group
+    else:
+        wanted = item_group.strip().lower()
+        name = next((group for group in tree if group.lower() == wanted), None)
+        if not name:
+            return None
+
+    node = tree[name]
+    return name, node["lft"], node["rgt"], node["is_group"]
+
+
+# =============================================================================
+# DOC EVENTS
+# =============================================================================
+
+def on_item_change(doc, method=None, *args):
+    """
+    Item on_update / on_trash / after_rename (args: old_name, new_name, merge)
+    Item Barcode rows are saved through their parent Item, so this also
+    covers barcode edits.
+    """
+    item_codes = [doc.name] + list(args[:1])
+    bump_catalog_version(item_codes)
+    frappe.db.after_commit.add(lambda: refresh_barcode_items(item_codes))
+
+
+def on_item_price_change(doc, method=None):
+    """Item Price on_update / on_trash"""
+    bump_catalog_version([doc.item_code])
+    frappe.db.after_commit.add(lambda: refresh_barcode_items([doc.item_code]))
+
+
+def on_stock_ledger_change(doc, method=None):
+    """Stock Ledger Entry on_submit / on_cancel - Bin qty changed"""
+    bump_catalog_version([doc.item_code])
+    item_code, warehouse = doc.item_code, doc.warehouse
+    frappe.db.after_commit.add(lambda: queue_stock_push(item_code, warehouse))
+
+
+def on_item_group_change(doc, method=None, *args):
+    """Item Group on_update / on_trash / after_rename - drop the cached tree"""
+    # After commit, so no request re-caches the tree from uncommitted reads
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_value(ITEM_GROUP_TREE_KEY))
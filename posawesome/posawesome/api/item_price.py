@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Item Price Resolution Module
+Effective selling rate for (item, uom, price list, customer, date) in one
+batched call, shared by get_items and the barcode path.
+
+Resolved prices live in a bounded per-process LRU per site. Item Price
+changes bump a site-wide Redis version; a worker that sees a new version
+drops that site's LRU. Items of the barcode index with no customer-specific
+price for the customer resolve from their index entry instead.
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict
+import frappe
+from frappe.utils import cint, flt, getdate, nowdate
+
+
+# Raw Redis counter bumped after every Item Price change
+PRICE_VERSION_KEY = "posa_item_price_version"
+
+# Resolved prices kept per site and worker process
+MAX_CACHED_PRICES = 50000
+
+# Sites with an LRU kept per worker process
+MAX_CACHED_SITES = 16
+
+# site -> (price version, LRU of resolved prices)
+_price_caches = OrderedDict()
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+def _get_price_version():
+    cache = frappe.cache()
+    return cint(frappe.safe_decode(cache.get(cache.make_key(PRICE_VERSION_KEY)) or 0))
+
+
+def _get_site_price_cache():
+    """This site's LRU, replaced when the site price version moved"""
+    site = frappe.local.site
+    version = _get_price_version()
+
+    cached = _price_caches.get(site)
+    if cached is None or cached[0] != version:
+        cached = (version, OrderedDict())
+        _price_caches[site] = cached
+        while len(_price_caches) > MAX_CACHED_SITES:
+            _price_caches.popitem(last=False)
+    else:
+        _price_caches.move_to_end(site)
+
+    return cached[1]
+
+
+def _cache_get(price_cache, key):
+    if key in price_cache:
+        price_cache.move_to_end(key)
+        return price_cache[key]
+    return None
+
+
+def _cache_set(price_cache, key, value):
+    price_cache[key] = value
+    price_cache.move_to_end(key)
+    while len(price_cache) > MAX_CACHED_PRICES:
+        price_cache.popitem(last=False)
+
+
+def on_item_price_change(doc, method=None):
+    """Item Price on_update / on_trash - invalidate resolved prices on all workers"""
+    frappe.db.after_commit.add(_bump_price_version)
+
+
+def _bump_price_version():
+    cache = frappe.cache()
+    cache.incr(cache.make_key(PRICE_VERSION_KEY))
+
+
+# =============================================================================
+# RESOLUTION
+# =============================================================================
+
+def get_price_list_chain(price_list, customer=None):
+    """
+    Price lists to try, in order: customer's default price list, customer
+    group's default price list, then the given (POS Profile) price list.
+    """
+    chain = []
+    if customer:
+        customer_price_list, customer_group = frappe.get_cached_value(
+            "Customer", customer, ["default_price_list", "customer_group"]
+        ) or (None, None)
+        group_price_list = customer_group and frappe.get_cached_value(
+            "Customer Group", customer_group, "default_price_list"
+        )
+        chain.extend([customer_price_list, group_price_list])
+
+    chain.append(price_list)
+
+    result = []
+    for name in chain:
+        if name and name not in result:
+            result.append(name)
+    return result
+
+
+def resolve_item_prices(items, price_list, customer=None, transaction_date=None, indexed=None):
+    """
+    Effective selling rates for a batch of items.
+
+    Args:
+        items: list of {"item_code", "uom" (optional, default stock UOM)}
+        price_list: POS Profile / selected price list
+        customer: optional, adds customer and customer group price lists
+                  and customer-specific Item Price rows
+        transaction_date: validity date (default today)
+        indexed: optional {item_code: barcode index entry}; items without a
+                 customer-specific price for customer resolve from the entry
+
+    Returns:
+        list: aligned with items, each
+              {"item_code", "uom", "price_list", "price_list_rate", "conversion_factor"}
+              price_list is None (rate 0) when no price applies
+    """
+    price_cache = _get_site_price_cache()
+    indexed = indexed or {}
+
+    chain = tuple(get_price_list_chain(price_list, customer))
+    date = str(getdate(transaction_date or nowdate()))
+
+    results = [None] * len(items)
+    missing = []
+    for index, item in enumerate(items):
+        entry = indexed.get(item.get("item_code"))
+        if entry and "price_rows" in entry and customer not in entry["price_customers"]:
+            results[index] = _resolve_from_entry(entry, item.get("uom"), chain, date)
+            continue
+
+        key = (item.get("item_code"), item.get("uom") or "", chain, customer or "", date)
+        cached = _cache_get(price_cache, key)
+        if cached is not None:
+            results[index] = dict(cached)
+        else:
+            missing.append((index, key))
+
+    if missing:
+        resolved = _resolve_from_db({key[0] for _index, key in missing if key[0]}, chain, customer, date)
+        for index, key in missing:
+            value = resolved(key[0], key[1])
+            _cache_set(price_cache, key, value)
+            results[index] = dict(value)
+
+    return results
+
+
+def get_customer_priced_items(price_list, customer, transaction_date=None):
+    """
+    Items whose rate for customer may differ from price_list alone: rows in
+    the customer's / customer group's price lists, or customer-specific rows.
+    """
+    if not customer:
+        return []
+
+    own_price_lists = tuple(name for name in get_price_list_chain(price_list, customer) if name != price_list)
+    conditions = ["customer = %(customer)s"]
+    if own_price_lists:
+        conditions.append("price_list IN %(own_price_lists)s")
+
+    return frappe.db.sql_list(
+        f"""
+        SELECT DISTINCT item_code
+        FROM `tabItem Price`
+        WHERE selling = 1
+            AND (valid_from IS NULL OR valid_from <= %(date)s)
+            AND (valid_upto IS NULL OR valid_upto >= %(date)s)
+            AND ({" OR ".join(conditions)})
+        """,
+        {
+            "customer": customer,
+            "own_price_lists": own_price_lists,
+            "date": str(getdate(transaction_date or nowdate()))
+        }
+    )
+
+
+def _resolve_from_db(item_codes, chain, customer, date):
+    """
+    Load everything needed for item_codes in three queries and return a
+    resolver(item_code, uom) -> result dict.
+    """
+    item_codes = list(item_codes)
+    stock_uoms = {}
+    conversions = {}
+    prices = {}
+
+    if item_codes and chain:
+        stock_uoms = dict(frappe.get_all(
+            "Item",
+            filters={"name": ["in", item_codes]},
+            fields=["name", "stock_uom"],
+            as_list=True
+        ))
+
+        for row in frappe.get_all(
+            "UOM Conversion Detail",
+            filters={"parent": ["in", item_codes], "parenttype": "Item"},
+            fields=["parent", "uom", "conversion_factor"]
+        ):
+            conversions[(row.parent, row.uom)] = flt(row.conversion_factor) or 1
+
+        for row in frappe.db.sql(
+            """
+            SELECT item_code, price_list, uom, customer, price_list_rate, valid_from
+            FROM `tabItem Price`
+            WHERE item_code IN %(item_codes)s
+                AND price_list IN %(price_lists)s
+                AND selling = 1
+                AND (valid_from IS NULL OR valid_from <= %(date)s)
+                AND (valid_upto IS NULL OR valid_upto >= %(date)s)
+                AND (IFNULL(customer, '') = '' OR customer = %(customer)s)
+            ORDER BY valid_from DESC
+            """,
+            {
+                "item_codes": tuple(item_codes),
+                "price_lists": chain,
+                "date": date,
+                "customer": customer or ""
+            },
+            as_dict=True
+        ):
+            prices.setdefault((row.item_code, row.price_list), []).append(row)
+
+    def resolve(item_code, uom):
+        stock_uom = stock_uoms.get(item_code)
+        uom = uom or stock_uom
+        conversion_factor = 1 if uom == stock_uom else conversions.get((item_code, uom), 1)
+        return _pick_price(
+            item_code, uom, stock_uom, conversion_factor, chain,
+            lambda price_list: prices.get((item_code, price_list))
+        )
+
+    return resolve
+
+
+def _resolve_from_entry(entry, uom, chain, date):
+    """resolve() on a barcode index entry's generic Item Price rows"""
+    stock_uom = entry["stock_uom"]
+    uom = uom or stock_uom
+    conversion_factor = 1 if uom == stock_uom else flt(entry["conversions"].get(uom)) or 1
+    date = getdate(date)
+
+    def valid_rows(price_list):
+        return [
+            frappe._dict(row, customer=None) for row in entry["price_rows"].get(price_list) or []
+            if (not row["valid_from"] or getdate(row["valid_from"]) <= date)
+            and (not row["valid_upto"] or getdate(row["valid_upto"]) >= date)
+        ]
+
+    return _pick_price(entry["item_code"], uom, stock_uom, conversion_factor, chain, valid_rows)
+
+
+def _pick_price(item_code, uom, stock_uom, conversion_factor, chain, get_rows):
+    """
+    First applicable row along the price list chain.
+    get_rows(price_list) -> valid rows, latest valid_from first.
+    """
+    for price_list in chain:
+        rows = get_rows(price_list)
+        if not rows:
+            continue
+
+        # Customer-specific rows before generic ones, latest valid_from first
+        rows = sorted(rows, key=lambda row: 0 if row.customer else 1)
+
+        for row in rows:
+            if row.uom == uom:
+                return _price_result(item_code, uom, price_list, row.price_list_rate, conversion_factor)
+
+        for row in rows:
+            if not row.uom or row.uom == stock_uom:
+                rate = flt(row.price_list_rate) * conversion_factor
+                return _price_result(item_code, uom, price_list, rate, conversion_factor)
+
+    return _price_result(item_code, uom, None, 0, conversion_factor)
+
+
+def _price_result(item_code, uom, price_list, rate, conversion_factor):
+    return {
+        "item_code": item_code,
+        "uom": uom,
+        "price_list": price_list,
+        "price_list_rate": flt(rate),
+        "conversion_factor": conversion_factor
+    }
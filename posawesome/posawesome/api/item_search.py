@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Item Search Index Module
+Maintains `POS Item Search Token` - every word suffix of an item's code and
+name - so a substring search becomes an indexed `token LIKE 'term%'`
+range scan instead of a full `LIKE '%term%'` scan of tabItem.
+
+Searches use the index only once a full rebuild has finished (after
+install / migrate); until then they fall back to the LIKE filter.
+"""
+from __future__ import unicode_literals
+import re
+import frappe
+from frappe.utils import cint
+
+
+SEARCH_TOKEN_DOCTYPE = "POS Item Search Token"
+
+# Shortest suffix stored (and shortest word the index can answer)
+MIN_TOKEN_LENGTH = 2
+
+# Data field length
+MAX_TOKEN_LENGTH = 140
+
+# Items per batch when rebuilding the whole index
+REBUILD_BATCH_SIZE = 1000
+
+# Global default set once a full rebuild has covered every item
+SEARCH_INDEX_READY_KEY = "posa_item_search_index_ready"
+
+_WORD_SPLIT = re.compile(r"[\W_]+", re.UNICODE)
+
+
+# =============================================================================
+# TOKENIZATION
+# =============================================================================
+
+def normalize_search_text(text):
+    """Lowercase and collapse whitespace"""
+    return " ".join(str(text or "").lower().split())
+
+
+def split_search_words(text):
+    """Alphanumeric words of a normalized string"""
+    return [word for word in _WORD_SPLIT.split(normalize_search_text(text)) if word]
+
+
+def get_item_search_tokens(item_code, item_name):
+    """
+    All suffixes (length >= MIN_TOKEN_LENGTH) of every word in the item
+    code and name, plus the full normalized code for prefix search on
+    codes containing punctuation.
+    """
+    tokens = set()
+
+    code = normalize_search_text(item_code)
+    if len(code) >= MIN_TOKEN_LENGTH:
+        tokens.add(code[:MAX_TOKEN_LENGTH])
+
+    for word in split_search_words(item_code) + split_search_words(item_name):
+        for start in range(len(word) - MIN_TOKEN_LENGTH + 1):
+            tokens.add(word[start:start + MAX_TOKEN_LENGTH])
+
+    return tokens
+
+
+# =============================================================================
+# INDEX MAINTENANCE
+# =============================================================================
+
+def update_item_search_tokens(item_code, item_name):
+    """Replace the tokens of one item"""
+    frappe.db.delete(SEARCH_TOKEN_DOCTYPE, {"item_code": item_code})
+
+    tokens = get_item_search_tokens(item_code, item_name)
+    if tokens:
+        frappe.db.bulk_insert(
+            SEARCH_TOKEN_DOCTYPE,
+            fields=["item_code", "token"],
+            values=[(item_code, token) for token in tokens]
+        )
+
+
+def is_search_index_ready():
+    return bool(cint(frappe.db.get_global(SEARCH_INDEX_READY_KEY)))
+
+
+def enqueue_search_index_rebuild():
+    """Search with LIKE until a full rebuild, enqueued on the long queue, finishes"""
+    frappe.db.set_global(SEARCH_INDEX_READY_KEY, 0)
+    frappe.enqueue(
+        "posawesome.posawesome.api.item_search.rebuild_item_search_index",
+        queue="long",
+        timeout=3600,
+        job_id="posa_rebuild_item_search_index",
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+
+def rebuild_item_search_index():
+    """
+    Rebuild the whole index from tabItem.
+    Long-running - run through frappe.enqueue(queue="long").
+
+    Each batch replaces the tokens of its own items in one transaction, so
+    searches keep seeing a complete index while the rebuild runs. Tokens of
+    items that no longer exist are dropped at the end.
+    """
+    last_name = ""
+    while True:
+        items = frappe.get_all(
+            "Item",
+            filters={"name": [">", last_name]},
+            fields=["name", "item_name"],
+            order_by="name asc",
+            limit=REBUILD_BATCH_SIZE
+        )
+        if not items:
+            break
+
+        values = []
+        for item in items:
+            values.extend((item.name, token) for token in get_item_search_tokens(item.name, item.item_name))
+
+        frappe.db.delete(SEARCH_TOKEN_DOCTYPE, {"item_code": ["in", [item.name for item in items]]})
+        if values:
+            frappe.db.bulk_insert(SEARCH_TOKEN_DOCTYPE, fields=["item_code", "token"], values=values)
+
+        frappe.db.commit()
+        last_name = items[-1].name
+
+    frappe.db.sql(
+        """
+        DELETE FROM `tabPOS Item Search Token`
+        WHERE item_code NOT IN (SELECT name FROM `tabItem`)
+        """
+    )
+    frappe.db.set_global(SEARCH_INDEX_READY_KEY, 1)
+    frappe.db.commit()
+
+
+def on_item_change(doc, method=None, *args):
+    """Item on_update / after_rename - reindex when code or name changed"""
+    try:
+        if method == "after_rename":
+            frappe.db.delete(SEARCH_TOKEN_DOCTYPE, {"item_code": args[0]})
+        elif not (doc.is_new() or doc.has_value_changed("item_name")):
+            return
+
+        update_item_search_tokens(doc.name, doc.item_name)
+
+    except Exception as e:
+        frappe.log_error(f"Error in item_search.on_item_change: {str(e)}", "POS Item Search Error")
+
+
+def on_item_trash(doc, method=None):
+    """Item on_trash"""
+    try:
+        frappe.db.delete(SEARCH_TOKEN_DOCTYPE, {"item_code": doc.name})
+
+    except Exception as e:
+        frappe.log_error(f"Error in item_search.on_item_trash: {str(e)}", "POS Item Search Error")
+
+
+# =============================================================================
+# SEARCH
+# =============================================================================
+
+def get_search_condition(search_value, params):
+    """
+    WHERE fragment restricting tabItem to items matching search_value.
+
+    The longest search word drives an indexed prefix scan on the token
+    table; the original substring test only runs on those candidates, so
+    the result set is identical to the legacy `LIKE '%term%'` filter.
+    Also sets the params used by get_search_rank_sql().
+
+    Returns:
+        str or None: None when no word is long enough for the index
+    """
+    words = [word for word in split_search_words(search_value) if len(word) >= MIN_TOKEN_LENGTH]
+    if not words:
+        return None
+
+    params["search"] = f"%{search_value}%"
+    params["search_exact"] = search_value
+    params["search_prefix"] = f"{search_value}%"
+    params["search_token"] = f"{max(words, key=len)[:MAX_TOKEN_LENGTH]}%"
+
+    return """`tabItem`.name IN (
+            SELECT `tabPOS Item Search Token`.item_code
+            FROM `tabPOS Item Search Token`
+            WHERE `tabPOS Item Search Token`.token LIKE %(search_token)s
+        )
+        AND (`tabItem`.name LIKE %(search)s OR `tabItem`.item_name LIKE %(search)s)"""
+
+
+def get_search_rank_sql():
+    """Rank: 0 exact code, 1 code prefix, 2 name prefix, 3 substring"""
+    return """CASE
+                WHEN `tabItem`.name = %(search_exact)s THEN 0
+                WHEN `tabItem`.name LIKE %(search_prefix)s THEN 1
+                WHEN `tabItem`.item_name LIKE %(search_prefix)s THEN 2
+                ELSE 3
+            END"""
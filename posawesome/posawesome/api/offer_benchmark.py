@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Offer Benchmark Module
+Micro-benchmark of the offer engine on synthetic offer sets and carts,
+without the database: OfferStore is an in-memory stand-in for the POS Offer
+table patched in under the offer index, so runs measure evaluation only.
+Also used by test_pos_offer.py to exercise the engine without fixtures.
+
+    bench --site <site> execute posawesome.posawesome.api.offer_benchmark.run_offer_benchmark \\
+        --kwargs "{'offer_counts': [10, 1000, 10000], 'cart_sizes': [1, 100, 500]}"
+"""
+from __future__ import unicode_literals
+import copy
+import math
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from unittest.mock import patch
+import frappe
+from frappe.utils import cint, flt, getdate
+from posawesome.posawesome.api import offer_index
+from posawesome.posawesome.api.offer_optimizer import optimize_offers
+from posawesome.posawesome.doctype.pos_offer.pos_offer import (
+    apply_offer_by_type,
+    get_applicable_offers_for_invoice_data,
+)
+
+
+BENCHMARK_COMPANY = "_Bench Company"
+BENCHMARK_PROFILE = "_Bench Profile"
+BENCHMARK_WAREHOUSE = "_Bench Warehouse"
+BENCHMARK_DATE = "2025-06-15"
+
+DEFAULT_OFFER_COUNTS = (10, 100, 1000, 10000)
+DEFAULT_CART_SIZES = (1, 10, 100, 500)
+
+# Size of the synthetic catalog offers and carts draw from
+CATALOG_ITEMS = 2000
+CATALOG_GROUPS = 50
+CATALOG_BRANDS = 50
+CATALOG_CUSTOMERS = 200
+CATALOG_CUSTOMER_GROUPS = 10
+
+OFFER_TYPES = ("item_code", "item_group", "brand", "customer", "customer_group", "grand_total")
+
+
+# =============================================================================
+# IN-MEMORY DB STAND-IN
+# =============================================================================
+
+class OfferStore:
+    """POS Offer rows and customer groups in memory, filtered like load_active_offers"""
+
+    def __init__(self, offers, customer_groups=None):
+        self.offers = [frappe._dict(offer) for offer in offers]
+        self.customer_groups = customer_groups or {}
+
+    def load_active_offers(self, company, pos_profile, warehouse, date):
+        date = getdate(date)
+        rows = [
+            offer for offer in self.offers
+            if not cint(offer.get("disable"))
+            and offer.get("company") == company
+            and (offer.get("pos_profile") or "") in (pos_profile, "")
+            and (offer.get("warehouse") or "") in (warehouse, "")
+            and offer.get("valid_from") and getdate(offer.valid_from) <= date
+            and offer.get("valid_upto") and getdate(offer.valid_upto) >= date
+        ]
+        # auto desc, discount_percentage desc, title asc, name asc
+        rows.sort(key=lambda offer: (
+            -cint(offer.get("auto")), -flt(offer.get("discount_percentage")),
+            offer.get("title") or "", offer.get("name") or ""
+        ))
+        return [frappe._dict({fieldname: offer.get(fieldname) for fieldname in offer_index.OFFER_FIELDS}) for offer in rows]
+
+    def get_cached_value(self, doctype, name, fieldname, *args, **kwargs):
+        if doctype == "Customer" and fieldname == "customer_group":
+            return self.customer_groups.get(name)
+        return None
+
+    @contextmanager
+    def patched(self):
+        """Serve the offer index from this store; indexes built inside are dropped on exit"""
+        offer_index._index_caches.clear()
+        try:
+            with patch.object(offer_index, "load_active_offers", self.load_active_offers), \
+                    patch.object(offer_index, "_get_index_version", lambda: 0), \
+                    patch.object(frappe, "get_cached_value", self.get_cached_value):
+                yield self
+        finally:
+            offer_index._index_caches.clear()
+
+
+# =============================================================================
+# SYNTHETIC DATA
+# =============================================================================
+
+def catalog_item(number):
+    """Synthetic item row; group and brand derive from the number so carts and offers agree"""
+    return {
+        "item_code": f"BENCH-ITEM-{number:05d}",
+        "item_group": f"Bench Group {number % CATALOG_GROUPS}",
+        "brand": f"Bench Brand {number % CATALOG_BRANDS}",
+    }
+
+
+def catalog_customer_groups():
+    return {
+        f"Bench Customer {number}": f"Bench Customer Group {number % CATALOG_CUSTOMER_GROUPS}"
+        for number in range(CATALOG_CUSTOMERS)
+    }
+
+
+def generate_offers(count, seed=0):
+    """count offers spread over all offer types, profiles and thresholds"""
+    rng = random.Random(seed)
+    offers = []
+
+    for index in range(count):
+        offer_type = rng.choice(OFFER_TYPES)
+        offer = {
+            "name": f"BENCH-OFFER-{index:05d}",
+            "title": f"Bench Offer {index:05d}",
+            "company": BENCHMARK_COMPANY,
+            "pos_profile": rng.choice((BENCHMARK_PROFILE, "", "_Other Profile")),
+            "warehouse": "",
+            "disable": 0,
+            "auto": rng.choice((0, 1, 1)),
+            "offer_type": offer_type,
+            "discount_type": "Discount Percentage",
+            "discount_percentage": rng.choice((5, 10, 15, 20, 25)),
+            "min_qty": rng.choice((0, 0, 1, 5)),
+            "max_qty": rng.choice((0, 0, 100)),
+            "min_amt": rng.choice((0, 0, 50, 200)),
+            "max_amt": rng.choice((0, 0, 0, 5000)),
+            "valid_from": "2025-01-01",
+            "valid_upto": rng.choice(("2025-12-31", "2025-03-31")),
+        }
+
+        if offer_type == "item_code":
+            offer["item_code"] = catalog_item(rng.randrange(CATALOG_ITEMS))["item_code"]
+        elif offer_type == "item_group":
+            offer["item_group"] = f"Bench Group {rng.randrange(CATALOG_GROUPS)}"
+        elif offer_type == "brand":
+            offer["brand"] = f"Bench Brand {rng.randrange(CATALOG_BRANDS)}"
+        elif offer_type == "customer":
+            offer["customer"] = f"Bench Customer {rng.randrange(CATALOG_CUSTOMERS)}"
+        elif offer_type == "customer_group":
+            offer["customer_group"] = f"Bench Customer Group {rng.randrange(CATALOG_CUSTOMER_GROUPS)}"
+
+        offers.append(offer)
+
+    return offers
+
+
+def generate_cart(lines, seed=0):
+    """invoice_data with lines random catalog items"""
+    rng = random.Random(seed)
+    items = []
+    for _index in range(lines):
+        item = catalog_item(rng.randrange(CATALOG_ITEMS))
+        item.update(qty=rng.randint(1, 5), rate=rng.choice((2.5, 10, 25, 99.9)))
+        items.append(item)
+
+    return {
+        "company": BENCHMARK_COMPANY,
+        "pos_profile": BENCHMARK_PROFILE,
+        "set_warehouse": BENCHMARK_WAREHOUSE,
+        "posting_date": BENCHMARK_DATE,
+        "customer": f"Bench Customer {rng.randrange(CATALOG_CUSTOMERS)}",
+        "items": items,
+        "posa_offers": [],
+    }
+
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+
+def percentile(values, percent):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def measure(fn, runs):
+    """
+    Latency of runs calls, then one traced call for memory:
+    peak_kib - peak traced memory during the call
+    blocks - allocations of the call still alive afterwards (results, caches)
+    """
+    timings = []
+    for _index in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        result = fn()
+        _current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    finally:
+        tracemalloc.stop()
+    del result
+
+    return {
+        "p50_ms": round(percentile(timings, 50), 4),
+        "p99_ms": round(percentile(timings, 99), 4),
+        "peak_kib": round(peak / 1024, 1),
+        "blocks": blocks,
+    }
+
+
+def apply_offers(offers, invoice_data):
+    """get_offers' application loop on an invoice_data copy"""
+    applied = 0
+    for offer in offers:
+        if apply_offer_by_type(offer, invoice_data):
+            applied += 1
+    return applied
+
+
+def run_offer_benchmark(offer_counts=DEFAULT_OFFER_COUNTS, cart_sizes=DEFAULT_CART_SIZES, runs=50, seed=42):
+    """
+    Per (offer count, cart size): "compile" (cold index build), "match"
+    (get_applicable_offers_for_invoice_data on a warm index), "apply"
+    (apply_offer_by_type for every matched offer) and "optimize"
+    (optimize_offers over the matched offers, site config budgets).
+
+    Returns:
+        list: {"offers", "lines", "stage", "matched", "p50_ms", "p99_ms", "peak_kib", "blocks"}
+    """
+    runs = max(cint(runs), 1)
+    results = []
+
+    for offer_count in offer_counts:
+        store = OfferStore(generate_offers(cint(offer_count), seed), catalog_customer_groups())
+
+        with store.patched():
+            def compile_index():
+                offer_index._index_caches.clear()
+                return offer_index.get_offer_index(
+                    BENCHMARK_COMPANY, BENCHMARK_PROFILE, BENCHMARK_WAREHOUSE, BENCHMARK_DATE
+                )
+
+            results.append(dict(
+                measure(compile_index, runs),
+                offers=cint(offer_count), lines=None, stage="compile", matched=None
+            ))
+
+            for lines in cart_sizes:
+                cart = generate_cart(cint(lines), seed)
+                matched = get_applicable_offers_for_invoice_data(cart)
+
+                results.append(dict(
+                    measure(lambda: get_applicable_offers_for_invoice_data(cart), runs),
+                    offers=cint(offer_count), lines=cint(lines), stage="match", matched=len(matched)
+                ))
+
+                # Fresh copies made outside the timed calls
+                copies = [copy.deepcopy(cart) for _index in range(runs + 1)]
+                results.append(dict(
+                    measure(lambda: apply_offers(matched, copies.pop()), runs),
+                    offers=cint(offer_count), lines=cint(lines), stage="apply", matched=len(matched)
+                ))
+
+                results.append(dict(
+                    measure(lambda: optimize_offers(matched, cart), runs),
+                    offers=cint(offer_count), lines=cint(lines), stage="optimize", matched=len(matched)
+                ))
+
+    return results
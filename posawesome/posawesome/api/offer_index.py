@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""
+Offer Index Module
+Active POS Offers of one (company, POS Profile, warehouse, date) compiled
+into an in-memory index keyed by trigger (item code, item group, brand,
+customer, customer group), so matching a cart costs O(cart keys + matching
+offers) with no SQL.
+
+Compiled indexes live in a bounded per-process LRU per site. POS Offer /
+POS Profile changes bump a site-wide Redis version; a worker that sees a
+new version drops that site's LRU.
+"""
+from __future__ import unicode_literals
+import hashlib
+import json
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import frappe
+from frappe import _
+from frappe.utils import cint, flt, getdate, nowdate
+from posawesome.posawesome.api.offer_optimizer import (
+    ITEM_OFFER_TYPES, find_offer_conflicts, get_search_budget, is_optimizer_enabled
+)
+
+
+# Raw Redis counter bumped after every POS Offer / POS Profile change
+OFFER_INDEX_VERSION_KEY = "posa_offer_index_version"
+
+# Compiled indexes kept per site and worker process
+MAX_CACHED_INDEXES = 256
+
+# Sites with an LRU kept per worker process
+MAX_CACHED_SITES = 16
+
+OFFER_FIELDS = [
+    "name", "title", "description", "offer_type", "discount_type",
+    "discount_percentage", "min_qty", "max_qty", "min_amt", "max_amt",
+    "auto", "item_code", "item_group", "brand", "customer",
+    "customer_group", "valid_from", "valid_upto"
+]
+
+# offer_type -> (offer field, cart key it triggers on)
+TRIGGER_TYPES = {
+    "item_code": "item_code",
+    "item_group": "item_group",
+    "brand": "brand",
+    "customer": "customer",
+    "customer_group": "customer_group",
+}
+
+# offer types that only depend on the totals
+GENERAL_TYPES = (None, "", "grand_total")
+
+# Columns of a client rule bundle row (see offer_engine.js)
+BUNDLE_FIELDS = [
+    "name", "title", "offer_type", "discount_percentage", "min_qty", "max_qty",
+    "min_amt", "max_amt", "auto", "item_code", "item_group", "brand",
+    "customer", "customer_group"
+]
+
+# site -> (offer index version, LRU of compiled indexes)
+_index_caches = OrderedDict()
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+def _get_index_version():
+    cache = frappe.cache()
+    return cint(frappe.safe_decode(cache.get(cache.make_key(OFFER_INDEX_VERSION_KEY)) or 0))
+
+
+def _get_site_index_cache():
+    """(version, LRU) of this site, replaced when the site offer version moved"""
+    site = frappe.local.site
+    version = _get_index_version()
+
+    cached = _index_caches.get(site)
+    if cached is None or cached[0] != version:
+        cached = (version, OrderedDict())
+        _index_caches[site] = cached
+        while len(_index_caches) > MAX_CACHED_SITES:
+            _index_caches.popitem(last=False)
+    else:
+        _index_caches.move_to_end(site)
+
+    return cached
+
+
+def on_offer_source_change(doc, method=None):
+    """POS Offer / POS Profile on_update / on_trash - invalidate indexes on all workers"""
+    frappe.db.after_commit.add(_bump_index_version)
+
+
+def _bump_index_version():
+    cache = frappe.cache()
+    cache.incr(cache.make_key(OFFER_INDEX_VERSION_KEY))
+
+
+def get_offer_index(company, pos_profile, warehouse, date=None):
+    """Cached OfferIndex of the offers active on date (default today)"""
+    version, index_cache = _get_site_index_cache()
+
+    key = (company, pos_profile or "", warehouse or "", str(getdate(date or nowdate())))
+    index = index_cache.get(key)
+    if index is None:
+        index = OfferIndex(load_active_offers(*key))
+        # Positions in a session's match set are only valid for this index
+        index.token = (frappe.local.site, version, key)
+        index_cache[key] = index
+        while len(index_cache) > MAX_CACHED_INDEXES:
+            index_cache.popitem(last=False)
+    else:
+        index_cache.move_to_end(key)
+
+    return index
+
+
+def load_active_offers(company, pos_profile, warehouse, date):
+    """
+    Offers passing the profile / warehouse / validity filters, in application
+    order. name breaks ties, so every worker numbers the offers alike.
+    """
+    return frappe.get_all(
+        "POS Offer",
+        fields=OFFER_FIELDS,
+        filters={
+            "disable": 0,
+            "company": company,
+            "pos_profile": ["in", [pos_profile, ""]],
+            "warehouse": ["in", [warehouse, ""]],
+            "valid_from": ["<=", date],
+            "valid_upto": [">=", date]
+        },
+        order_by="auto desc, discount_percentage desc, title asc, name asc"
+    )
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class OfferIndex:
+    """
+    Offers bucketed by trigger value. Each bucket holds its offers sorted by
+    min_amt so a lookup only walks offers whose lower amount bound the cart
+    already reached; qty bounds and max_amt are checked on those.
+
+    Bounds follow check_offer_applicable_for_data: an empty / 0 bound is no limit.
+
+    Each bound is also kept as a sorted (value, position) list, so a change
+    of the cart totals finds the offers whose bounds it crossed by bisection
+    (rematch_positions).
+    """
+
+    # bound field -> total it limits
+    BOUND_FIELDS = {"min_amt": "amount", "max_amt": "amount", "min_qty": "qty", "max_qty": "qty"}
+
+    def __init__(self, offers):
+        self.offers = []
+        self.token = None
+        # position -> (offer_type, trigger), None for general offers
+        self.triggers = []
+        buckets = {offer_type: {} for offer_type in TRIGGER_TYPES}
+        general = []
+
+        for offer in offers:
+            offer_type = offer.get("offer_type")
+            if offer_type in GENERAL_TYPES:
+                target = general
+            elif offer_type in TRIGGER_TYPES:
+                trigger = offer.get(TRIGGER_TYPES[offer_type])
+                if not trigger:
+                    continue
+                target = buckets[offer_type].setdefault(trigger, [])
+            else:
+                continue
+
+            position = len(self.offers)
+            self.offers.append(offer)
+            self.triggers.append((offer_type, offer.get(TRIGGER_TYPES[offer_type])) if target is not general else None)
+            target.append(position)
+
+        self.general = self._compile_bucket(general)
+        self.buckets = {
+            offer_type: {trigger: self._compile_bucket(positions) for trigger, positions in by_trigger.items()}
+            for offer_type, by_trigger in buckets.items()
+        }
+
+        self.bounds = {}
+        for fieldname in self.BOUND_FIELDS:
+            # 0 upper bounds are no limit - no total ever crosses them
+            entries = sorted(
+                (flt(offer.get(fieldname)), position) for position, offer in enumerate(self.offers)
+                if fieldname.startswith("min_") or flt(offer.get(fieldname))
+            )
+            self.bounds[fieldname] = ([entry[0] for entry in entries], [entry[1] for entry in entries])
+
+    def _compile_bucket(self, positions):
+        """(min_amt list, positions list), both sorted by min_amt"""
+        positions = sorted(positions, key=lambda position: flt(self.offers[position].min_amt))
+        return [flt(self.offers[position].min_amt) for position in positions], positions
+
+    def _collect(self, bucket, total_qty, total_amount, matched):
+        lower_bounds, positions = bucket
+        for position in positions[:bisect_right(lower_bounds, total_amount)]:
+            if self._within_bounds(position, total_qty, total_amount):
+                matched.add(position)
+
+    def _within_bounds(self, position, total_qty, total_amount):
+        offer = self.offers[position]
+        return (
+            flt(offer.min_amt) <= total_amount
+            and flt(offer.min_qty) <= total_qty
+            and (not flt(offer.max_qty) or total_qty <= flt(offer.max_qty))
+            and (not flt(offer.max_amt) or total_amount <= flt(offer.max_amt))
+        )
+
+    def match(self, invoice_data):
+        """Applicable offers for invoice_data, in application order (fresh dicts)"""
+        items = invoice_data.get("items") or []
+        total_qty = 0
+        total_amount = 0
+        keys = {offer_type: set() for offer_type in ("item_code", "item_group", "brand")}
+        for item in items:
+            qty = flt(item.get("qty", 0))
+            total_qty += qty
+            total_amount += qty * flt(item.get("rate", 0))
+            for offer_type, values in keys.items():
+                if item.get(offer_type):
+                    values.add(item.get(offer_type))
+
+        customer = invoice_data.get("customer")
+        if customer:
+            keys["customer"] = {customer}
+            if self.buckets["customer_group"]:
+                keys["customer_group"] = {frappe.get_cached_value("Customer", customer, "customer_group")}
+
+        return self.match_keys(keys, total_qty, total_amount)
+
+    def match_keys(self, keys, total_qty, total_amount):
+        """Applicable offers for trigger keys {offer_type: set of values} and cart totals"""
+        return self.get_offers(self.match_positions(keys, total_qty, total_amount))
+
+    def match_positions(self, keys, total_qty, total_amount):
+        """Positions of the applicable offers (see match_keys)"""
+        matched = set()
+        self._collect(self.general, total_qty, total_amount, matched)
+
+        for offer_type, values in keys.items():
+            by_trigger = self.buckets.get(offer_type)
+            if not by_trigger:
+                continue
+            for value in values:
+                bucket = by_trigger.get(value)
+                if bucket:
+                    self._collect(bucket, total_qty, total_amount, matched)
+
+        return matched
+
+    def rematch_positions(self, matched, keys, changed_keys, old_totals, new_totals):
+        """
+        Update a previous match set instead of matching from scratch.
+
+        Args:
+            matched: positions matched for old_totals and the keys before the change
+            keys: current trigger keys {offer_type: set of values}
+            changed_keys: (offer_type, value) pairs that appeared or disappeared since
+            old_totals / new_totals: (total_qty, total_amount)
+
+        Only the buckets of changed keys and the offers with a bound between
+        the old and new totals are evaluated again.
+        """
+        matched = set(matched)
+        total_qty, total_amount = new_totals
+
+        for offer_type, value in changed_keys:
+            bucket = self.buckets.get(offer_type, {}).get(value)
+            if not bucket:
+                continue
+            matched.difference_update(bucket[1])
+            if value in keys.get(offer_type, ()):
+                self._collect(bucket, total_qty, total_amount, matched)
+
+        for position in self._crossed_bounds(old_totals, new_totals):
+            trigger = self.triggers[position]
+            if trigger and trigger[1] not in keys.get(trigger[0], ()):
+                continue
+            if self._within_bounds(position, total_qty, total_amount):
+                matched.add(position)
+            else:
+                matched.discard(position)
+
+        return matched
+
+    def _crossed_bounds(self, old_totals, new_totals):
+        """Positions with a bound between the old and new value of its total"""
+        totals = {
+            "qty": sorted((flt(old_totals[0]), flt(new_totals[0]))),
+            "amount": sorted((flt(old_totals[1]), flt(new_totals[1]))),
+        }
+        crossed = set()
+        for fieldname, total in self.BOUND_FIELDS.items():
+            low, high = totals[total]
+            if low == high:
+                continue
+            values, positions = self.bounds[fieldname]
+            crossed.update(positions[bisect_left(values, low):bisect_right(values, high)])
+        return crossed
+
+    def get_offers(self, positions):
+        """Offers at positions, in application order (fresh dicts)"""
+        return [frappe._dict(self.offers[position]) for position in sorted(positions)]
+
+
+# =============================================================================
+# CLIENT BUNDLE
+# =============================================================================
+
+@frappe.whitelist()
+def get_offer_bundle(pos_profile, version=None):
+    """
+    GET - Today's active offers of a POS Profile as a compact rule bundle,
+    evaluated in the browser by offer_engine.js
+
+    Args:
+        pos_profile: POS Profile name
+        version: version of the bundle the terminal holds
+
+    Returns:
+        dict: {"version", "unchanged": 1} when version is current, otherwise
+              {"version", "date", "enabled", "optimizer", "fields", "offers": [[...], ...]}
+              with offers in application order; optimizer is the search
+              budget {"time_ms", "max_nodes"} when posa_offer_optimizer is on
+    """
+    if not pos_profile or not frappe.db.exists("POS Profile", pos_profile):
+        frappe.throw(_("POS Profile {0} does not exist").format(pos_profile), frappe.DoesNotExistError)
+    frappe.has_permission("POS Profile", "read", pos_profile, throw=True)
+
+    company, warehouse, enabled, optimizer = frappe.get_cached_value(
+        "POS Profile", pos_profile, ["company", "warehouse", "posa_auto_fetch_offers", "posa_offer_optimizer"]
+    )
+    date = nowdate()
+
+    rows = []
+    if cint(enabled):
+        index = get_offer_index(company, pos_profile, warehouse, date)
+        rows = [[offer.get(fieldname) for fieldname in BUNDLE_FIELDS] for offer in index.offers]
+
+    payload = {
+        "date": date,
+        "enabled": cint(enabled),
+        "optimizer": get_search_budget() if cint(optimizer) else None,
+        "fields": BUNDLE_FIELDS,
+        "offers": rows,
+    }
+    bundle_version = hashlib.md5(json.dumps(payload, default=str, sort_keys=True).encode()).hexdigest()
+
+    if version == bundle_version:
+        return {"version": bundle_version, "unchanged": 1}
+
+    payload["version"] = bundle_version
+    return payload
+
+
+# =============================================================================
+# SUBMIT VERIFICATION
+# =============================================================================
+
+def verify_invoice_offers(doc):
+    """
+    Re-check the offers a terminal applied locally, once, before submit:
+    each offer recorded on the invoice must be active and match the final
+    cart, and its recorded discount cannot exceed the offer's. Lines flagged
+    posa_offer_applied cannot be discounted past the best recorded item offer
+    targeting them, nor the invoice past the recorded transaction offer. With
+    the optimizer on, the recorded offers must also be a non-conflicting
+    combination (what optimizeOffers picks from).
+    """
+    if doc.get("is_return"):
+        return
+    offer_lines = [row for row in doc.items if row.get("posa_offer_applied")]
+    if not doc.get("posa_offers") and not offer_lines:
+        return
+
+    index = get_offer_index(doc.company, doc.pos_profile, doc.set_warehouse, doc.posting_date)
+    invoice_data = {
+        "customer": doc.customer,
+        "items": [
+            {
+                "item_code": item.item_code,
+                "item_group": item.item_group,
+                "brand": item.get("brand"),
+                "qty": item.qty,
+                "rate": item.rate,
+            }
+            for item in doc.items
+        ],
+    }
+    applicable = {offer.name: offer for offer in index.match(invoice_data)}
+
+    if any(row.offer_name not in applicable for row in doc.posa_offers if row.offer_name):
+        # The terminal may have checked amount thresholds before the offer's
+        # own discount lowered the rates
+        for item, row in zip(invoice_data["items"], doc.items):
+            item["rate"] = row.price_list_rate or row.rate
+        applicable.update({offer.name: offer for offer in index.match(invoice_data)})
+
+    # (offer, recorded discount) of every offer recorded on the invoice
+    recorded = []
+    for row in doc.posa_offers:
+        if not row.offer_name:
+            continue
+
+        offer = applicable.get(row.offer_name)
+        if not offer:
+            frappe.throw(_("Offer {0} does not apply to this invoice").format(row.offer_name))
+
+        if flt(row.discount_percentage) > flt(offer.discount_percentage):
+            frappe.throw(_("Offer {0} allows at most {1}% discount").format(
+                row.offer_name, flt(offer.discount_percentage)
+            ))
+        recorded.append((offer, flt(row.discount_percentage)))
+
+    _check_offer_discounts(doc, offer_lines, recorded)
+
+    if is_optimizer_enabled(doc.pos_profile):
+        offers = [applicable[row.offer_name] for row in doc.posa_offers if row.offer_name]
+        conflicts = find_offer_conflicts(offers, invoice_data["items"])
+        if conflicts:
+            frappe.throw(_("Offers {0} and {1} cannot be applied together").format(*conflicts[0]))
+
+
+def _check_offer_discounts(doc, offer_lines, recorded):
+    """Line and invoice discounts cannot exceed what the recorded offers allow"""
+    transaction_discounts = [discount for offer, discount in recorded if offer.offer_type not in ITEM_OFFER_TYPES]
+    if transaction_discounts:
+        allowed = max(transaction_discounts)
+        if flt(doc.additional_discount_percentage) > allowed:
+            frappe.throw(_("Offers on this invoice allow at most {0}% additional discount").format(allowed))
+
+    for item in offer_lines:
+        line_discounts = [
+            discount for offer, discount in recorded
+            if offer.offer_type in ITEM_OFFER_TYPES
+            and offer.get(offer.offer_type) and item.get(offer.offer_type) == offer.get(offer.offer_type)
+        ]
+        if not line_discounts:
+            frappe.throw(_("Row #{0} ({1}): no applied offer covers this item").format(item.idx, item.item_code))
+
+        allowed = max(line_discounts)
+        precision = item.precision("rate")
+        lowest_rate = flt(flt(item.price_list_rate) * (100 - allowed) / 100, precision)
+        if flt(item.discount_percentage) > allowed or flt(item.rate, precision) < lowest_rate:
+            frappe.throw(_("Row #{0} ({1}): the applied offers allow at most {2}% discount").format(
+                item.idx, item.item_code, allowed
+            ))
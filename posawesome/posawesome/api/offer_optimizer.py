@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Offer Optimizer Module
+Best non-conflicting combination of applicable offers, for POS Profiles
+with "posa_offer_optimizer" on (otherwise offers apply in priority order
+and later offers overwrite earlier ones). The POS screen runs the same
+search in the browser (optimizeOffers in offer_engine.js, budgets from the
+offer bundle); get_offers runs it here, and verify_invoice_offers rejects
+a conflicting combination at submit.
+
+Conflicts: an item line carries one discount_percentage, so item-level
+offers (item code / group / brand) covering a common line conflict; the
+invoice carries one additional_discount_percentage, so transaction-level
+offers (grand total / customer / customer group) all conflict.
+
+Item offers split into conflict groups (connected by shared lines), each
+solved by a memoized branch-and-bound within a time and node budget. The
+search starts from the greedy pick, so an exhausted budget still returns a
+valid, never-worse-than-greedy selection.
+
+Budgets: site config "posa_offer_optimizer_time_ms" (default 5) and
+"posa_offer_optimizer_max_nodes" (default 20000), shared by all groups.
+"""
+from __future__ import unicode_literals
+import time
+import frappe
+from frappe.utils import cint, flt
+
+
+DEFAULT_TIME_BUDGET_MS = 5
+DEFAULT_NODE_BUDGET = 20000
+
+# Nodes between two clock reads
+CLOCK_CHECK_INTERVAL = 64
+
+ITEM_OFFER_TYPES = ("item_code", "item_group", "brand")
+
+# Values closer than this are ties
+EPSILON = 1e-9
+
+
+def is_optimizer_enabled(pos_profile):
+    return bool(pos_profile) and cint(frappe.get_cached_value("POS Profile", pos_profile, "posa_offer_optimizer"))
+
+
+def get_search_budget():
+    """Site config budgets: {"time_ms", "max_nodes"}"""
+    return {
+        "time_ms": flt(frappe.conf.get("posa_offer_optimizer_time_ms", DEFAULT_TIME_BUDGET_MS)),
+        "max_nodes": cint(frappe.conf.get("posa_offer_optimizer_max_nodes", DEFAULT_NODE_BUDGET)),
+    }
+
+
+def find_offer_conflicts(offers, items):
+    """
+    Conflicting pairs among offers applied together on items: two
+    transaction-level offers, or two item-level offers covering one line.
+
+    Returns:
+        list: (offer name, offer name) pairs
+    """
+    conflicts = []
+    transaction_offer = None
+    line_owner = {}
+
+    for offer in offers:
+        offer_type = offer.get("offer_type")
+        if offer_type not in ITEM_OFFER_TYPES:
+            if transaction_offer:
+                conflicts.append((transaction_offer, offer.get("name")))
+            transaction_offer = transaction_offer or offer.get("name")
+            continue
+
+        for index, item in enumerate(items):
+            if not offer.get(offer_type) or item.get(offer_type) != offer.get(offer_type):
+                continue
+            if index in line_owner:
+                conflicts.append((line_owner[index], offer.get("name")))
+            else:
+                line_owner[index] = offer.get("name")
+
+    return conflicts
+
+
+# =============================================================================
+# BUDGET
+# =============================================================================
+
+class SearchBudget:
+    """Node and wall-clock budget shared by every conflict group of one call"""
+
+    def __init__(self, time_budget_ms, node_budget):
+        self.deadline = time.perf_counter() + time_budget_ms / 1000
+        self.node_budget = node_budget
+        self.nodes = 0
+        self.exhausted = False
+
+    def tick(self):
+        """Count a node; False once the budget is spent"""
+        self.nodes += 1
+        if self.nodes >= self.node_budget:
+            self.exhausted = True
+        elif self.nodes % CLOCK_CHECK_INTERVAL == 0 and time.perf_counter() >= self.deadline:
+            self.exhausted = True
+        return not self.exhausted
+
+
+# =============================================================================
+# OPTIMIZER
+# =============================================================================
+
+def optimize_offers(offers, invoice_data, time_budget_ms=None, node_budget=None):
+    """
+    Pick the discount-maximizing non-conflicting subset of offers.
+
+    Args:
+        offers: applicable offers (get_applicable_offers_for_invoice_data)
+        invoice_data: invoice dict with items (qty, rate, item_code, item_group, brand)
+        time_budget_ms / node_budget: override the site config budgets
+
+    Returns:
+        dict: {
+            "offers": chosen offers, in their original order,
+            "discount": total discount amount of the choice,
+            "nodes": search nodes expanded,
+            "complete": 0 when a budget ran out (best found so far returned)
+        }
+    """
+    if time_budget_ms is None or node_budget is None:
+        defaults = get_search_budget()
+        time_budget_ms = defaults["time_ms"] if time_budget_ms is None else time_budget_ms
+        node_budget = defaults["max_nodes"] if node_budget is None else node_budget
+    budget = SearchBudget(flt(time_budget_ms), max(cint(node_budget), 1))
+
+    items = invoice_data.get("items") or []
+    amounts = [flt(item.get("qty", 0)) * flt(item.get("rate", 0)) for item in items]
+
+    # offer_type -> trigger value -> line indexes
+    lines_by_key = {offer_type: {} for offer_type in ITEM_OFFER_TYPES}
+    for index, item in enumerate(items):
+        for offer_type, by_value in lines_by_key.items():
+            if item.get(offer_type):
+                by_value.setdefault(item.get(offer_type), []).append(index)
+
+    item_offers = []
+    transaction_offers = []
+    for position, offer in enumerate(offers):
+        if not flt(offer.get("discount_percentage")):
+            continue
+
+        offer_type = offer.get("offer_type")
+        if offer_type in ITEM_OFFER_TYPES:
+            lines = lines_by_key[offer_type].get(offer.get(offer_type)) or []
+            value = sum(amounts[index] for index in lines) * flt(offer.get("discount_percentage")) / 100
+            if value > EPSILON:
+                item_offers.append((position, lines, value))
+        else:
+            transaction_offers.append(position)
+
+    chosen = []
+    item_discount = 0
+    for group in _conflict_groups(item_offers):
+        value, picked = _solve_group(group, budget)
+        item_discount += value
+        chosen.extend(picked)
+
+    # The transaction discount applies to the total after item discounts,
+    # T * p + D * (1 - p): the largest item discount D is best for any p,
+    # so the highest-percentage transaction offer completes the optimum
+    transaction_discount = 0
+    if transaction_offers:
+        best = min(transaction_offers, key=lambda position: (-flt(offers[position].get("discount_percentage")), position))
+        chosen.append(best)
+        transaction_discount = (sum(amounts) - item_discount) * flt(offers[best].get("discount_percentage")) / 100
+
+    return {
+        "offers": [offers[position] for position in sorted(chosen)],
+        "discount": flt(item_discount + transaction_discount, 6),
+        "nodes": budget.nodes,
+        "complete": 0 if budget.exhausted else 1,
+    }
+
+
+def _conflict_groups(item_offers):
+    """Split (position, lines, value) entries into groups connected by shared lines"""
+    parent = list(range(len(item_offers)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    owner = {}
+    for index, (_position, lines, _value) in enumerate(item_offers):
+        for line in lines:
+            if line in owner:
+                parent[find(index)] = find(owner[line])
+            else:
+                owner[line] = index
+
+    groups = {}
+    for index, entry in enumerate(item_offers):
+        groups.setdefault(find(index), []).append(entry)
+    return list(groups.values())
+
+
+def _solve_group(group, budget):
+    """
+    Max-value subset of a conflict group with pairwise disjoint lines.
+    Returns (value, positions).
+
+    Depth-first branch-and-bound over offers sorted by value: "take" before
+    "skip", pruned when value + all remaining values cannot beat the best.
+    Memo: (depth, lines used) -> best value reached there; arriving again
+    with no more value cannot lead anywhere better.
+    """
+    if len(group) == 1:
+        return group[0][2], [group[0][0]]
+
+    group = sorted(group, key=lambda entry: (-entry[2], entry[0]))
+    line_bits = {}
+    masks = []
+    for _position, lines, _value in group:
+        mask = 0
+        for line in lines:
+            mask |= 1 << line_bits.setdefault(line, len(line_bits))
+        masks.append(mask)
+    values = [entry[2] for entry in group]
+
+    remaining = [0] * (len(group) + 1)
+    for index in range(len(group) - 1, -1, -1):
+        remaining[index] = remaining[index + 1] + values[index]
+
+    # Greedy seed: the answer when the budget is already spent
+    best_value, best_taken, used = 0, (), 0
+    for index, mask in enumerate(masks):
+        if not used & mask:
+            used |= mask
+            best_value += values[index]
+            best_taken += (index,)
+
+    memo = {}
+    stack = [(0, 0, 0, ())]
+    while stack and budget.tick():
+        depth, used, value, taken = stack.pop()
+
+        if value > best_value + EPSILON:
+            best_value, best_taken = value, taken
+
+        if depth == len(group) or value + remaining[depth] <= best_value + EPSILON:
+            continue
+
+        key = (depth, used)
+        if memo.get(key, -1) >= value:
+            continue
+        memo[key] = value
+
+        # LIFO: "take" is explored first
+        stack.append((depth + 1, used, value, taken))
+        if not used & masks[depth]:
+            stack.append((depth + 1, used | masks[depth], value + values[depth], taken + (depth,)))
+
+    return best_value, [group[index][0] for index in best_taken]
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Offer Session Module
+Incremental offer evaluation for a cart being built at a terminal.
+
+The terminal opens a cart session with the full invoice once, then only
+sends line deltas. The server keeps the cart's running totals, trigger
+key counts and last match set in Redis, so a delta costs O(changed lines)
+to fold in, and matching only re-evaluates the index buckets (offer_index.py)
+of keys that appeared or disappeared plus the offers whose bounds the
+totals crossed - never a rescan of every line against every offer.
+"""
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import cint, flt, nowdate
+from posawesome.posawesome.api.offer_index import get_offer_index
+from posawesome.posawesome.doctype.pos_offer.pos_offer import check_offers_enabled_by_profile
+
+
+# Pickled session per (user, session id)
+OFFER_SESSION_PREFIX = "posa_offer_cart"
+OFFER_SESSION_TTL = 2 * 60 * 60
+
+HEADER_FIELDS = ("company", "pos_profile", "set_warehouse", "posting_date", "customer")
+LINE_FIELDS = ("item_code", "item_group", "brand", "qty", "rate")
+KEY_FIELDS = ("item_code", "item_group", "brand")
+
+# Running totals are rounded to this precision so add/remove cycles do not drift
+TOTAL_PRECISION = 6
+
+
+# =============================================================================
+# API
+# =============================================================================
+
+@frappe.whitelist()
+def apply_cart_delta(session_id, seq, changes=None, invoice_data=None):
+    """
+    POST - Fold cart changes into an offer session and return applicable offers
+
+    Args:
+        session_id: terminal-generated cart id
+        seq: delta sequence number, 0 with invoice_data, then +1 per call
+        changes: list of
+                 {"action": "set", "row_id", item_code/item_group/brand/qty/rate (changed fields)}
+                 {"action": "remove", "row_id"}
+                 {"action": "customer", "customer"}
+        invoice_data: full invoice (header + items with posa_row_id) - opens or resets the session
+
+    Returns:
+        dict: {"resync": 1} when the session expired or a delta was missed
+              (resend with invoice_data), otherwise
+              {"seq", "offers", "added", "removed", "total_qty", "total_amount"}
+    """
+    try:
+        seq = cint(seq)
+        changes = frappe.parse_json(changes) if isinstance(changes, str) else changes
+        invoice_data = frappe.parse_json(invoice_data) if isinstance(invoice_data, str) else invoice_data
+
+        key = _session_key(session_id)
+        cache = frappe.cache()
+
+        if invoice_data:
+            session = new_session(invoice_data)
+        else:
+            session = cache.get_value(key)
+            # Sessions stored before match sets were kept resync too
+            if not session or seq != session["seq"] + 1 or "match" not in session:
+                return {"resync": 1}
+            apply_changes(session, changes or [])
+
+        session["seq"] = seq
+        previous = session["offers"]
+        offers = match_session(session)
+
+        session["offers"] = [offer.name for offer in offers]
+        cache.set_value(key, session, expires_in_sec=OFFER_SESSION_TTL)
+
+        return {
+            "seq": seq,
+            "offers": offers,
+            "added": [name for name in session["offers"] if name not in previous],
+            "removed": [name for name in previous if name not in session["offers"]],
+            "total_qty": session["total_qty"],
+            "total_amount": session["total_amount"],
+        }
+
+    except Exception as e:
+        frappe.log_error(f"Error in apply_cart_delta: {str(e)}", "POS Offers Error")
+        return {"resync": 1}
+
+
+def _session_key(session_id):
+    return f"{OFFER_SESSION_PREFIX}::{frappe.session.user}::{session_id}"
+
+
+# =============================================================================
+# SESSION STATE
+# =============================================================================
+
+def new_session(invoice_data):
+    """Session state for a full invoice"""
+    session = {
+        "header": {fieldname: invoice_data.get(fieldname) for fieldname in HEADER_FIELDS},
+        "lines": {},
+        "keys": {fieldname: {} for fieldname in KEY_FIELDS},
+        "total_qty": 0,
+        "total_amount": 0,
+        "seq": 0,
+        "offers": [],
+        # (offer_type, value) of keys that appeared / disappeared since the last match
+        "changed_keys": set(),
+        # {"index": OfferIndex.token, "positions", "totals": (qty, amount)} of the last match
+        "match": None,
+    }
+    session["header"]["posting_date"] = session["header"]["posting_date"] or nowdate()
+    _set_customer(session, invoice_data.get("customer"))
+
+    for index, item in enumerate(invoice_data.get("items") or []):
+        row_id = item.get("posa_row_id") or item.get("row_id") or str(index)
+        _set_line(session, row_id, item)
+
+    return session
+
+
+def apply_changes(session, changes):
+    """Fold deltas into the session's lines, totals and key counts"""
+    for change in changes:
+        action = change.get("action")
+        if action == "set":
+            _set_line(session, change.get("row_id"), change)
+        elif action == "remove":
+            _remove_line(session, change.get("row_id"))
+        elif action == "customer":
+            _set_customer(session, change.get("customer"))
+
+
+def _set_customer(session, customer):
+    header = session["header"]
+    if customer == header.get("customer") and "customer_group" in header:
+        return
+
+    for fieldname in ("customer", "customer_group"):
+        if header.get(fieldname):
+            session["changed_keys"].add((fieldname, header[fieldname]))
+
+    header["customer"] = customer
+    header["customer_group"] = customer and frappe.get_cached_value("Customer", customer, "customer_group")
+
+    for fieldname in ("customer", "customer_group"):
+        if header.get(fieldname):
+            session["changed_keys"].add((fieldname, header[fieldname]))
+
+
+def _set_line(session, row_id, values):
+    old = session["lines"].get(row_id)
+    line = dict(old) if old else {fieldname: None for fieldname in LINE_FIELDS}
+    for fieldname in LINE_FIELDS:
+        if fieldname in values:
+            line[fieldname] = values.get(fieldname)
+
+    if old == line:
+        return
+
+    if old:
+        _fold_line(session, old, -1)
+    _fold_line(session, line, 1)
+    session["lines"][row_id] = line
+
+
+def _remove_line(session, row_id):
+    old = session["lines"].pop(row_id, None)
+    if old:
+        _fold_line(session, old, -1)
+
+
+def _fold_line(session, line, sign):
+    """Add (sign 1) or subtract (sign -1) one line's contribution"""
+    qty = flt(line.get("qty"))
+    amount = qty * flt(line.get("rate"))
+    session["total_qty"] = flt(session["total_qty"] + sign * qty, TOTAL_PRECISION)
+    session["total_amount"] = flt(session["total_amount"] + sign * amount, TOTAL_PRECISION)
+
+    for fieldname in KEY_FIELDS:
+        value = line.get(fieldname)
+        if not value:
+            continue
+
+        # Key -> number of lines carrying it; a key triggers offers while its count > 0
+        counts = session["keys"][fieldname]
+        count = counts.get(value, 0) + sign
+        if count > 0:
+            counts[value] = count
+        else:
+            counts.pop(value, None)
+
+        if (value in counts) != (count - sign > 0):
+            session["changed_keys"].add((fieldname, value))
+
+
+# =============================================================================
+# MATCHING
+# =============================================================================
+
+def match_session(session):
+    """
+    Applicable offers for the session's distinct keys and running totals.
+    Updates the previous match set when it was made on the same offer
+    index, otherwise matches from scratch.
+    """
+    header = session["header"]
+    if not check_offers_enabled_by_profile(header.get("pos_profile")):
+        session["match"] = None
+        return []
+
+    index = get_offer_index(
+        header.get("company"),
+        header.get("pos_profile"),
+        header.get("set_warehouse"),
+        header.get("posting_date")
+    )
+
+    keys = {fieldname: set(counts) for fieldname, counts in session["keys"].items()}
+    if header.get("customer"):
+        keys["customer"] = {header["customer"]}
+    if header.get("customer_group"):
+        keys["customer_group"] = {header["customer_group"]}
+
+    totals = (session["total_qty"], session["total_amount"])
+    previous = session.get("match")
+    if previous and index.token is not None and previous["index"] == index.token:
+        positions = index.rematch_positions(
+            previous["positions"], keys, session["changed_keys"], previous["totals"], totals
+        )
+    else:
+        positions = index.match_positions(keys, *totals)
+
+    session["match"] = {"index": index.token, "positions": sorted(positions), "totals": totals}
+    session["changed_keys"] = set()
+    return index.get_offers(positions)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+POS Trace Module
+Sampled per-stage timings of hot POS paths (invoice submission), pushed to
+a bounded Redis list as each sampled operation finishes (one pipelined
+round trip) - instead of one Error Log insert per stage per sale. Nothing
+is held in the worker process, so every worker's traces are readable at once.
+
+Sampling rate: site config "posa_trace_sample_rate" (0..1, default 0.05).
+"""
+from __future__ import unicode_literals
+import json
+import random
+import time
+from contextlib import contextmanager
+import frappe
+import redis
+from frappe.utils import cint, flt, now
+
+
+# Redis list of traces (JSON), newest last
+TRACE_LIST_KEY = "posa_traces"
+
+# Traces kept in Redis
+MAX_STORED_TRACES = 5000
+
+DEFAULT_SAMPLE_RATE = 0.05
+
+
+# =============================================================================
+# RECORDING
+# =============================================================================
+
+class Trace:
+    """Timings of one sampled operation; every method is a no-op when not sampled"""
+
+    def __init__(self, name, sampled):
+        self.name = name
+        self.sampled = sampled
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, stage_name):
+        if not self.sampled:
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage_name] = round((time.perf_counter() - started) * 1000, 3)
+
+    def finish(self, **fields):
+        """Store the trace with extra fields (invoice name, error, ...)"""
+        if not self.sampled:
+            return
+
+        _store_trace(dict(
+            fields,
+            name=self.name,
+            site=frappe.local.site,
+            timestamp=now(),
+            total_ms=round((time.perf_counter() - self.started) * 1000, 3),
+            stages=self.stages
+        ))
+
+
+def start_trace(name):
+    """New Trace, sampled with the site's posa_trace_sample_rate"""
+    rate = flt(frappe.conf.get("posa_trace_sample_rate", DEFAULT_SAMPLE_RATE))
+    return Trace(name, rate > 0 and random.random() < rate)
+
+
+# =============================================================================
+# STORAGE
+# =============================================================================
+
+def _store_trace(entry):
+    """RPUSH + LTRIM in one pipelined round trip"""
+    try:
+        cache = frappe.cache()
+        key = cache.make_key(TRACE_LIST_KEY)
+        pipe = redis.Redis.pipeline(cache, transaction=False)
+        pipe.rpush(key, json.dumps(entry, default=str))
+        pipe.ltrim(key, -MAX_STORED_TRACES, -1)
+        pipe.execute()
+    except Exception as e:
+        frappe.logger().error(f"Error in _store_trace: {str(e)}")
+
+
+# =============================================================================
+# READ
+# =============================================================================
+
+@frappe.whitelist()
+def get_recent_traces(limit=100, name=None):
+    """
+    GET - Most recent traces, newest first (System Manager only)
+
+    Args:
+        limit: max traces returned
+        name: only traces of this operation (e.g. "create_and_submit_invoice")
+    """
+    frappe.only_for("System Manager")
+
+    limit = min(max(cint(limit) or 100, 1), MAX_STORED_TRACES)
+    cache = frappe.cache()
+    raw = redis.Redis.lrange(cache, cache.make_key(TRACE_LIST_KEY), -MAX_STORED_TRACES if name else -limit, -1)
+
+    traces = []
+    for value in reversed(raw or []):
+        trace = json.loads(frappe.safe_decode(value))
+        if name and trace.get("name") != name:
+            continue
+        traces.append(trace)
+        if len(traces) >= limit:
+            break
+
+    return traces
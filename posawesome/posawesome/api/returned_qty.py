@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Returned Quantity Ledger
+Sales Invoice Item.posa_returned_qty holds how much of each original line
+has been returned (in the line's UOM). Return invoices add to it on submit
+and subtract on cancel, so checking a return reads the original lines only,
+however many partial returns exist.
+"""
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+
+def _is_tracked_return(doc):
+    return doc.get("is_return") and doc.get("return_against")
+
+
+def get_return_quantities(doc):
+    """{original Sales Invoice Item name: qty returned by doc, in the original line's UOM}"""
+    return_qty = {}
+    rows = [row for row in doc.items if row.get("sales_invoice_item")]
+    if not rows:
+        return return_qty
+
+    conversion_factors = dict(frappe.get_all(
+        "Sales Invoice Item",
+        filters={"name": ["in", list({row.sales_invoice_item for row in rows})]},
+        fields=["name", "conversion_factor"],
+        as_list=True
+    ))
+
+    for row in rows:
+        stock_qty = abs(flt(row.stock_qty) or flt(row.qty) * (flt(row.conversion_factor) or 1))
+        original_factor = flt(conversion_factors.get(row.sales_invoice_item)) or 1
+        return_qty[row.sales_invoice_item] = return_qty.get(row.sales_invoice_item, 0) + stock_qty / original_factor
+
+    return return_qty
+
+
+def _get_original_lines(return_against, line_names, for_update=False):
+    return {
+        row.name: row
+        for row in frappe.get_all(
+            "Sales Invoice Item",
+            filters={"name": ["in", line_names], "parent": return_against},
+            fields=["name", "idx", "item_code", "qty", "posa_returned_qty"],
+            for_update=for_update
+        )
+    }
+
+
+def _check_returnable(doc, return_qty, originals):
+    precision = doc.items[0].precision("qty") if doc.items else 3
+    for line_name, qty in return_qty.items():
+        original = originals.get(line_name)
+        if not original:
+            frappe.throw(_("Row {0} is not part of invoice {1}").format(line_name, doc.return_against))
+
+        returnable = flt(original.qty) - flt(original.posa_returned_qty)
+        if flt(qty, precision) > flt(returnable, precision):
+            frappe.throw(_("Row #{0} ({1}): only {2} left to return from {3}").format(
+                original.idx, original.item_code, flt(returnable, precision), doc.return_against
+            ))
+
+
+# =============================================================================
+# DOC EVENTS (Sales Invoice)
+# =============================================================================
+
+def validate_returned_qty(doc, method=None):
+    """validate - early over-return check against the ledger (no locks)"""
+    if not _is_tracked_return(doc):
+        return
+
+    return_qty = get_return_quantities(doc)
+    if return_qty:
+        _check_returnable(doc, return_qty, _get_original_lines(doc.return_against, list(return_qty)))
+
+
+def on_return_submit(doc, method=None):
+    """on_submit - re-check under row locks, then add to the ledger"""
+    if not _is_tracked_return(doc):
+        return
+
+    return_qty = get_return_quantities(doc)
+    if not return_qty:
+        return
+
+    originals = _get_original_lines(doc.return_against, list(return_qty), for_update=True)
+    _check_returnable(doc, return_qty, originals)
+
+    for line_name, qty in return_qty.items():
+        frappe.db.set_value(
+            "Sales Invoice Item",
+            line_name,
+            "posa_returned_qty",
+            flt(originals[line_name].posa_returned_qty) + qty,
+            update_modified=False
+        )
+
+
+def on_return_cancel(doc, method=None):
+    """on_cancel - take the return back out of the ledger"""
+    if not _is_tracked_return(doc):
+        return
+
+    return_qty = get_return_quantities(doc)
+    if not return_qty:
+        return
+
+    originals = _get_original_lines(doc.return_against, list(return_qty), for_update=True)
+    for line_name, qty in return_qty.items():
+        if line_name in originals:
+            frappe.db.set_value(
+                "Sales Invoice Item",
+                line_name,
+                "posa_returned_qty",
+                max(flt(originals[line_name].posa_returned_qty) - qty, 0),
+                update_modified=False
+            )
@@ -5,9 +5,54 @@ Following ERPNext sales_invoice.py approach: __islocal -> insert() -> submit()
 """
 from __future__ import unicode_literals
 import json
+import re
+import time
+from contextlib import contextmanager
 import frappe
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import flt, cint, add_to_date, now_datetime, getdate
+from posawesome.posawesome.api.pos_trace import start_trace
+from posawesome.posawesome.api.invoice_template import apply_invoice_template
+from posawesome.posawesome.api.offer_index import verify_invoice_offers
+
+
+# Realtime event sent to the cashier when a queued invoice is processed
+INVOICE_QUEUE_EVENT = "posa_invoice_queue_update"
+
+# Queued entries untouched / Processing entries claimed longer ago than this
+# are re-enqueued by the scheduler (see requeue_stale_invoices)
+INVOICE_QUEUE_STALE_MINUTES = 5
+
+# submit_invoices_bulk: batches up to this size are submitted inline,
+# larger ones are split into worker jobs of BULK_CHUNK_SIZE invoices
+BULK_INLINE_LIMIT = 20
+BULK_CHUNK_SIZE = 50
+MAX_BULK_INVOICES = 1000
+
+# response="slim": what the receipt and payment screens use
+SLIM_INVOICE_FIELDS = (
+    "name", "doctype", "docstatus", "status", "company", "customer", "customer_name",
+    "posting_date", "posting_time", "currency", "is_return", "return_against",
+    "posa_pos_opening_shift", "total_qty", "total", "net_total", "discount_amount",
+    "additional_discount_percentage", "total_taxes_and_charges", "grand_total",
+    "rounding_adjustment", "rounded_total", "paid_amount", "change_amount",
+    "write_off_amount", "outstanding_amount",
+)
+SLIM_ITEM_FIELDS = (
+    "item_code", "item_name", "qty", "uom", "price_list_rate", "rate",
+    "discount_percentage", "discount_amount", "amount", "posa_row_id",
+)
+SLIM_PAYMENT_FIELDS = ("mode_of_payment", "type", "amount", "base_amount")
+SLIM_TAX_FIELDS = ("description", "account_head", "rate", "tax_amount", "total")
+
+# Idempotency key -> Sales Invoice name (the unique posa_idempotency_key
+# column stays the source of truth when the cache entry is gone)
+IDEMPOTENCY_CACHE_PREFIX = "posa_invoice_idempotency"
+IDEMPOTENCY_CACHE_TTL = 7 * 24 * 3600
+
+# Held while a key is being submitted; a concurrent retry waits at most this long
+IDEMPOTENCY_LOCK_PREFIX = "posa_invoice_idempotency_lock"
+IDEMPOTENCY_LOCK_TIMEOUT = 30
 
 
 # ===== DELETE OPERATIONS =====
@@ -57,42 +102,45 @@ def delete_invoice(invoice_name):
 
 # ===== GET RETURN OPERATIONS =====
 
+# Item line fields returned for return selection
+RETURN_ITEM_FIELDS = [
+    "name", "item_code", "item_name", "qty", "rate", "amount", "stock_qty",
+    "discount_percentage", "discount_amount", "uom", "warehouse",
+    "price_list_rate", "conversion_factor", "posa_returned_qty"
+]
+
+RETURN_SEARCH_LIMIT = 50
+
+_DATE_TERM = re.compile(r"^\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}$")
+
+
 @frappe.whitelist()
-def get_invoices_for_return(invoice_name, company):
+def get_invoices_for_return(invoice_name, company, include_items=1):
     """
     Search invoices for return operations
+
+    The search term matches (all index range scans):
+    - invoice name prefix - also a scanned receipt barcode (the invoice name)
+    - customer prefix
+    - posting date, when the term is a date
+    Falls back to the legacy substring match on the invoice name only
+    when nothing matched (e.g. typing the numeric tail of a name).
+
+    Args:
+        include_items: 1 - item lines of all results (one query),
+                       0 - headers only; load lines with get_return_invoice_items
     """
     try:
-        # Search for invoices that can be returned
-        filters = {
-            "company": company,
-            "docstatus": 1,  # Only submitted invoices
-            "is_return": 0,  # Not already a return
-        }
+        term = (invoice_name or "").strip()
+        invoices = _search_return_invoices(company, term)
 
-        if invoice_name:
-            filters["name"] = ["like", f"%{invoice_name}%"]
+        if not invoices and term:
+            invoices = _search_return_invoices(company, term, substring=True)
 
-        invoices = frappe.get_all(
-            "Sales Invoice",
-            filters=filters,
-            fields=["name", "customer", "grand_total", "outstanding_amount", "posting_date", "currency"],
-            order_by="posting_date desc",
-            limit=50
-        )
-
-        # Get items data for each invoice with essential fields
-        for invoice in invoices:
-            items = frappe.get_all(
-                "Sales Invoice Item",
-                filters={"parent": invoice["name"]},
-                fields=[
-                    "name", "item_code", "item_name", "qty", "rate", "amount", "stock_qty",
-                    "discount_percentage", "discount_amount", "uom", "warehouse",
-                    "price_list_rate", "conversion_factor"
-                ]
-            )
-            invoice["items"] = items
+        if cint(include_items) and invoices:
+            items_by_invoice = _get_return_items([invoice["name"] for invoice in invoices])
+            for invoice in invoices:
+                invoice["items"] = items_by_invoice.get(invoice["name"], [])
 
         return invoices
 
@@ -101,31 +149,114 @@ def get_invoices_for_return(invoice_name, company):
         return []
 
 
+@frappe.whitelist()
+def get_return_invoice_items(invoice_name):
+    """GET - Item lines of one invoice, for the invoice the cashier opens"""
+    try:
+        frappe.has_permission("Sales Invoice", "read", invoice_name, throw=True)
+        return _get_return_items([invoice_name]).get(invoice_name, [])
+
+    except Exception as e:
+        frappe.logger().error(f"Error in get_return_invoice_items: {str(e)}")
+        return []
+
+
+def _search_return_invoices(company, term, substring=False):
+    conditions = [
+        "company = %(company)s",
+        "docstatus = 1",  # Only submitted invoices
+        "is_return = 0",  # Not already a return
+    ]
+    params = {"company": company, "limit": RETURN_SEARCH_LIMIT}
+
+    if substring:
+        conditions.append("name LIKE %(substring)s")
+        params["substring"] = f"%{term}%"
+    elif term:
+        params["prefix"] = f"{term}%"
+        matches = [
+            "name LIKE %(prefix)s",
+            "customer LIKE %(prefix)s",
+        ]
+        posting_date = _parse_search_date(term)
+        if posting_date:
+            matches.append("posting_date = %(posting_date)s")
+            params["posting_date"] = posting_date
+        conditions.append(f"({' OR '.join(matches)})")
+
+    return frappe.db.sql(
+        f"""
+        SELECT name, customer, grand_total, outstanding_amount, posting_date, currency
+        FROM `tabSales Invoice`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY posting_date DESC, name DESC
+        LIMIT %(limit)s
+        """,
+        params,
+        as_dict=True
+    )
+
+
+def _parse_search_date(term):
+    """Date for terms like 2025-10-27 or 27-10-2025, else None"""
+    if not _DATE_TERM.match(term):
+        return None
+    try:
+        return getdate(term)
+    except Exception:
+        return None
+
+
+def _get_return_items(invoice_names):
+    """{invoice name: [item lines]} in one parent IN (...) query"""
+    rows = frappe.get_all(
+        "Sales Invoice Item",
+        filters={"parent": ["in", invoice_names], "parenttype": "Sales Invoice"},
+        fields=RETURN_ITEM_FIELDS + ["parent"],
+        order_by="parent asc, idx asc",
+        limit_page_length=0
+    )
+
+    items_by_invoice = {}
+    for row in rows:
+        # Left to return, from the returned qty ledger (see api/returned_qty.py)
+        row["returnable_qty"] = max(flt(row.qty) - flt(row.posa_returned_qty), 0)
+        items_by_invoice.setdefault(row.pop("parent"), []).append(row)
+    return items_by_invoice
+
+
 # ===== CREATE AND SUBMIT OPERATION =====
 # This is the ONLY method used for creating POS invoices
-# Following ERPNext native workflow: __islocal -> insert() -> submit()
+# Following ERPNext native workflow: __islocal -> submit() (insert as submitted)
 
 @frappe.whitelist()
-def create_and_submit_invoice(invoice_doc):
+def create_and_submit_invoice(invoice_doc, async_submit=0, idempotency_key=None, response="full", item_fields=None):
     """
     Create and submit Sales Invoice using ERPNext native workflow 100%.
 
-    This follows the exact same flow as ERPNext's sales_invoice.py:
+    Single-pass pipeline (see _submit_invoice_doc):
     1. frappe.get_doc() - Create document from dict
     2. doc.set_missing_values() - Fill missing values (native)
-    3. doc.validate() - Full validation (native)
-    4. doc.insert() - Save draft (native)
-    5. doc.submit() - Submit document (native)
+    3. doc.submit() - Insert directly as submitted (native): validate,
+       before_submit, db insert, on_update, on_submit - each once
 
     No custom logic - only ERPNext native methods!
 
     This is for the __islocal scenario:
     - Invoice stays local (__islocal = 1) during all operations
     - When Print is clicked, send entire doc to server
-    - Server: uses native workflow to insert() then submit() immediately
+    - Server: uses native workflow to insert it as submitted immediately
 
     Args:
         invoice_doc (dict): Complete Sales Invoice document as JSON/dict
+        async_submit (int): 1 - store the payload in POS Invoice Queue and
+            submit it in a background worker (see enqueue_invoice)
+        idempotency_key (str): client-generated key, one per sale; a retry
+            with the same key returns the invoice already submitted
+            (may also be sent as invoice_doc.posa_idempotency_key)
+        response (str): "full" - doc.as_dict(); "slim" - header totals,
+            payments, taxes summary and item lines only (see get_invoice_response)
+        item_fields: JSON list of item fields for "slim" (default SLIM_ITEM_FIELDS)
 
     Returns:
         dict: Submitted invoice as dict
@@ -135,17 +266,89 @@ def create_and_submit_invoice(invoice_doc):
         if isinstance(invoice_doc, str):
             invoice_doc = json.loads(invoice_doc)
 
-        # Debug: Log function name and important data
-        customer = invoice_doc.get('customer', 'Unknown')
-        items_count = len(invoice_doc.get('items', []))
-        grand_total = invoice_doc.get('grand_total', 0)
-        is_return = invoice_doc.get('is_return', 0)
-        payments_count = len(invoice_doc.get('payments', []))
+        if idempotency_key:
+            invoice_doc["posa_idempotency_key"] = idempotency_key
+        key = invoice_doc.get("posa_idempotency_key")
 
-        frappe.log_error(
-            f"create_and_submit_invoice() - Items: {items_count}, Total: {grand_total}, Is Return: {is_return}, Payments: {payments_count}",
-            "POS Invoice Debug"
-        )
+        # Retry of a sale that already went through - no second ledger posting
+        existing = key and get_invoice_by_idempotency_key(key)
+        if existing:
+            return get_invoice_response(frappe.get_doc("Sales Invoice", existing), response, item_fields)
+
+        if cint(async_submit):
+            return enqueue_invoice(invoice_doc)
+
+        try:
+            with _idempotency_lock(key):
+                doc = _submit_invoice_doc(invoice_doc)
+
+        except frappe.exceptions.UniqueValidationError:
+            # Lost a race on posa_idempotency_key - the committed invoice wins
+            frappe.db.rollback()
+            existing = key and get_invoice_by_idempotency_key(key)
+            if not existing:
+                raise
+            doc = frappe.get_doc("Sales Invoice", existing)
+
+        # Return the submitted document
+        return get_invoice_response(doc, response, item_fields)
+
+    except frappe.exceptions.ValidationError as ve:
+        error_msg = str(ve)
+        frappe.log_error(f"Validation error: {error_msg}", "POS Invoice Error")
+        frappe.throw(_("Validation error: {0}").format(str(ve)))
+
+    except Exception as e:
+        error_msg = str(e)
+        frappe.log_error(f"Error: {error_msg}", "POS Invoice Error")
+        frappe.throw(_("Error creating and submitting invoice: {0}").format(str(e)))
+
+
+def get_invoice_response(doc, response="full", item_fields=None):
+    """
+    Submitted invoice in the requested projection.
+    "slim" skips the full as_dict() serialization of every field and row.
+    """
+    if response != "slim":
+        return doc.as_dict()
+
+    if isinstance(item_fields, str):
+        item_fields = json.loads(item_fields)
+    item_fields = item_fields or SLIM_ITEM_FIELDS
+
+    result = {fieldname: doc.get(fieldname) for fieldname in SLIM_INVOICE_FIELDS}
+    result["items"] = [{fieldname: row.get(fieldname) for fieldname in item_fields} for row in doc.items]
+    result["payments"] = [
+        {fieldname: row.get(fieldname) for fieldname in SLIM_PAYMENT_FIELDS}
+        for row in doc.payments
+    ]
+    result["taxes"] = [{fieldname: row.get(fieldname) for fieldname in SLIM_TAX_FIELDS} for row in doc.taxes]
+    return result
+
+
+def _submit_invoice_doc(invoice_doc, single_pass=True):
+    """
+    Native insert + submit of an invoice dict, shared by the sync and queued paths.
+
+    single_pass (default): submit() on the new document inserts it with
+    docstatus 1, so validate() and the controller hooks run once.
+    single_pass=False: legacy validate() -> insert() -> submit(), which
+    validates three times (kept for benchmark_submit_pipeline).
+    """
+    key = invoice_doc.get("posa_idempotency_key")
+    if key:
+        existing = get_invoice_by_idempotency_key(key)
+        if existing:
+            return frappe.get_doc("Sales Invoice", existing)
+
+    trace = start_trace("create_and_submit_invoice")
+
+    try:
+        # Profile tax rows and payment accounts from the cached template, so
+        # set_missing_values() skips set_taxes() and the account lookups
+        # (header fields are re-read from the POS Profile there regardless)
+        with trace.stage("apply_template"):
+            apply_invoice_template(invoice_doc)
 
         # Create new document from dict - using ERPNext native method
         doc = frappe.get_doc(invoice_doc)
@@ -157,34 +360,483 @@ def create_and_submit_invoice(invoice_doc):
 
         # Step 1: Use ERPNext native set_missing_values() - fills all default values
         # This is called from SellingController and sets customer, warehouse, etc.
-        doc.set_missing_values()
-        frappe.log_error(f"set_missing_values() - Doctype: {doc.doctype}", "POS Invoice Debug")
-
-        # Step 2: Use ERPNext native validate() - full validation
-        # This validates customer, items, taxes, payments, etc.
-        doc.validate()
-        frappe.log_error(f"validate() - Docstatus: {doc.docstatus}", "POS Invoice Debug")
+        with trace.stage("set_missing_values"):
+            doc.set_missing_values()
+
+        # Offers were evaluated in the browser - re-verify them once here
+        with trace.stage("verify_offers"):
+            verify_invoice_offers(doc)
+
+        if single_pass:
+            # Step 2: Use ERPNext native submit() on the unsaved document -
+            # inserts with docstatus = 1: validate(), before_submit(),
+            # db insert, on_update(), on_submit(), once each
+            with trace.stage("submit"):
+                doc.submit()
+        else:
+            with trace.stage("validate"):
+                doc.validate()
+            with trace.stage("insert"):
+                doc.insert()
+            with trace.stage("submit"):
+                doc.submit()
 
-        # Step 3: Use ERPNext native insert() - save draft
-        # This saves the document and sets docstatus = 0
-        doc.insert()
         invoice_name = doc.name
-        frappe.log_error(f"insert() - Name: {invoice_name}", "POS Invoice Debug")
 
-        # Step 4: Use ERPNext native submit() - submit document
-        # This runs before_submit() then on_submit() hooks
-        doc.submit()
-        frappe.log_error(f"submit() - Success: {invoice_name}", "POS Invoice Debug")
+    except Exception as e:
+        trace.finish(
+            error=str(e),
+            items=len(invoice_doc.get("items") or []),
+            is_return=invoice_doc.get("is_return", 0)
+        )
+        raise
 
-        # Return the submitted document
-        return doc.as_dict()
+    trace.finish(
+        invoice=invoice_name,
+        items=len(doc.items),
+        payments=len(doc.payments),
+        grand_total=doc.grand_total,
+        is_return=doc.is_return
+    )
 
-    except frappe.exceptions.ValidationError as ve:
-        error_msg = str(ve)
-        frappe.log_error(f"Validation error: {error_msg}", "POS Invoice Error")
-        frappe.throw(_("Validation error: {0}").format(str(ve)))
+    if key:
+        frappe.db.after_commit.add(lambda: _remember_idempotency_key(key, invoice_name))
 
-    except Exception as e:
-        error_msg = str(e)
-        frappe.log_error(f"Error: {error_msg}", "POS Invoice Error")
-        frappe.throw(_("Error creating and submitting invoice: {0}").format(str(e)))
+    return doc
+
+
+# ===== IDEMPOTENCY =====
+
+def get_invoice_by_idempotency_key(key):
+    """Sales Invoice created with this key, from Redis or the unique column"""
+    name = frappe.cache().get_value(f"{IDEMPOTENCY_CACHE_PREFIX}::{key}")
+    if name:
+        return name
+
+    name = frappe.db.get_value("Sales Invoice", {"posa_idempotency_key": key}, "name")
+    if name:
+        _remember_idempotency_key(key, name)
+    return name
+
+
+def _remember_idempotency_key(key, invoice_name):
+    frappe.cache().set_value(
+        f"{IDEMPOTENCY_CACHE_PREFIX}::{key}",
+        invoice_name,
+        expires_in_sec=IDEMPOTENCY_CACHE_TTL
+    )
+
+
+@contextmanager
+def _idempotency_lock(key):
+    """
+    Serialize submissions of one key across workers. A retry arriving
+    while the first attempt is still posting waits for it, then finds the
+    invoice in the cache instead of creating a second one.
+    """
+    if not key:
+        yield
+        return
+
+    cache = frappe.cache()
+    lock_key = cache.make_key(f"{IDEMPOTENCY_LOCK_PREFIX}::{key}")
+    deadline = time.monotonic() + IDEMPOTENCY_LOCK_TIMEOUT
+
+    while not cache.set(lock_key, 1, nx=True, ex=IDEMPOTENCY_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            frappe.throw(_("Invoice {0} is still being submitted, please retry").format(key))
+        time.sleep(0.2)
+
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+# ===== ASYNC SUBMISSION =====
+# Optional mode: the request only stores the payload (one small INSERT) and
+# returns a provisional receipt number; ledger posting runs in an RQ worker.
+
+def enqueue_invoice(invoice_doc):
+    """
+    Store the invoice payload in POS Invoice Queue and schedule its submission.
+    The queue row commits with this request, so the payload survives a lost
+    RQ job; requeue_stale_invoices picks such rows up again.
+
+    Returns:
+        dict: {"queue_name": provisional receipt number, "status": "Queued"}
+    """
+    queue = _insert_queue_entry(invoice_doc)
+
+    _enqueue_invoice_job(queue.name)
+
+    return {"queue_name": queue.name, "status": queue.status}
+
+
+def _insert_queue_entry(invoice_doc):
+    """New queue entry, or the existing one for the same idempotency key"""
+    key = invoice_doc.get("posa_idempotency_key")
+    if key:
+        existing = frappe.db.get_value("POS Invoice Queue", {"idempotency_key": key}, "name")
+        if existing:
+            return frappe.get_doc("POS Invoice Queue", existing)
+
+    queue = frappe.get_doc({
+        "doctype": "POS Invoice Queue",
+        "status": "Queued",
+        "pos_profile": invoice_doc.get("pos_profile"),
+        "idempotency_key": key,
+        "payload": frappe.as_json(invoice_doc, indent=None)
+    })
+    queue.insert(ignore_permissions=True)
+    return queue
+
+
+def _enqueue_invoice_job(queue_name):
+    frappe.enqueue(
+        "posawesome.posawesome.api.sales_invoice.process_invoice_queue",
+        queue="short",
+        job_id=f"posa_invoice_queue::{queue_name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        queue_name=queue_name
+    )
+
+
+def process_invoice_queue(queue_name):
+    """
+    RQ job - submit one queued invoice.
+    The entry is claimed (Queued -> Processing) by one conditional UPDATE
+    and committed first, so only one worker ever holds it. The invoice and
+    the final status then commit together, and only while this attempt
+    still holds the claim (see requeue_stale_invoices).
+    """
+    attempt = _claim_queue_entry(queue_name)
+    if attempt is None:
+        return
+
+    queue = frappe.db.get_value("POS Invoice Queue", queue_name, ["payload", "owner"], as_dict=True)
+    _submit_claimed_entry(queue_name, attempt, queue.payload)
+
+    _publish_queue_status(queue_name, queue.owner)
+
+
+def _claim_queue_entry(queue_name):
+    """
+    Queued -> Processing, atomically.
+
+    Returns:
+        int: the attempt number this claim holds, None when the entry is
+             not Queued (another worker has it, or it is done)
+    """
+    now = now_datetime()
+    frappe.db.sql(
+        """
+        UPDATE `tabPOS Invoice Queue`
+        SET status = 'Processing', claimed_at = %(now)s,
+            attempts = IFNULL(attempts, 0) + 1, modified = %(now)s
+        WHERE name = %(name)s AND status = 'Queued'
+        """,
+        {"name": queue_name, "now": now}
+    )
+    if frappe.db._cursor.rowcount != 1:
+        frappe.db.rollback()
+        return None
+
+    attempt = cint(frappe.db.get_value("POS Invoice Queue", queue_name, "attempts"))
+    frappe.db.commit()
+    return attempt
+
+
+def _finish_queue_entry(queue_name, attempt, values):
+    """
+    Processing -> final status, only if the entry is still held by attempt.
+    Runs in the invoice's transaction: the row lock taken here keeps the
+    sweep out until the invoice and the status commit together.
+
+    Returns:
+        bool: False when the claim was taken back in the meantime
+    """
+    frappe.db.sql(
+        """
+        UPDATE `tabPOS Invoice Queue`
+        SET status = %(status)s, sales_invoice = %(sales_invoice)s,
+            error = %(error)s, modified = %(now)s
+        WHERE name = %(name)s AND status = 'Processing' AND attempts = %(attempt)s
+        """,
+        {
+            "name": queue_name,
+            "attempt": attempt,
+            "status": values["status"],
+            "sales_invoice": values.get("sales_invoice"),
+            "error": values.get("error"),
+            "now": now_datetime(),
+        }
+    )
+    return frappe.db._cursor.rowcount == 1
+
+
+def _submit_claimed_entry(queue_name, attempt, payload):
+    """
+    Submit a claimed entry and commit the invoice with its final status.
+    Runs under the key's lock like the sync path; a key another path
+    already submitted resolves to that invoice, so an entry is never
+    marked Failed for an invoice that exists.
+    """
+    invoice_doc = json.loads(payload)
+    key = invoice_doc.get("posa_idempotency_key")
+
+    with _idempotency_lock(key):
+        try:
+            doc = _submit_invoice_doc(invoice_doc)
+            values = {"status": "Submitted", "sales_invoice": doc.name, "error": None}
+
+        except Exception as e:
+            frappe.db.rollback()
+            values = _resolve_failed_submit(key, e, f"process_invoice_queue {queue_name}")
+
+        if _finish_queue_entry(queue_name, attempt, values):
+            frappe.db.commit()
+        else:
+            # requeue_stale_invoices took the entry back - its new attempt
+            # submits the invoice, this one must not commit it
+            frappe.db.rollback()
+
+
+def _resolve_failed_submit(key, error, context):
+    """
+    Final queue values after a failed submit. Losing a race on the unique
+    posa_idempotency_key (UniqueValidationError) means the invoice exists:
+    the committed invoice wins and the entry is Submitted with it.
+    """
+    existing = key and get_invoice_by_idempotency_key(key)
+    if existing:
+        return {"status": "Submitted", "sales_invoice": existing, "error": None}
+
+    frappe.log_error(f"Error in {context}: {str(error)}", "POS Invoice Error")
+    return {"status": "Failed", "error": str(error)}
+
+
+def _publish_queue_status(queue_name, user):
+    frappe.publish_realtime(
+        INVOICE_QUEUE_EVENT,
+        get_invoice_queue_status(queue_name)[0],
+        user=user
+    )
+
+
+@frappe.whitelist()
+def get_invoice_queue_status(queue_names):
+    """
+    GET - Status of queued invoices (polling fallback for the realtime event)
+
+    Args:
+        queue_names: one name or a JSON list of names
+
+    Returns:
+        list: [{"queue_name", "status", "sales_invoice", "error"}]
+    """
+    if isinstance(queue_names, str):
+        queue_names = json.loads(queue_names) if queue_names.startswith("[") else [queue_names]
+
+    rows = frappe.get_all(
+        "POS Invoice Queue",
+        filters={"name": ["in", queue_names]},
+        fields=["name", "status", "sales_invoice", "error"]
+    )
+    return [
+        {
+            "queue_name": row.name,
+            "status": row.status,
+            "sales_invoice": row.sales_invoice,
+            "error": row.error
+        }
+        for row in rows
+    ]
+
+
+def requeue_stale_invoices():
+    """
+    Scheduler - re-enqueue entries whose job was lost or whose worker died.
+
+    Queued entries are simply enqueued again; the job's claim makes a
+    duplicate job a no-op. A Processing entry is taken back (-> Queued)
+    only by a compare-and-set on the attempt that claimed it, so a worker
+    still running that attempt cannot commit its invoice afterwards
+    (_finish_queue_entry fails) and never races the new attempt.
+    """
+    cutoff = add_to_date(now_datetime(), minutes=-INVOICE_QUEUE_STALE_MINUTES)
+
+    queued = frappe.get_all(
+        "POS Invoice Queue",
+        filters={"status": "Queued", "modified": ["<", cutoff]},
+        pluck="name"
+    )
+
+    expired = frappe.db.sql(
+        """
+        SELECT name, attempts
+        FROM `tabPOS Invoice Queue`
+        WHERE status = 'Processing'
+            AND IFNULL(claimed_at, modified) < %(cutoff)s
+        """,
+        {"cutoff": cutoff},
+        as_dict=True
+    )
+    for entry in expired:
+        frappe.db.sql(
+            """
+            UPDATE `tabPOS Invoice Queue`
+            SET status = 'Queued', claimed_at = NULL, modified = %(now)s
+            WHERE name = %(name)s AND status = 'Processing' AND attempts = %(attempt)s
+            """,
+            {"name": entry.name, "attempt": cint(entry.attempts), "now": now_datetime()}
+        )
+        if frappe.db._cursor.rowcount == 1:
+            queued.append(entry.name)
+
+    # Jobs start after the takeovers above commit
+    for queue_name in queued:
+        _enqueue_invoice_job(queue_name)
+
+
+# ===== BULK SUBMISSION =====
+# Replay of invoices queued offline by a terminal. Inline, each invoice runs
+# inside its own savepoint, so one failure rolls back only that invoice;
+# queued, each invoice commits on its own.
+
+@frappe.whitelist()
+def submit_invoices_bulk(invoices):
+    """
+    POST - Submit many invoices in one call
+
+    Up to BULK_INLINE_LIMIT invoices are submitted in this request. Larger
+    batches are stored in POS Invoice Queue and split into jobs of
+    BULK_CHUNK_SIZE, so parallelism is bounded by the "short" queue workers;
+    poll get_invoice_queue_status (or listen to the realtime event) for
+    the final state.
+
+    Args:
+        invoices: JSON list of invoice docs (as for create_and_submit_invoice)
+
+    Returns:
+        dict: {"queued": bool, "invoices": manifest aligned with input}
+              manifest entry: {"index", "status", "sales_invoice", "queue_name", "error"}
+    """
+    if isinstance(invoices, str):
+        invoices = json.loads(invoices)
+
+    invoices = invoices or []
+    if len(invoices) > MAX_BULK_INVOICES:
+        frappe.throw(_("At most {0} invoices can be submitted at once").format(MAX_BULK_INVOICES))
+
+    if len(invoices) <= BULK_INLINE_LIMIT:
+        return {"queued": False, "invoices": _submit_invoices_inline(invoices)}
+
+    queue_names = [_insert_queue_entry(invoice_doc).name for invoice_doc in invoices]
+
+    for start in range(0, len(queue_names), BULK_CHUNK_SIZE):
+        chunk = queue_names[start:start + BULK_CHUNK_SIZE]
+        frappe.enqueue(
+            "posawesome.posawesome.api.sales_invoice.process_invoice_queue_batch",
+            queue="short",
+            job_id=f"posa_invoice_queue_batch::{chunk[0]}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+            queue_names=chunk
+        )
+
+    return {
+        "queued": True,
+        "invoices": [
+            {"index": index, "status": "Queued", "sales_invoice": None, "queue_name": queue_name, "error": None}
+            for index, queue_name in enumerate(queue_names)
+        ]
+    }
+
+
+def _submit_invoices_inline(invoices):
+    """Submit each invoice under its own savepoint in the current transaction"""
+    manifest = []
+    for index, invoice_doc in enumerate(invoices):
+        doc, error = _submit_with_savepoint(invoice_doc, f"posa_bulk_{index}")
+        manifest.append({
+            "index": index,
+            "status": "Submitted" if doc else "Failed",
+            "sales_invoice": doc.name if doc else None,
+            "queue_name": None,
+            "error": error
+        })
+    return manifest
+
+
+def _submit_with_savepoint(invoice_doc, save_point):
+    """
+    Returns:
+        tuple: (submitted doc or None, error message or None)
+    """
+    key = invoice_doc.get("posa_idempotency_key")
+
+    with _idempotency_lock(key):
+        frappe.db.savepoint(save_point)
+        try:
+            doc = _submit_invoice_doc(invoice_doc)
+            frappe.db.release_savepoint(save_point)
+            return doc, None
+
+        except Exception as e:
+            frappe.db.rollback(save_point=save_point)
+            values = _resolve_failed_submit(key, e, "submit_invoices_bulk")
+            if values["status"] == "Submitted":
+                return frappe.get_doc("Sales Invoice", values["sales_invoice"]), None
+            return None, values["error"]
+
+
+def process_invoice_queue_batch(queue_names):
+    """
+    RQ job - submit a chunk of queued invoices.
+    Each entry is claimed, submitted and committed on its own (as in
+    process_invoice_queue): only Queued entries are claimed, so an entry
+    the sweep already handed to a per-entry job while this chunk waited is
+    skipped, and a crash loses at most the entry in flight.
+    """
+    for queue_name in queue_names:
+        process_invoice_queue(queue_name)
+
+
+# ===== BENCHMARK =====
+
+def benchmark_submit_pipeline(invoice_doc, runs=10):
+    """
+    CPU time per invoice of the single-pass vs the legacy pipeline.
+    Every run is rolled back. Run on a test site:
+
+        bench --site <site> execute posawesome.posawesome.api.sales_invoice.benchmark_submit_pipeline \\
+            --kwargs "{'invoice_doc': <invoice json>, 'runs': 20}"
+
+    Returns:
+        dict: {"single_pass_ms", "legacy_ms", "saved_ms", "saved_percent"} (CPU ms per invoice)
+    """
+    if isinstance(invoice_doc, str):
+        invoice_doc = json.loads(invoice_doc)
+
+    invoice_doc = dict(invoice_doc)
+    invoice_doc.pop("posa_idempotency_key", None)
+    runs = max(cint(runs), 1)
+
+    results = {}
+    for label, single_pass in (("single_pass_ms", True), ("legacy_ms", False)):
+        elapsed = 0
+        for index in range(runs):
+            frappe.db.savepoint("posa_benchmark")
+            started = time.process_time()
+            _submit_invoice_doc(json.loads(json.dumps(invoice_doc)), single_pass=single_pass)
+            elapsed += time.process_time() - started
+            frappe.db.rollback(save_point="posa_benchmark")
+        results[label] = round(elapsed * 1000 / runs, 3)
+
+    frappe.db.rollback()
+
+    results["saved_ms"] = round(results["legacy_ms"] - results["single_pass_ms"], 3)
+    results["saved_percent"] = round(results["saved_ms"] * 100 / results["legacy_ms"], 1) if results["legacy_ms"] else 0
+    return results
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2021, Youssef Restom and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import unittest
+
+from posawesome.posawesome.api.item import (
+	GS1_SEPARATOR,
+	LOOKUP_BARCODE,
+	_apply_gs1,
+	_extract_gs1,
+	_is_gs1_shape,
+	_parse_gs1_elements,
+)
+
+# GTIN-14 with a valid check digit
+GTIN = "06291041500213"
+
+
+class TestGS1Barcodes(unittest.TestCase):
+	def test_human_readable_form(self):
+		self.assertEqual(
+			_parse_gs1_elements("(01)" + GTIN + "(3103)001250(10)LOT7"),
+			{"01": GTIN, "3103": "001250", "10": "LOT7"},
+		)
+
+	def test_symbology_identifier(self):
+		self.assertEqual(
+			_parse_gs1_elements("]C101" + GTIN + "3103001250"),
+			{"01": GTIN, "3103": "001250"},
+		)
+
+	def test_fnc1_separated(self):
+		barcode = "01" + GTIN + "10LOT7" + GS1_SEPARATOR + "3922000450"
+		self.assertEqual(_parse_gs1_elements(barcode), {"01": GTIN, "10": "LOT7", "3922": "000450"})
+		self.assertTrue(_is_gs1_shape(barcode))
+
+	def test_bare_01(self):
+		self.assertTrue(_is_gs1_shape("01" + GTIN))
+		self.assertTrue(_is_gs1_shape("01" + GTIN + "3103001250"))
+		self.assertEqual(
+			_extract_gs1({"fallback": 1}, "01" + GTIN),
+			[(LOOKUP_BARCODE, GTIN), (LOOKUP_BARCODE, GTIN[1:])],
+		)
+
+	def test_bad_check_digit(self):
+		barcode = "01" + GTIN[:-1] + "4"
+		self.assertFalse(_is_gs1_shape(barcode))
+		self.assertEqual(_extract_gs1({"fallback": 1}, barcode), [])
+
+	def test_ean13_starting_with_01(self):
+		# An ordinary EAN-13 is not a bare GS1 element string
+		self.assertFalse(_is_gs1_shape("0123456789012"))
+		self.assertEqual(_extract_gs1({"fallback": 1}, "0123456789012"), [])
+
+	def test_weight_and_price(self):
+		item_data = {"rate": 4}
+		_apply_gs1({}, "(01)" + GTIN + "(3103)001250", item_data)
+		self.assertEqual(item_data["qty"], 1.25)
+
+		item_data = {"rate": 4}
+		_apply_gs1({}, "(01)" + GTIN + "(3922)1000", item_data)
+		self.assertEqual(item_data["qty"], 2.5)
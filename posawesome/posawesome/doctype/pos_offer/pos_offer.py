@@ -6,6 +6,8 @@ from __future__ import unicode_literals
 import frappe
 from frappe.model.document import Document
 from frappe.utils import nowdate, flt
+from posawesome.posawesome.api.offer_index import get_offer_index
+from posawesome.posawesome.api.offer_optimizer import is_optimizer_enabled, optimize_offers
 
 class POSOffer(Document):
     def validate(self):
@@ -120,6 +122,12 @@ def get_offers(invoice_data):
                 "updated_invoice": invoice_data
             }
 
+        # Optimizer mode: only the best non-conflicting combination is applied
+        optimizer = None
+        if is_optimizer_enabled(invoice_data.get("pos_profile")):
+            optimizer = optimize_offers(applicable_offers, invoice_data)
+            applicable_offers = optimizer.pop("offers")
+
         # Apply offers to invoice
         updated_invoice = invoice_data.copy()
         applied_offers = []
@@ -141,7 +149,8 @@ def get_offers(invoice_data):
             "enabled": True,
             "applied_offers": applied_offers,
             "message": f"Applied {len(applied_offers)} offers",
-            "updated_invoice": updated_invoice
+            "updated_invoice": updated_invoice,
+            "optimizer": optimizer
         }
 
     except Exception as e:
@@ -227,50 +236,21 @@ def check_offers_enabled_by_profile(profile):
         return False
 
     try:
-        pos_profile_doc = frappe.get_doc("POS Profile", profile)
-        return pos_profile_doc.get("posa_auto_fetch_offers")
+        return frappe.get_cached_value("POS Profile", profile, "posa_auto_fetch_offers")
     except:
         return False
 
 
 def get_applicable_offers_for_invoice_data(invoice_data):
-    """Helper: Get applicable offers for invoice data"""
+    """Helper: Get applicable offers for invoice data (compiled offer index, no SQL when cached)"""
     try:
-        # Extract required data from invoice
-        company = invoice_data.get("company")
-        pos_profile = invoice_data.get("pos_profile")
-        warehouse = invoice_data.get("set_warehouse")
-        posting_date = invoice_data.get("posting_date") or nowdate()
-
-        # Calculate total quantity
-        total_qty = sum(flt(item.get("qty", 0)) for item in invoice_data.get("items", []))
-        total_amount = sum(flt(item.get("qty", 0)) * flt(item.get("rate", 0))
-                          for item in invoice_data.get("items", []))
-        # Get applicable offers
-        offers = frappe.get_all(
-            "POS Offer",
-            filters={
-                "disable": 0,
-                "company": company,
-                "pos_profile": ["in", [pos_profile, ""]],
-                "warehouse": ["in", [warehouse, ""]],
-                "valid_from": ["<=", posting_date],
-                "valid_upto": [">=", posting_date],
-                "min_qty": ["<=", total_qty],
-                "max_qty": [">=", total_qty],
-                "min_amt": ["<=", total_amount],
-                "max_amt": [">=", total_amount]
-            },
-            order_by="auto desc, discount_percentage desc, title asc"
+        index = get_offer_index(
+            invoice_data.get("company"),
+            invoice_data.get("pos_profile"),
+            invoice_data.get("set_warehouse"),
+            invoice_data.get("posting_date") or nowdate()
         )
-
-        # Check applicable offers
-        applicable = []
-        for offer in offers:
-            if check_offer_applicable_for_data(offer, invoice_data, total_qty):
-                applicable.append(offer)
-
-        return applicable
+        return index.match(invoice_data)
 
     except Exception as e:
         frappe.log_error(f"Error in get_applicable_offers_for_invoice_data: {str(e)}", "POS Offers Error")
@@ -3,8 +3,301 @@
 # See license.txt
 from __future__ import unicode_literals
 
-# import frappe
 import unittest
+from unittest.mock import patch
+
+import frappe
+
+from posawesome.posawesome.api import offer_session
+from posawesome.posawesome.api.offer_index import verify_invoice_offers
+from posawesome.posawesome.api.offer_benchmark import (
+	BENCHMARK_COMPANY,
+	BENCHMARK_DATE,
+	BENCHMARK_PROFILE,
+	BENCHMARK_WAREHOUSE,
+	OfferStore,
+	run_offer_benchmark,
+)
+from posawesome.posawesome.api.offer_optimizer import find_offer_conflicts, optimize_offers
+from posawesome.posawesome.doctype.pos_offer.pos_offer import (
+	apply_offer_by_type,
+	get_applicable_offers_for_invoice_data,
+)
+
+
+def make_offer(name, **values):
+	offer = {
+		"name": name,
+		"title": name,
+		"company": BENCHMARK_COMPANY,
+		"pos_profile": "",
+		"warehouse": "",
+		"disable": 0,
+		"auto": 1,
+		"offer_type": "grand_total",
+		"discount_type": "Discount Percentage",
+		"discount_percentage": 10,
+		"min_qty": 0,
+		"max_qty": 0,
+		"min_amt": 0,
+		"max_amt": 0,
+		"valid_from": "2025-01-01",
+		"valid_upto": "2025-12-31",
+	}
+	offer.update(values)
+	return offer
+
+
+def make_invoice(items, customer="Walk-in"):
+	return {
+		"company": BENCHMARK_COMPANY,
+		"pos_profile": BENCHMARK_PROFILE,
+		"set_warehouse": BENCHMARK_WAREHOUSE,
+		"posting_date": BENCHMARK_DATE,
+		"customer": customer,
+		"items": items,
+		"posa_offers": [],
+	}
+
+
+def item(item_code, qty=1, rate=10, item_group="Group A", brand="Brand A"):
+	return {"item_code": item_code, "item_group": item_group, "brand": brand, "qty": qty, "rate": rate}
+
+
+class Invoice(frappe._dict):
+	"""Sales Invoice stand-in for verify_invoice_offers"""
+
+	@property
+	def items(self):
+		return self["items"]
+
+
+class InvoiceLine(frappe._dict):
+	def precision(self, fieldname):
+		return 2
+
 
 class TestPOSOffer(unittest.TestCase):
-	pass
+	def applicable(self, offers, invoice_data, customer_groups=None):
+		with OfferStore(offers, customer_groups).patched():
+			return [offer.name for offer in get_applicable_offers_for_invoice_data(invoice_data)]
+
+	def test_trigger_keys(self):
+		offers = [
+			make_offer("item", offer_type="item_code", item_code="ITEM-1"),
+			make_offer("group", offer_type="item_group", item_group="Group B"),
+			make_offer("brand", offer_type="brand", brand="Brand A"),
+			make_offer("customer", offer_type="customer", customer="Jane"),
+			make_offer("customer_group", offer_type="customer_group", customer_group="VIP"),
+		]
+		invoice = make_invoice([item("ITEM-1")], customer="Jane")
+
+		self.assertEqual(
+			sorted(self.applicable(offers, invoice, {"Jane": "VIP"})),
+			["brand", "customer", "customer_group", "item"],
+		)
+		self.assertEqual(self.applicable(offers, make_invoice([item("ITEM-2")])), ["brand"])
+
+	def test_thresholds(self):
+		offers = [
+			make_offer("min_qty", min_qty=3),
+			make_offer("max_qty", max_qty=2),
+			make_offer("min_amt", min_amt=50),
+			make_offer("max_amt", max_amt=20),
+			make_offer("unbounded"),
+		]
+
+		self.assertEqual(
+			sorted(self.applicable(offers, make_invoice([item("ITEM-1", qty=2, rate=10)]))),
+			["max_amt", "max_qty", "unbounded"],
+		)
+		self.assertEqual(
+			sorted(self.applicable(offers, make_invoice([item("ITEM-1", qty=5, rate=10)]))),
+			["min_amt", "min_qty", "unbounded"],
+		)
+
+	def test_profile_warehouse_and_validity(self):
+		offers = [
+			make_offer("this_profile", pos_profile=BENCHMARK_PROFILE),
+			make_offer("other_profile", pos_profile="Other Profile"),
+			make_offer("other_warehouse", warehouse="Other Warehouse"),
+			make_offer("expired", valid_upto="2025-01-31"),
+			make_offer("undated", valid_from=None, valid_upto=None),
+			make_offer("disabled", disable=1),
+			make_offer("other_company", company="Other Company"),
+		]
+
+		self.assertEqual(self.applicable(offers, make_invoice([item("ITEM-1")])), ["this_profile"])
+
+	def test_application_order(self):
+		offers = [
+			make_offer("b_manual", auto=0, discount_percentage=50),
+			make_offer("b_small", discount_percentage=5),
+			make_offer("a_small", discount_percentage=5),
+			make_offer("big", discount_percentage=20),
+		]
+
+		self.assertEqual(
+			self.applicable(offers, make_invoice([item("ITEM-1")])),
+			["big", "a_small", "b_small", "b_manual"],
+		)
+
+	def test_apply_offer_by_type(self):
+		invoice = make_invoice([item("ITEM-1"), item("ITEM-2")])
+
+		item_offer = make_offer("item", offer_type="item_code", item_code="ITEM-2", discount_percentage=15)
+		self.assertTrue(apply_offer_by_type(item_offer, invoice))
+		self.assertEqual(invoice["items"][1]["discount_percentage"], 15)
+		self.assertNotIn("discount_percentage", invoice["items"][0])
+
+		total_offer = make_offer("total", discount_percentage=5)
+		self.assertTrue(apply_offer_by_type(total_offer, invoice))
+		self.assertEqual(invoice["additional_discount_percentage"], 5)
+
+		# Each offer is recorded once
+		self.assertFalse(apply_offer_by_type(total_offer, invoice))
+		self.assertEqual([row["offer_name"] for row in invoice["posa_offers"]], ["item", "total"])
+
+	def test_optimizer_beats_priority_order(self):
+		offers = [
+			make_offer("group", offer_type="item_group", item_group="Group A", discount_percentage=15),
+			make_offer("item_1", offer_type="item_code", item_code="ITEM-1", discount_percentage=20),
+			make_offer("item_2", offer_type="item_code", item_code="ITEM-2", discount_percentage=20),
+			make_offer("total_small", discount_percentage=5),
+			make_offer("total_big", offer_type="customer", customer="Jane", discount_percentage=10),
+		]
+		invoice = make_invoice([item("ITEM-1", rate=100), item("ITEM-2", rate=100)], customer="Jane")
+
+		result = optimize_offers(offers, invoice, time_budget_ms=100, node_budget=1000)
+		self.assertEqual([offer["name"] for offer in result["offers"]], ["item_1", "item_2", "total_big"])
+		# 2 x 20 on the lines, then 10% of the remaining 160
+		self.assertAlmostEqual(result["discount"], 56)
+		self.assertEqual(result["complete"], 1)
+
+		# An exhausted budget falls back to the greedy pick
+		result = optimize_offers(offers, invoice, time_budget_ms=100, node_budget=1)
+		self.assertEqual([offer["name"] for offer in result["offers"]], ["group", "total_big"])
+		self.assertEqual(result["complete"], 0)
+
+	def test_offer_conflicts(self):
+		items = [item("ITEM-1"), item("ITEM-2", item_group="Group B")]
+		group = make_offer("group", offer_type="item_group", item_group="Group A")
+		item_1 = make_offer("item_1", offer_type="item_code", item_code="ITEM-1")
+		item_2 = make_offer("item_2", offer_type="item_code", item_code="ITEM-2")
+		total = make_offer("total")
+		customer = make_offer("customer", offer_type="customer", customer="Jane")
+
+		self.assertEqual(find_offer_conflicts([group, item_2, total], items), [])
+		self.assertEqual(find_offer_conflicts([group, item_1], items), [("group", "item_1")])
+		self.assertEqual(find_offer_conflicts([total, customer], items), [("total", "customer")])
+
+		# What the optimizer picks never conflicts
+		result = optimize_offers([group, item_1, item_2, total, customer], make_invoice(items))
+		self.assertEqual(find_offer_conflicts(result["offers"], items), [])
+
+	def test_verify_offer_discounts(self):
+		offers = [
+			make_offer("item", offer_type="item_code", item_code="ITEM-1"),
+			make_offer("total", discount_percentage=5),
+		]
+
+		def verify(line_discount=10, rate=9, additional_discount=5, flagged=("ITEM-1",)):
+			lines = [
+				InvoiceLine(item(item_code, rate=rate if item_code == "ITEM-1" else 10), idx=idx,
+					price_list_rate=10, discount_percentage=line_discount if item_code == "ITEM-1" else 0,
+					posa_offer_applied=int(item_code in flagged))
+				for idx, item_code in enumerate(("ITEM-1", "ITEM-2"), 1)
+			]
+			doc = Invoice(make_invoice(lines), additional_discount_percentage=additional_discount)
+			doc.posa_offers = [
+				frappe._dict(offer_name=offer["name"], discount_percentage=offer["discount_percentage"])
+				for offer in offers
+			]
+			with OfferStore(offers).patched():
+				verify_invoice_offers(doc)
+
+		verify()
+		for overrides in (
+			{"line_discount": 15},
+			{"rate": 8},
+			{"additional_discount": 8},
+			{"flagged": ("ITEM-1", "ITEM-2")},
+		):
+			with self.subTest(**overrides), self.assertRaises(frappe.ValidationError):
+				verify(**overrides)
+
+	def test_session_deltas(self):
+		offers = [
+			make_offer("general_min_amt", min_amt=50),
+			make_offer("item", offer_type="item_code", item_code="ITEM-2"),
+			make_offer("group_min_qty", offer_type="item_group", item_group="Group B", min_qty=3),
+			make_offer("brand_max_amt", offer_type="brand", brand="Brand A", max_amt=40),
+			make_offer("customer", offer_type="customer", customer="Jane"),
+			make_offer("customer_group", offer_type="customer_group", customer_group="VIP"),
+		]
+		invoice = make_invoice([dict(item("ITEM-1", qty=2), posa_row_id="a")])
+
+		with OfferStore(offers, {"Jane": "VIP"}).patched(), \
+				patch.object(offer_session, "check_offers_enabled_by_profile", lambda pos_profile: True):
+			session = offer_session.new_session(invoice)
+
+			def apply(*changes):
+				offer_session.apply_changes(session, list(changes))
+				names = [offer.name for offer in offer_session.match_session(session)]
+				# The updated match set equals a match from scratch
+				fresh = offer_session.new_session(dict(
+					invoice,
+					customer=session["header"]["customer"],
+					items=[dict(line, posa_row_id=row_id) for row_id, line in session["lines"].items()],
+				))
+				self.assertEqual(names, [offer.name for offer in offer_session.match_session(fresh)])
+				return sorted(names)
+
+			self.assertEqual(apply(), ["brand_max_amt"])
+			self.assertEqual(
+				apply({"action": "set", "row_id": "b", **item("ITEM-2", qty=1, item_group="Group B", brand="")}),
+				["brand_max_amt", "group_min_qty", "item"],
+			)
+			self.assertEqual(apply({"action": "set", "row_id": "a", "qty": 5}), ["general_min_amt", "group_min_qty", "item"])
+			self.assertEqual(apply({"action": "customer", "customer": "Jane"}), [
+				"customer", "customer_group", "general_min_amt", "group_min_qty", "item",
+			])
+			self.assertEqual(apply({"action": "remove", "row_id": "b"}), [
+				"customer", "customer_group", "general_min_amt",
+			])
+			self.assertEqual(
+				apply({"action": "set", "row_id": "a", "qty": 1}, {"action": "customer", "customer": "John"}),
+				["brand_max_amt"],
+			)
+
+	def test_session_resync(self):
+		store = {}
+		cache = type("Cache", (), {
+			"get_value": lambda self, key: store.get(key),
+			"set_value": lambda self, key, value, expires_in_sec=None: store.__setitem__(key, value),
+		})()
+		offers = [make_offer("item", offer_type="item_code", item_code="ITEM-1")]
+		invoice = make_invoice([dict(item("ITEM-1"), posa_row_id="a")])
+		remove = [{"action": "remove", "row_id": "a"}]
+
+		with OfferStore(offers).patched(), patch.object(frappe, "cache", lambda: cache), \
+				patch.object(offer_session, "check_offers_enabled_by_profile", lambda pos_profile: True):
+			# Unknown session, then a missed delta
+			self.assertEqual(offer_session.apply_cart_delta("cart", 1, changes=remove), {"resync": 1})
+			self.assertEqual(offer_session.apply_cart_delta("cart", 0, invoice_data=invoice)["added"], ["item"])
+			self.assertEqual(offer_session.apply_cart_delta("cart", 2, changes=remove), {"resync": 1})
+
+			result = offer_session.apply_cart_delta("cart", 1, changes=remove)
+			self.assertEqual((result["seq"], result["removed"], result["offers"]), (1, ["item"], []))
+
+			# Resending the full invoice resets the session
+			result = offer_session.apply_cart_delta("cart", 0, invoice_data=invoice)
+			self.assertEqual((result["seq"], result["added"]), (0, ["item"]))
+
+	def test_benchmark_harness(self):
+		results = run_offer_benchmark(offer_counts=(10, 100), cart_sizes=(1, 20), runs=3)
+
+		self.assertEqual(len(results), 2 * (1 + 2 * 3))
+		for result in results:
+			self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+			self.assertGreaterEqual(result["peak_kib"], 0)
@@ -12,7 +12,11 @@ const API_MAP = {
     UPDATE: "posawesome.posawesome.api.sales_invoice.update_invoice",
     SUBMIT: "posawesome.posawesome.api.sales_invoice.submit_invoice",
     DELETE: "posawesome.posawesome.api.sales_invoice.delete_invoice",
-    GET_INVOICES_FOR_RETURN: "posawesome.posawesome.api.sales_invoice.get_invoices_for_return"
+    GET_INVOICES_FOR_RETURN: "posawesome.posawesome.api.sales_invoice.get_invoices_for_return",
+    GET_RETURN_INVOICE_ITEMS: "posawesome.posawesome.api.sales_invoice.get_return_invoice_items",
+    CREATE_AND_SUBMIT: "posawesome.posawesome.api.sales_invoice.create_and_submit_invoice",
+    GET_INVOICE_QUEUE_STATUS: "posawesome.posawesome.api.sales_invoice.get_invoice_queue_status",
+    SUBMIT_INVOICES_BULK: "posawesome.posawesome.api.sales_invoice.submit_invoices_bulk"
   },
 
   // Customer APIs (from Customer.vue, UpdateCustomer.vue, Payments.vue, NewAddress.vue)
@@ -35,8 +39,16 @@ const API_MAP = {
   // Item APIs (from ItemsSelector.vue, Invoice.vue)
   ITEM: {
     GET_ITEMS: "posawesome.posawesome.api.item.get_items",
+    GET_ITEMS_PAGE: "posawesome.posawesome.api.item.get_items_page",
+    EXPORT_ITEMS_NDJSON: "posawesome.posawesome.api.item.export_items_ndjson",
     GET_ITEMS_GROUPS: "posawesome.posawesome.api.item.get_items_groups",
+    GET_ITEM_PRICES: "posawesome.posawesome.api.item.get_item_prices",
+    GET_CUSTOMER_ITEM_PRICES: "posawesome.posawesome.api.item.get_customer_item_prices",  // Customer-specific rates for the local catalog
+    GET_ITEM_CATALOG: "posawesome.posawesome.api.item.get_item_catalog",
+    EXPORT_ITEM_CATALOG: "posawesome.posawesome.api.item.export_item_catalog",
+    GET_ITEM_CATALOG_DELTA: "posawesome.posawesome.api.item.get_item_catalog_delta",
     GET_BARCODE_ITEM: "posawesome.posawesome.api.item.get_barcode_item",  // Central unified barcode handler
+    GET_BARCODE_ITEMS: "posawesome.posawesome.api.item.get_barcode_items",  // Batch of barcodes, results in input order
     PROCESS_BATCH_SELECTION: "posawesome.posawesome.api.item.process_batch_selection"
   },
 
@@ -44,7 +56,9 @@ const API_MAP = {
   POS_OFFER: {
     GET_APPLICABLE_OFFERS: "posawesome.posawesome.doctype.pos_offer.pos_offer.get_applicable_offers",
     GET_OFFERS_FOR_PROFILE: "posawesome.posawesome.doctype.pos_offer.pos_offer.get_offers_for_profile",
-    APPLY_OFFERS_TO_INVOICE: "posawesome.posawesome.doctype.pos_offer.pos_offer.get_offers"
+    APPLY_OFFERS_TO_INVOICE: "posawesome.posawesome.doctype.pos_offer.pos_offer.get_offers",
+    APPLY_CART_DELTA: "posawesome.posawesome.api.offer_session.apply_cart_delta",  // Incremental offers per cart session
+    GET_OFFER_BUNDLE: "posawesome.posawesome.api.offer_index.get_offer_bundle"  // Versioned rules for offer_engine.js
   },
 
   // POS Opening Shift APIs (from OpeningDialog.vue, Pos.vue, Navbar.vue)
@@ -0,0 +1,576 @@
+// ===== IMPORTS =====
+import { markRaw } from "vue";
+import { evntBus } from "./bus";
+import { API_MAP } from "./api_mapper.js";
+import { syncCatalog } from "./catalog_store.js";
+
+/**
+ * POS Awesome Catalog Search
+ *
+ * Browsing and searching the local catalog (catalog_store.js) for the
+ * items selector: item group filters, customer prices and stock pushes.
+ *
+ * Customer / customer group prices are not part of the shared catalog.
+ * They are fetched once per customer and price list, kept on the catalog
+ * and applied to every result, so a search never needs the server.
+ *
+ * The default export is the items selector's list mixin: loading, paging
+ * and searching items from the catalog, or from the server while the
+ * catalog cannot answer. The host provides pos_profile, customer,
+ * customer_price_list, item_group, items_group, search / first_search,
+ * loading / search_loading and scheduleScrollHeightUpdate.
+ */
+
+const LIST_CONFIG = {
+  MAX_DISPLAYED_ITEMS: 50,
+  PAGE_SIZE: 50,
+  LOAD_MORE_THRESHOLD: 80,
+  CATALOG_SYNC_INTERVAL: 5 * 60 * 1000,
+};
+
+// Realtime stock push (item_cache.STOCK_UPDATE_EVENT)
+const STOCK_UPDATE_EVENT = "posa_stock_update";
+
+// Rank order of local search results (same as the server's ranked search)
+const RANK = {
+  EXACT_CODE: 0,
+  CODE_PREFIX: 1,
+  NAME_PREFIX: 2,
+  SUBSTRING: 3,
+};
+
+function pricesKey(customer, price_list) {
+  return `${customer || ""}::${price_list}`;
+}
+
+// ===== CATALOG =====
+/**
+ * Sync the catalog of a price list. Customer prices of `previous` are kept
+ * (and refreshed by the next loadCustomerPrices) when the price list is
+ * the same.
+ *
+ * @returns {Promise<{key, version, rows, index, price_list, prices, prices_key}>}
+ */
+export function loadCatalog(pos_profile, price_list, previous) {
+  return syncCatalog(pos_profile, price_list).then((record) => {
+    const same = previous && previous.price_list === price_list;
+    return markRaw({
+      ...record,
+      price_list,
+      index: new Map(record.rows.map((row) => [row.item_code, row])),
+      prices: same ? previous.prices : new Map(),
+      prices_key: same ? previous.prices_key : null,
+      prices_loading: null,
+    });
+  });
+}
+
+/**
+ * Load the customer's rates into the catalog (GET_CUSTOMER_ITEM_PRICES).
+ * No-op when they are loaded or loading already, unless `force`.
+ *
+ * @returns {Promise<boolean>} whether the catalog prices changed
+ */
+export function loadCustomerPrices(catalog, pos_profile, customer, force = false) {
+  const key = pricesKey(customer, catalog.price_list);
+  if (!force && (catalog.prices_key === key || catalog.prices_loading === key)) {
+    return Promise.resolve(false);
+  }
+
+  if (!customer) {
+    catalog.prices = new Map();
+    catalog.prices_key = key;
+    return Promise.resolve(true);
+  }
+
+  catalog.prices_loading = key;
+  return new Promise((resolve) => {
+    frappe.call({
+      method: API_MAP.ITEM.GET_CUSTOMER_ITEM_PRICES,
+      args: { pos_profile, customer, price_list: catalog.price_list },
+      callback: (r) => {
+        // A newer customer's request owns the catalog now
+        if (catalog.prices_loading !== key) {
+          resolve(false);
+          return;
+        }
+        catalog.prices = new Map(Object.entries(r.message || {}));
+        catalog.prices_key = key;
+        catalog.prices_loading = null;
+        resolve(true);
+      },
+      error: () => {
+        if (catalog.prices_loading === key) {
+          catalog.prices_loading = null;
+        }
+        resolve(false);
+      },
+    });
+  });
+}
+
+// ===== ITEM GROUPS =====
+/**
+ * Lowercase name -> {name, lft, rgt} of GET_ITEMS_GROUPS rows.
+ */
+export function buildGroupTree(groups) {
+  const tree = {};
+  groups.forEach((group) => {
+    tree[group.name.toLowerCase()] = { name: group.name, lft: group.lft, rgt: group.rgt };
+  });
+  return tree;
+}
+
+/**
+ * The group and all its descendants (nested set), null if unknown.
+ */
+export function getGroupSet(tree, item_group) {
+  const node = tree && tree[item_group.toLowerCase()];
+  if (!node) {
+    return null;
+  }
+
+  const groups = new Set();
+  Object.values(tree).forEach((group) => {
+    if (group.lft >= node.lft && group.rgt <= node.rgt) {
+      groups.add(group.name);
+    }
+  });
+  return groups;
+}
+
+// ===== SEARCH =====
+/**
+ * Rows matching a search term and group set, ranked like the server.
+ *
+ * @param {Array} rows - catalog rows sorted by item_name
+ * @param {string} search - search term ("" for browsing)
+ * @param {Set|null} groups - allowed item groups, null for all
+ * @param {number} limit - max rows returned
+ */
+export function searchCatalog(rows, search, groups, limit) {
+  const term = (search || "").trim().toLowerCase();
+  const buckets = [[], [], [], []];
+  let found = 0;
+
+  for (let i = 0; i < rows.length; i++) {
+    const row = rows[i];
+    if (groups && !groups.has(row.item_group)) {
+      continue;
+    }
+
+    if (!term) {
+      buckets[RANK.SUBSTRING].push(row);
+      if (++found >= limit) break;
+      continue;
+    }
+
+    const code = row.item_code.toLowerCase();
+    const name = (row.item_name || "").toLowerCase();
+    let rank = null;
+    if (code === term) rank = RANK.EXACT_CODE;
+    else if (code.startsWith(term)) rank = RANK.CODE_PREFIX;
+    else if (name.startsWith(term)) rank = RANK.NAME_PREFIX;
+    else if (code.includes(term) || name.includes(term)) rank = RANK.SUBSTRING;
+
+    if (rank !== null) {
+      buckets[rank].push(row);
+    }
+  }
+
+  return [].concat(...buckets).slice(0, limit);
+}
+
+/**
+ * Item rows for a search, or null when the local catalog cannot answer
+ * (unknown item group, customer prices not loaded yet).
+ *
+ * @param {Object} options - {item_group, group_tree, customer, limit}
+ */
+export function findCatalogItems(catalog, search, options) {
+  if (catalog.prices_key !== pricesKey(options.customer, catalog.price_list)) {
+    return null;
+  }
+
+  let groups = null;
+  if (options.item_group !== "ALL") {
+    groups = getGroupSet(options.group_tree, options.item_group);
+    if (!groups) {
+      return null;
+    }
+  }
+
+  return toItemRows(searchCatalog(catalog.rows, search, groups, options.limit), catalog);
+}
+
+// ===== ITEM ROWS =====
+/**
+ * Selector rows; catalog rows get the customer's rate when it has one.
+ */
+export function toItemRows(rows, catalog = null) {
+  return rows.map((row) => {
+    const customer_rate = catalog && catalog.prices.get(row.item_code);
+    const price_list_rate = customer_rate ?? row.price_list_rate ?? row.rate;
+    return {
+      ...row,
+      price_list_rate,
+      rate: catalog ? price_list_rate : row.rate,
+      base_rate: catalog ? price_list_rate : row.base_rate || row.rate,
+      // Empty arrays for compatibility with barcode/batch/serial features
+      item_barcode: Array.isArray(row.item_barcode) ? row.item_barcode : [],
+      serial_no_data: Array.isArray(row.serial_no_data) ? row.serial_no_data : [],
+      batch_no_data: Array.isArray(row.batch_no_data) ? row.batch_no_data : [],
+    };
+  });
+}
+
+// ===== SERVER =====
+/**
+ * Server search (GET_ITEMS), for when the local catalog cannot answer.
+ *
+ * @returns {Promise<Array>} selector rows
+ */
+export function fetchItems(args) {
+  return new Promise((resolve, reject) => {
+    frappe.call({
+      method: API_MAP.ITEM.GET_ITEMS,
+      args,
+      callback: (r) => resolve(toItemRows(r.message || [])),
+      error: reject,
+    });
+  });
+}
+
+/**
+ * Next browse page after a keyset cursor (GET_ITEMS_PAGE).
+ *
+ * @returns {Promise<{items, next_cursor}>}
+ */
+export function fetchItemsPage(args) {
+  return new Promise((resolve, reject) => {
+    frappe.call({
+      method: API_MAP.ITEM.GET_ITEMS_PAGE,
+      args,
+      callback: (r) => {
+        const page = r.message || {};
+        resolve({ items: toItemRows(page.items || []), next_cursor: page.next_cursor || null });
+      },
+      error: reject,
+    });
+  });
+}
+
+// ===== STOCK =====
+/**
+ * Apply a compact stock push {item_code: actual_qty} to the displayed items
+ * (lowercase item_code map) and the catalog rows.
+ */
+export function applyStockUpdate(qty, itemsMap, catalog) {
+  Object.entries(qty).forEach(([item_code, actual_qty]) => {
+    const item = itemsMap.get(item_code.toLowerCase());
+    if (item) {
+      item.actual_qty = actual_qty;
+    }
+
+    const row = catalog && catalog.index.get(item_code);
+    if (row) {
+      row.actual_qty = actual_qty;
+    }
+  });
+}
+
+// ===== LIST MIXIN =====
+export default {
+  data() {
+    return {
+      items: [],
+
+      // Pagination
+      next_cursor: null,
+      loading_more: false,
+      display_limit: LIST_CONFIG.MAX_DISPLAYED_ITEMS,
+
+      // Caching & Performance
+      _itemsMap: new Map(),
+      _stockWarehouse: null,
+
+      // Local catalog (IndexedDB) - see loadCatalog
+      catalog: null,
+      catalog_loading: false,
+      item_group_tree: null,
+      _catalogTimer: null,
+    };
+  },
+
+  methods: {
+    get_items() {
+      if (!this.pos_profile) {
+        evntBus.emit("show_mesage", {
+          text: "POS Profile not specified",
+          color: "error",
+        });
+        return;
+      }
+
+      const search = this.get_search(this.first_search);
+
+      const local = this.search_catalog(search, LIST_CONFIG.MAX_DISPLAYED_ITEMS);
+      if (local) {
+        this.set_items(local, Math.max(LIST_CONFIG.MAX_DISPLAYED_ITEMS, local.length));
+        return;
+      }
+
+      this.loading = true;
+      fetchItems(this.item_query(search))
+        .then((items) => {
+          // Keyset cursor for scrolling past the first page (browse only)
+          const last = items[items.length - 1];
+          const cursor =
+            !search && items.length >= LIST_CONFIG.MAX_DISPLAYED_ITEMS
+              ? { item_name: last.item_name, item_code: last.item_code }
+              : null;
+          this.set_items(items, LIST_CONFIG.MAX_DISPLAYED_ITEMS, cursor);
+        })
+        .catch(() => {
+          this.loading = false;
+        });
+    },
+
+    item_query(search) {
+      return {
+        pos_profile: this.pos_profile,
+        price_list: this.customer_price_list,
+        item_group: this.item_group !== "ALL" ? this.item_group.toLowerCase() : "",
+        search_value: search,
+        customer: this.customer,
+      };
+    },
+
+    set_items(items, display_limit, next_cursor = null) {
+      this.items = items;
+      this._buildItemsMap();
+      evntBus.emit("set_all_items", this.items);
+      this.loading = false;
+      this.search_loading = false;
+      this.display_limit = display_limit;
+      this.next_cursor = next_cursor;
+      this.scheduleScrollHeightUpdate();
+    },
+
+    onItemsScroll(event) {
+      const el = event.target;
+      if (el.scrollTop + el.clientHeight >= el.scrollHeight - LIST_CONFIG.LOAD_MORE_THRESHOLD) {
+        this.load_more_items();
+      }
+    },
+
+    load_more_items() {
+      if (this.loading_more) {
+        return;
+      }
+
+      const local = this.search_catalog(this.search, this.items.length + LIST_CONFIG.PAGE_SIZE);
+      if (local) {
+        if (local.length > this.items.length) {
+          this.set_items(local, local.length);
+        }
+        return;
+      }
+
+      if (!this.next_cursor || this.search) {
+        return;
+      }
+
+      this.loading_more = true;
+      fetchItemsPage({
+        pos_profile: this.pos_profile,
+        price_list: this.customer_price_list,
+        item_group: this.item_group !== "ALL" ? this.item_group.toLowerCase() : "",
+        cursor: this.next_cursor,
+        page_size: LIST_CONFIG.PAGE_SIZE,
+      })
+        .then((page) => {
+          this.items = this.items.concat(page.items);
+          this.display_limit += page.items.length;
+          this.next_cursor = page.next_cursor;
+          this._buildItemsMap();
+          evntBus.emit("set_all_items", this.items);
+        })
+        .finally(() => {
+          this.loading_more = false;
+        });
+    },
+
+    load_catalog() {
+      if (!this.pos_profile || this.catalog_loading || !window.indexedDB) {
+        return;
+      }
+
+      const previous = this.catalog;
+      this.catalog_loading = true;
+
+      loadCatalog(this.pos_profile, this.customer_price_list || this.pos_profile.selling_price_list, previous)
+        .then((catalog) => {
+          this.catalog = catalog;
+          this.catalog_loading = false;
+
+          // Customer rates are refetched only when the catalog moved on
+          const force = catalog.version !== previous?.version;
+          return loadCustomerPrices(catalog, this.pos_profile, this.customer, force).then(() => {
+            // Switch the list to the local catalog once it is available
+            if (!previous && !this.first_search) {
+              this.get_items();
+            }
+          });
+        })
+        .catch((error) => {
+          // The server endpoints keep working without the local catalog
+          this.catalog_loading = false;
+          console.error("ItemsSelector: catalog sync failed", error);
+        });
+    },
+
+    load_customer_prices() {
+      if (!this.catalog) {
+        return Promise.resolve(false);
+      }
+      return loadCustomerPrices(this.catalog, this.pos_profile, this.customer);
+    },
+
+    search_catalog(search, limit) {
+      // Rows from the local catalog, or null when it cannot answer
+      if (!this.catalog || !this.pos_profile) {
+        return null;
+      }
+
+      const price_list = this.customer_price_list || this.pos_profile.selling_price_list;
+      if (this.catalog.price_list !== price_list) {
+        this.load_catalog();
+        return null;
+      }
+
+      // No-op once the customer's rates are loaded
+      this.load_customer_prices();
+      return findCatalogItems(this.catalog, search, {
+        item_group: this.item_group,
+        group_tree: this.item_group_tree,
+        customer: this.customer,
+        limit,
+      });
+    },
+
+    _buildItemsMap() {
+      this._itemsMap.clear();
+
+      this.items.forEach((item) => {
+        // Add search by item_code
+        this._itemsMap.set(item.item_code.toLowerCase(), item);
+
+        // Add search by item_name
+        this._itemsMap.set(item.item_name.toLowerCase(), item);
+      });
+    },
+
+    get_items_groups() {
+      if (!this.pos_profile) {
+        return;
+      }
+
+      if (this.pos_profile.item_groups && this.pos_profile.item_groups.length > 0) {
+        this.pos_profile.item_groups.forEach((element) => {
+          if (element.item_group !== "ALL") {
+            this.items_group.push(element.item_group);
+          }
+        });
+      } else {
+        const vm = this;
+        frappe.call({
+          method: API_MAP.ITEM.GET_ITEMS_GROUPS,
+          args: { include_groups: 1 },
+          callback: function (r) {
+            if (r.message) {
+              // lft/rgt for filtering the local catalog by group
+              vm.item_group_tree = buildGroupTree(r.message);
+
+              // Parent groups are listed too; the root is covered by "ALL"
+              r.message.forEach((element) => {
+                if (element.parent_item_group) {
+                  vm.items_group.push(element.name);
+                }
+              });
+            }
+          },
+        });
+      }
+    },
+
+    performLiveSearch(searchValue) {
+      // Activate search progress bar
+      this.search_loading = true;
+
+      // If search is empty, reload all items
+      if (!searchValue || searchValue.trim() === "") {
+        this.get_items();
+        return;
+      }
+
+      const local = this.search_catalog(searchValue.trim(), LIST_CONFIG.MAX_DISPLAYED_ITEMS);
+      if (local) {
+        this.set_items(local, Math.max(LIST_CONFIG.MAX_DISPLAYED_ITEMS, local.length));
+        return;
+      }
+
+      // Perform live search using get_items
+      fetchItems(this.item_query(searchValue.trim()))
+        .then((items) => this.set_items(items, LIST_CONFIG.MAX_DISPLAYED_ITEMS))
+        .catch(() => {
+          // Stop search progress bar
+          this.search_loading = false;
+        });
+    },
+
+    subscribe_stock_updates() {
+      const warehouse = this.pos_profile && this.pos_profile.warehouse;
+      if (!warehouse || this._stockWarehouse === warehouse) {
+        return;
+      }
+
+      this.unsubscribe_stock_updates();
+      this._stockWarehouse = warehouse;
+      frappe.realtime.doc_subscribe("Warehouse", warehouse);
+      frappe.realtime.on(STOCK_UPDATE_EVENT, this.on_stock_update);
+    },
+
+    unsubscribe_stock_updates() {
+      if (!this._stockWarehouse) {
+        return;
+      }
+
+      frappe.realtime.off(STOCK_UPDATE_EVENT, this.on_stock_update);
+      frappe.realtime.doc_unsubscribe("Warehouse", this._stockWarehouse);
+      this._stockWarehouse = null;
+    },
+
+    on_stock_update(data) {
+      // Compact delta {warehouse, qty: {item_code: actual_qty}}
+      if (!data || data.warehouse !== this._stockWarehouse || !data.qty) {
+        return;
+      }
+
+      applyStockUpdate(data.qty, this._itemsMap, this.catalog);
+    },
+  },
+
+  mounted() {
+    // Pull catalog deltas (items, prices) periodically
+    this._catalogTimer = setInterval(() => this.load_catalog(), LIST_CONFIG.CATALOG_SYNC_INTERVAL);
+  },
+
+  beforeUnmount() {
+    // Stop realtime stock pushes
+    this.unsubscribe_stock_updates();
+
+    // Stop catalog sync
+    clearInterval(this._catalogTimer);
+  },
+};
@@ -0,0 +1,188 @@
+// ===== IMPORTS =====
+import { API_MAP } from "./api_mapper.js";
+
+/**
+ * POS Awesome Catalog Store
+ *
+ * Keeps the item catalog of a (price list, warehouse) in IndexedDB so a
+ * terminal cold-starts from one compressed columnar download, then only
+ * pulls deltas. Searching and browsing the rows: catalog_search.js.
+ */
+
+const DB_NAME = "posa_catalog";
+const DB_VERSION = 1;
+const STORE_NAME = "catalogs";
+
+let dbPromise = null;
+
+// ===== INDEXEDDB =====
+function openDb() {
+  if (!dbPromise) {
+    dbPromise = new Promise((resolve, reject) => {
+      if (!window.indexedDB) {
+        reject(new Error("IndexedDB not available"));
+        return;
+      }
+      const request = window.indexedDB.open(DB_NAME, DB_VERSION);
+      request.onupgradeneeded = () => {
+        request.result.createObjectStore(STORE_NAME, { keyPath: "key" });
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    }).catch((error) => {
+      dbPromise = null;
+      throw error;
+    });
+  }
+  return dbPromise;
+}
+
+function runStore(mode, action) {
+  return openDb().then(
+    (db) =>
+      new Promise((resolve, reject) => {
+        const tx = db.transaction(STORE_NAME, mode);
+        const request = action(tx.objectStore(STORE_NAME));
+        tx.oncomplete = () => resolve(request.result);
+        tx.onerror = () => reject(tx.error);
+      })
+  );
+}
+
+function readRecord(key) {
+  return runStore("readonly", (store) => store.get(key));
+}
+
+function writeRecord(record) {
+  return runStore("readwrite", (store) => store.put(record));
+}
+
+// ===== SERVER =====
+function fetchExport(pos_profile, price_list) {
+  const params = new URLSearchParams({
+    pos_profile: JSON.stringify(pos_profile),
+    price_list: price_list || "",
+  });
+
+  // Content-Encoding: gzip - the browser inflates the body
+  return fetch(`/api/method/${API_MAP.ITEM.EXPORT_ITEM_CATALOG}?${params}`, {
+    headers: {
+      Accept: "application/json",
+      "X-Frappe-CSRF-Token": frappe.csrf_token,
+    },
+  }).then((response) => {
+    if (!response.ok) {
+      throw new Error(`Catalog export failed: ${response.status}`);
+    }
+    return response.json();
+  });
+}
+
+function fetchDelta(pos_profile, price_list, since_version) {
+  return new Promise((resolve, reject) => {
+    frappe.call({
+      method: API_MAP.ITEM.GET_ITEM_CATALOG_DELTA,
+      args: { pos_profile, price_list, since_version },
+      callback: (r) => resolve(r.message),
+      error: reject,
+    });
+  });
+}
+
+// ===== ENCODING =====
+function decodeColumns(payload) {
+  const { count, strings, columns } = payload;
+  const rows = new Array(count);
+
+  for (let i = 0; i < count; i++) {
+    rows[i] = {
+      item_code: columns.item_code[i],
+      item_name: columns.item_name[i],
+      item_group: strings[columns.item_group[i]],
+      stock_uom: strings[columns.stock_uom[i]],
+      currency: strings[columns.currency[i]],
+      price_list_rate: columns.price_list_rate[i],
+      actual_qty: columns.actual_qty[i],
+    };
+  }
+  return rows;
+}
+
+function compactRow(row) {
+  return {
+    item_code: row.item_code,
+    item_name: row.item_name,
+    item_group: row.item_group,
+    stock_uom: row.stock_uom,
+    currency: row.currency,
+    price_list_rate: row.price_list_rate,
+    actual_qty: row.actual_qty,
+  };
+}
+
+function sortRows(rows) {
+  return rows.sort(
+    (a, b) =>
+      (a.item_name || "").localeCompare(b.item_name || "") ||
+      a.item_code.localeCompare(b.item_code)
+  );
+}
+
+function applyDelta(rows, delta) {
+  if (delta.reset) {
+    return sortRows(delta.items.map(compactRow));
+  }
+
+  const changed = new Set(delta.removed);
+  delta.items.forEach((row) => changed.add(row.item_code));
+
+  return sortRows(
+    rows
+      .filter((row) => !changed.has(row.item_code))
+      .concat(delta.items.map(compactRow))
+  );
+}
+
+// ===== PUBLIC API =====
+export function catalogKey(price_list, warehouse) {
+  return `${frappe.boot?.sitename || ""}::${price_list}::${warehouse}`;
+}
+
+/**
+ * Load the catalog from IndexedDB and bring it up to date.
+ * Full export when nothing is stored yet, otherwise a delta.
+ *
+ * @returns {Promise<{key, version, rows}>}
+ */
+export function syncCatalog(pos_profile, price_list) {
+  price_list = price_list || pos_profile.selling_price_list;
+  const key = catalogKey(price_list, pos_profile.warehouse || "");
+
+  return readRecord(key)
+    .catch(() => null)
+    .then((record) => {
+      if (!record) {
+        return fetchExport(pos_profile, price_list).then((payload) => ({
+          key,
+          version: payload.version,
+          rows: decodeColumns(payload),
+        }));
+      }
+
+      return fetchDelta(pos_profile, price_list, record.version).then((delta) => {
+        if (!delta || (delta.version === record.version && !delta.reset)) {
+          return record;
+        }
+        return {
+          key,
+          version: delta.version,
+          rows: applyDelta(record.rows, delta),
+        };
+      });
+    })
+    .then((record) => {
+      // Storage failures (quota, private mode) only cost the next cold start
+      writeRecord(record).catch(() => { });
+      return record;
+    });
+}
@@ -3,6 +3,13 @@ import { evntBus } from "../../bus";
 import format from "../../format";
 import Customer from "./Customer.vue";
 import { API_MAP } from "../../api_mapper.js";
+import {
+  loadOfferBundle,
+  evaluateOffers,
+  offerTargetsItem,
+  isTransactionOffer,
+  optimizeOffers,
+} from "../../offer_engine.js";
 
 // ===== COMPONENT =====
 export default {
@@ -59,8 +66,15 @@ export default {
 
       // ===== OFFER CACHING (Simple) =====
       _sessionOffers: [],      // All offers from Pos.js
+      _offerBundle: null,      // Today's rule bundle, evaluated locally
+      _offerBundleLoading: false,
       _lastCustomer: null,     // Track customer changes
 
+      // ===== ASYNC SUBMISSION =====
+      _queuedInvoices: {},     // queue_name -> true while not yet processed
+      _queuePollTimer: null,
+      _idempotencyKey: null,   // One per sale, reused when Print is retried
+
       // Table Headers Configuration
       items_headers: [
         {
@@ -454,6 +468,7 @@ export default {
 
     reset_invoice_session() {
       this.resetInvoiceState();
+      this._idempotencyKey = null;
       this.return_doc = null;
       this.invoice_doc = "";
       this.quick_return_value = false;
@@ -477,6 +492,7 @@ export default {
 
     new_invoice(data = {}) {
       evntBus.emit("set_customer_readonly", false);
+      this._idempotencyKey = null;
       this.posa_offers = [];
       this.return_doc = "";
 
@@ -1419,7 +1435,7 @@ export default {
 
       // Find transaction-level offers
       const transactionOffers = offers.filter(o =>
-        ['grand_total', 'customer', 'customer_group', ''].includes(o.offer_type || '') &&
+        isTransactionOffer(o) &&
         o.discount_percentage
       );
 
@@ -1452,17 +1468,7 @@ export default {
         const discountPercent = flt(offer.discount_percentage);
 
         this.items.forEach(item => {
-          let shouldApply = false;
-
-          if (offer.offer_type === 'item_code' && item.item_code === offer.item_code) {
-            shouldApply = true;
-          } else if (offer.offer_type === 'item_group' && item.item_group === offer.item_group) {
-            shouldApply = true;
-          } else if (offer.offer_type === 'brand' && item.brand === offer.brand) {
-            shouldApply = true;
-          }
-
-          if (shouldApply) {
+          if (offerTargetsItem(offer, item)) {
             // Only apply if offer discount is better than current
             if (discountPercent > flt(item.discount_percentage || 0)) {
               item.discount_percentage = discountPercent;
@@ -1556,8 +1562,16 @@ export default {
         return;
       }
 
+      // Today's bundle; the offers list from Pos.js until it is loaded
+      const today = frappe.datetime.nowdate();
+      const bundle = this._offerBundle;
+      if (bundle && bundle.date !== today) {
+        this.load_offer_bundle();
+      }
+      const offers = bundle && bundle.date === today ? bundle.offers : this._sessionOffers;
+
       // Exit if no offers cached
-      if (!this._sessionOffers || this._sessionOffers.length === 0) {
+      if (!offers || offers.length === 0) {
         return;
       }
 
@@ -1567,63 +1581,49 @@ export default {
         return;
       }
 
-      // Calculate totals
-      const totalQty = this.items.reduce((sum, item) => sum + flt(item.qty || 0), 0);
-      const totalAmount = this.items.reduce((sum, item) =>
-        sum + (flt(item.qty || 0) * flt(item.rate || 0)), 0);
-
-      // Filter applicable offers
-      const applicableOffers = this._sessionOffers.filter(offer => {
-        // Check date validity
-        const today = frappe.datetime.nowdate();
-        if (offer.valid_from && today < offer.valid_from) return false;
-        if (offer.valid_upto && today > offer.valid_upto) return false;
-
-        // Check qty thresholds
-        if (offer.min_qty && totalQty < flt(offer.min_qty)) return false;
-        if (offer.max_qty && totalQty > flt(offer.max_qty)) return false;
-
-        // Check amount thresholds
-        if (offer.min_amt && totalAmount < flt(offer.min_amt)) return false;
-        if (offer.max_amt && totalAmount > flt(offer.max_amt)) return false;
-
-        // Check customer match
-        if (offer.offer_type === 'customer' && offer.customer !== this.customer) {
-          return false;
-        }
-
-        // Check customer group match
-        if (offer.offer_type === 'customer_group') {
-          if (!this.customer_info?.customer_group ||
-              this.customer_info.customer_group !== offer.customer_group) {
-            return false;
-          }
-        }
-
-        // Check item-specific applicability
-        if (offer.offer_type === 'item_code') {
-          return this.items.some(item => item.item_code === offer.item_code);
-        }
-
-        if (offer.offer_type === 'item_group') {
-          return this.items.some(item => item.item_group === offer.item_group);
-        }
-
-        if (offer.offer_type === 'brand') {
-          return this.items.some(item => item.brand === offer.brand);
-        }
-
-        return true; // General offer or grand_total offer
+      // Filter applicable offers (same rules as the server re-check at submit)
+      const applicableOffers = evaluateOffers(offers, this.items, {
+        customer: this.customer,
+        customer_group: this.customer_info?.customer_group,
+        date: today,
       });
 
       // Apply offers
       this.applyOffersToInvoice(applicableOffers);
     },
 
+    load_offer_bundle() {
+      if (!this.pos_profile?.name || !this.pos_profile.posa_auto_fetch_offers || this._offerBundleLoading) {
+        return;
+      }
+
+      this._offerBundleLoading = true;
+      loadOfferBundle(this.pos_profile.name, this._offerBundle)
+        .then((bundle) => {
+          this._offerBundleLoading = false;
+          const changed = bundle !== this._offerBundle;
+          this._offerBundle = bundle;
+          if (changed && this.items && this.items.length > 0) {
+            this.calculateAndApplyOffers();
+          }
+        })
+        .catch((error) => {
+          // The offers list from Pos.js keeps being evaluated instead
+          this._offerBundleLoading = false;
+          console.error("Invoice: offer bundle load failed", error);
+        });
+    },
+
     /**
      * Apply filtered offers to invoice
      */
     applyOffersToInvoice(offers) {
+      // Optimizer mode (POS Profile posa_offer_optimizer, via the bundle)
+      if (this._offerBundle?.optimizer) {
+        this.applyOptimizedOffers(offers || []);
+        return;
+      }
+
       if (!offers || offers.length === 0) {
         this.clearOfferDiscounts();
         return;
@@ -1640,7 +1640,7 @@ export default {
       const transactionOffer = sortedOffers.find(offer =>
         offer.auto &&
         offer.discount_percentage &&
-        ['grand_total', 'customer', 'customer_group', ''].includes(offer.offer_type || '')
+        isTransactionOffer(offer)
       );
 
       if (transactionOffer) {
@@ -1663,17 +1663,7 @@ export default {
         if (!offer.auto || !offer.discount_percentage) return;
 
         this.items.forEach(item => {
-          let shouldApply = false;
-
-          if (offer.offer_type === 'item_code' && item.item_code === offer.item_code) {
-            shouldApply = true;
-          } else if (offer.offer_type === 'item_group' && item.item_group === offer.item_group) {
-            shouldApply = true;
-          } else if (offer.offer_type === 'brand' && item.brand === offer.brand) {
-            shouldApply = true;
-          }
-
-          if (shouldApply) {
+          if (offerTargetsItem(offer, item)) {
             const offerDiscount = flt(offer.discount_percentage);
             // Only apply if offer discount is better than current
             if (offerDiscount > flt(item.discount_percentage || 0)) {
@@ -1695,6 +1685,53 @@ export default {
       this.updateInvoiceDocLocally();
     },
 
+    /**
+     * Apply only the best non-conflicting combination of auto offers:
+     * each covered line at its offer's discount, lines no longer covered
+     * back to their list price. All chosen offers are recorded, so the
+     * server can check the combination at submit.
+     */
+    applyOptimizedOffers(offers) {
+      const autoOffers = offers.filter((offer) => offer.auto && flt(offer.discount_percentage));
+      const chosen = optimizeOffers(autoOffers, this.items, this._offerBundle.optimizer).offers;
+
+      const transactionOffer = chosen.find((offer) => isTransactionOffer(offer));
+      if (transactionOffer) {
+        this.additional_discount_percentage = flt(transactionOffer.discount_percentage);
+        this.offer_discount_percentage = flt(transactionOffer.discount_percentage);
+      } else if (this.offer_discount_percentage > 0) {
+        this.additional_discount_percentage = 0;
+        this.offer_discount_percentage = 0;
+      }
+
+      this.posa_offers = chosen.map((offer) => ({
+        offer_name: offer.name,
+        offer_type: offer.offer_type,
+        discount_percentage: offer.discount_percentage,
+        offer_applied: true,
+        row_id: ''
+      }));
+
+      const itemOffers = chosen.filter((offer) => !isTransactionOffer(offer));
+      this.items.forEach((item) => {
+        const offer = itemOffers.find((candidate) => offerTargetsItem(candidate, item));
+        if (!offer && !item.posa_offer_applied) return;
+
+        const offerDiscount = offer ? flt(offer.discount_percentage) : 0;
+        item.discount_percentage = offerDiscount;
+        item.posa_offer_applied = offer ? 1 : 0;
+
+        const list_price = flt(item.price_list_rate) || 0;
+        if (list_price > 0) {
+          const discount_amount = (list_price * offerDiscount) / 100;
+          item.rate = flt(list_price - discount_amount, this.currency_precision);
+          item.amount = this.calculateItemAmount(item);
+        }
+      });
+
+      this.updateInvoiceDocLocally();
+    },
+
     /**
      * Clear offer-based discounts
      */
@@ -1717,6 +1754,13 @@ export default {
       const doc = this.get_invoice_doc("print");
       doc.__islocal = 1;  // Mark as local document (matches ERPNext behavior)
 
+      // Same key on every retry of this sale - the server returns the
+      // invoice already submitted instead of creating a duplicate
+      if (!this._idempotencyKey) {
+        this._idempotencyKey = this.generateRowId();
+      }
+      doc.posa_idempotency_key = this._idempotencyKey;
+
       // Debug: Log important invoice data
       console.log("Invoice.js - printInvoice():", {
         customer: doc.customer,
@@ -1746,29 +1790,33 @@ export default {
       // Send to server for insert + submit (ERPNext native workflow)
       console.log("Invoice.js - Sending to server for create_and_submit_invoice");
       frappe.call({
-        method: "posawesome.posawesome.api.sales_invoice.create_and_submit_invoice",
+        method: API_MAP.SALES_INVOICE.CREATE_AND_SUBMIT,
         args: {
           invoice_doc: doc,
+          async_submit: this.pos_profile?.posa_async_invoice_submit ? 1 : 0,
+          response: "slim",
         },
         callback: (r) => {
           console.log("Invoice.js - Server response:", {
-            success: !!r.message?.name,
-            invoice_name: r.message?.name || "No name"
+            success: !!(r.message?.name || r.message?.queue_name),
+            invoice_name: r.message?.name || r.message?.queue_name || "No name"
           });
 
           evntBus.emit("hide_loading");
 
-          if (r.message?.name) {
-            const print_format = this.pos_profile?.print_format;
-
-            // Open print window directly
-            const print_url = frappe.urllib.get_full_url(
-              `/printview?doctype=Sales%20Invoice&name=${r.message.name}&format=${print_format}&trigger_print=1&no_letterhead=0`
-            );
-
-            window.open(print_url);
+          if (r.message?.queue_name) {
+            // Accepted - ledger posting continues in a background worker
+            this.track_queued_invoice(r.message.queue_name);
+            evntBus.emit("show_mesage", {
+              text: `Invoice queued as ${r.message.queue_name}`,
+              color: "info",
+            });
 
-            evntBus.emit("set_last_invoice", r.message.name);
+            this.reset_invoice_session();
+            evntBus.emit("show_payment", "false");
+            evntBus.emit("invoice_submitted");
+          } else if (r.message?.name) {
+            this.open_invoice_print(r.message.name);
             evntBus.emit("show_mesage", {
               text: `Invoice ${r.message.name} submitted`,
               color: "success",
@@ -1798,6 +1846,65 @@ export default {
       });
     },
 
+    open_invoice_print(invoice_name) {
+      const print_format = this.pos_profile?.print_format;
+
+      // Open print window directly
+      const print_url = frappe.urllib.get_full_url(
+        `/printview?doctype=Sales%20Invoice&name=${invoice_name}&format=${print_format}&trigger_print=1&no_letterhead=0`
+      );
+
+      window.open(print_url);
+
+      evntBus.emit("set_last_invoice", invoice_name);
+    },
+
+    track_queued_invoice(queue_name) {
+      this._queuedInvoices[queue_name] = true;
+      this.schedule_queue_poll();
+    },
+
+    schedule_queue_poll() {
+      // Polling fallback in case the realtime event is missed
+      if (this._queuePollTimer || !Object.keys(this._queuedInvoices).length) {
+        return;
+      }
+
+      this._queuePollTimer = setTimeout(() => {
+        this._queuePollTimer = null;
+        frappe.call({
+          method: API_MAP.SALES_INVOICE.GET_INVOICE_QUEUE_STATUS,
+          args: { queue_names: Object.keys(this._queuedInvoices) },
+          callback: (r) => {
+            (r.message || []).forEach((entry) => this.on_invoice_queue_update(entry));
+            this.schedule_queue_poll();
+          },
+          error: () => this.schedule_queue_poll(),
+        });
+      }, 5000);
+    },
+
+    on_invoice_queue_update(entry) {
+      if (!entry || !this._queuedInvoices[entry.queue_name]) {
+        return;
+      }
+
+      if (entry.status === "Submitted") {
+        delete this._queuedInvoices[entry.queue_name];
+        this.open_invoice_print(entry.sales_invoice);
+        evntBus.emit("show_mesage", {
+          text: `Invoice ${entry.sales_invoice} submitted (${entry.queue_name})`,
+          color: "success",
+        });
+      } else if (entry.status === "Failed") {
+        delete this._queuedInvoices[entry.queue_name];
+        evntBus.emit("show_mesage", {
+          text: `Invoice ${entry.queue_name} failed: ${entry.error || "Unknown error"}`,
+          color: "error",
+        });
+      }
+    },
+
     update_item_detail(item) {
       // Update item details from allItems data when customer changes
       if (!item || !item.item_code || !this.allItems) {
@@ -1893,6 +2000,7 @@ export default {
       this.posOffers = data;
       // ===== CACHE SESSION OFFERS =====
       this._sessionOffers = data || [];
+      this.load_offer_bundle();
       // Recalculate when session offers are loaded/updated
       if (this.items && this.items.length > 0) {
         this.calculateAndApplyOffers();
@@ -1982,6 +2090,10 @@ export default {
     document.addEventListener("keydown", this._boundShortDeleteFirstItem);
     document.addEventListener("keydown", this._boundShortOpenFirstItem);
     document.addEventListener("keydown", this._boundShortSelectDiscount);
+
+    // Results of invoices submitted in the background
+    this._boundInvoiceQueueUpdate = this.on_invoice_queue_update.bind(this);
+    frappe.realtime.on("posa_invoice_queue_update", this._boundInvoiceQueueUpdate);
   },
   beforeUnmount() {
     // Clean up ALL event listeners to prevent memory leaks
@@ -1991,6 +2103,7 @@ export default {
     document.removeEventListener("keydown", this._boundShortDeleteFirstItem);
     document.removeEventListener("keydown", this._boundShortOpenFirstItem);
     document.removeEventListener("keydown", this._boundShortSelectDiscount);
+    frappe.realtime.off("posa_invoice_queue_update", this._boundInvoiceQueueUpdate);
 
     // Clean up event bus listeners
     evntBus.off("register_pos_profile");
@@ -2019,9 +2132,14 @@ export default {
       clearTimeout(this._autoUpdateTimer);
       this._autoUpdateTimer = null;
     }
+    if (this._queuePollTimer) {
+      clearTimeout(this._queuePollTimer);
+      this._queuePollTimer = null;
+    }
 
     // Clear offer cache
     this._sessionOffers = [];
+    this._offerBundle = null;
     this._lastCustomer = null;
   },
   // ===== SECTION 6: WATCH =====
@@ -2,6 +2,7 @@
 import { evntBus } from "../../bus";
 import format from "../../format";
 import { API_MAP } from "../../api_mapper.js";
+import catalogSearch from "../../catalog_search.js";
 
 // Lightweight debounce function (replaces lodash)
 // CRITICAL: Preserve 'this' context for Vue component methods
@@ -39,7 +40,6 @@ const EVENT_NAMES = {
 
 const UI_CONFIG = {
   SEARCH_MIN_LENGTH: 3,
-  MAX_DISPLAYED_ITEMS: 50,
   MIN_PANEL_HEIGHT: 180,
   BOTTOM_PADDING: 16,
   DEBOUNCE_DELAY: 200,
@@ -60,7 +60,8 @@ const BARCODE_TYPES = {
 export default {
   name: "ItemsSelector",
 
-  mixins: [format],
+  // Item list loading / searching: catalog_search.js
+  mixins: [format, catalogSearch],
 
   // ===== DATA =====
   data() {
@@ -77,7 +78,6 @@ export default {
 
       // Items Data
       items_group: ["ALL"],
-      items: [],
 
       // Search State
       search: "",
@@ -104,9 +104,6 @@ export default {
       // Internal Flags
       _suppressCustomerWatcher: false,
       _detailsReady: false,
-
-      // Caching & Performance
-      _itemsMap: new Map(),
     };
   },
 
@@ -125,7 +122,8 @@ export default {
         return;
       }
       if (oldVal !== undefined && newVal !== oldVal) {
-        this.get_items();
+        // One price load per customer, then searches stay local
+        this.load_customer_prices().then(() => this.get_items());
       }
     },
 
@@ -140,25 +138,17 @@ export default {
       this.search = this.get_search(this.first_search);
 
       // Cache expensive operations
-      const groupFilter = this.item_group !== "ALL";
       const hasSearch = this.search && this.search.length >= UI_CONFIG.SEARCH_MIN_LENGTH;
 
       let filtred_list = [];
-      let filtred_group_list = [];
 
-      // Filter by group - cache toLowerCase results
-      if (groupFilter) {
-        const lowerGroup = this.item_group.toLowerCase();
-        filtred_group_list = this.items.filter((item) =>
-          item.item_group.toLowerCase().includes(lowerGroup)
-        );
-      } else {
-        filtred_group_list = this.items;
-      }
+      // Group filtering is done by the server (a parent group includes all
+      // of its descendants, whose names need not contain the parent's name)
+      const filtred_group_list = this.items;
 
       // Filter by search term
       if (!hasSearch) {
-        filtred_list = filtred_group_list.slice(0, UI_CONFIG.MAX_DISPLAYED_ITEMS);
+        filtred_list = filtred_group_list.slice(0, this.display_limit);
       } else {
         // Search in item_code - cache toLowerCase result
         const lowerSearch = this.search.toLowerCase();
@@ -174,7 +164,7 @@ export default {
         }
       }
 
-      return filtred_list.slice(0, UI_CONFIG.MAX_DISPLAYED_ITEMS);
+      return filtred_list.slice(0, this.display_limit);
     },
 
     itemsScrollStyle() {
@@ -247,7 +237,8 @@ export default {
         method: API_MAP.ITEM.GET_BARCODE_ITEM,
         args: {
           pos_profile: this.pos_profile,
-          barcode_value: barcode_value
+          barcode_value: barcode_value,
+          customer: this.customer,
         },
         callback: (response) => {
 
@@ -296,103 +287,6 @@ export default {
       this.get_items();
     },
 
-    get_items() {
-      if (!this.pos_profile) {
-        evntBus.emit("show_mesage", {
-          text: "POS Profile not specified",
-          color: "error",
-        });
-        return;
-      }
-
-      const vm = this;
-      this.loading = true;
-      let search = this.get_search(this.first_search);
-      let gr = "";
-      let sr = "";
-
-      if (search) {
-        sr = search;
-      }
-      if (vm.item_group != "ALL") {
-        gr = vm.item_group.toLowerCase();
-      }
-
-      frappe.call({
-        method: API_MAP.ITEM.GET_ITEMS,
-        args: {
-          pos_profile: vm.pos_profile,
-          price_list: vm.customer_price_list,
-          item_group: gr,
-          search_value: sr,
-          customer: vm.customer,
-        },
-        callback: function (r) {
-          if (r.message) {
-            vm.items = (r.message || []).map((it) => ({
-              item_code: it.item_code,
-              item_name: it.item_name,
-              item_group: it.item_group, // ✅ Added for filtred_items
-              rate: it.rate,
-              price_list_rate: it.price_list_rate,
-              base_rate: it.base_rate,
-              currency: it.currency,
-              actual_qty: it.actual_qty,
-              stock_uom: it.stock_uom,
-              // Empty arrays for compatibility with barcode/batch/serial features
-              item_barcode: [],
-              serial_no_data: [],
-              batch_no_data: [],
-            }));
-            vm._buildItemsMap();
-            evntBus.emit("set_all_items", vm.items);
-            vm.loading = false;
-            vm.search_loading = false;
-            vm.scheduleScrollHeightUpdate();
-          }
-        },
-      });
-    },
-
-    _buildItemsMap() {
-      this._itemsMap.clear();
-
-      this.items.forEach((item) => {
-        // Add search by item_code
-        this._itemsMap.set(item.item_code.toLowerCase(), item);
-
-        // Add search by item_name
-        this._itemsMap.set(item.item_name.toLowerCase(), item);
-      });
-    },
-
-    get_items_groups() {
-      if (!this.pos_profile) {
-        return;
-      }
-
-      if (this.pos_profile.item_groups && this.pos_profile.item_groups.length > 0) {
-        this.pos_profile.item_groups.forEach((element) => {
-          if (element.item_group !== "ALL") {
-            this.items_group.push(element.item_group);
-          }
-        });
-      } else {
-        const vm = this;
-        frappe.call({
-          method: API_MAP.ITEM.GET_ITEMS_GROUPS,
-          args: {},
-          callback: function (r) {
-            if (r.message) {
-              r.message.forEach((element) => {
-                vm.items_group.push(element.name);
-              });
-            }
-          },
-        });
-      }
-    },
-
     getItemsHeaders() {
       const items_headers = [
         {
@@ -450,60 +344,6 @@ export default {
       this.debounce_search = "";
     },
 
-    performLiveSearch(searchValue) {
-      const vm = this;
-
-      // Activate search progress bar
-      this.search_loading = true;
-
-      // If search is empty, reload all items
-      if (!searchValue || searchValue.trim() === "") {
-        this.get_items();
-        return;
-      }
-
-      // Perform live search using get_items
-      frappe.call({
-        method: API_MAP.ITEM.GET_ITEMS,
-        args: {
-          pos_profile: vm.pos_profile,
-          price_list: vm.customer_price_list,
-          item_group:
-            vm.item_group !== "ALL" ? vm.item_group.toLowerCase() : "",
-          search_value: searchValue.trim(),
-          customer: vm.customer,
-        },
-        callback: function (r) {
-          // Stop search progress bar
-          vm.search_loading = false;
-
-          if (r.message) {
-            vm.items = (r.message || []).map((it) => ({
-              ...it,
-              item_group: it.item_group,
-              price_list_rate: it.price_list_rate || it.rate,
-              base_rate: it.base_rate || it.rate,
-              item_barcode: Array.isArray(it.item_barcode)
-                ? it.item_barcode
-                : [],
-              serial_no_data: Array.isArray(it.serial_no_data)
-                ? it.serial_no_data
-                : [],
-              batch_no_data: Array.isArray(it.batch_no_data)
-                ? it.batch_no_data
-                : [],
-            }));
-            vm._buildItemsMap();
-            evntBus.emit("set_all_items", vm.items);
-          }
-        },
-        error: function (err) {
-          // Stop search progress bar
-          vm.search_loading = false;
-        },
-      });
-    },
-
     update_items_details(items) {
       evntBus.emit("update_cur_items_details", items);
     },
@@ -541,6 +381,8 @@ export default {
           : this.customer;
       this.get_items();
       this.get_items_groups();
+      this.subscribe_stock_updates();
+      this.load_catalog();
       this.items_view = this.pos_profile.posa_default_card_view
         ? "card"
         : "list";
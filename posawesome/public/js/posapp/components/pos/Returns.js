@@ -85,7 +85,8 @@ export default {
         method: API_MAP.SALES_INVOICE.GET_INVOICES_FOR_RETURN,
         args: {
           invoice_name: this.invoice_name || '',
-          company: this.company
+          company: this.company,
+          include_items: 0  // Lines are loaded for the selected invoice only
         },
         callback: (r) => {
           this.isLoading = false;
@@ -122,6 +123,19 @@ export default {
       }
     },
 
+    async fetchReturnItems(invoice_name) {
+      try {
+        const response = await frappe.call({
+          method: API_MAP.SALES_INVOICE.GET_RETURN_INVOICE_ITEMS,
+          args: { invoice_name }
+        });
+        return response.message || [];
+      } catch (e) {
+        this.showMessage('Failed to load invoice items', 'error');
+        return [];
+      }
+    },
+
     async fetchOriginalInvoice(invoice_name) {
       try {
         const response = await frappe.call({
@@ -153,8 +167,22 @@ export default {
     },
 
     createReturnInvoiceDoc(return_doc) {
+      // Only what is left to return on each line (returned qty ledger)
+      const returnable_items = return_doc.items
+        .map(item => {
+          const qty = item.returnable_qty ?? Math.abs(item.qty);
+          const ratio = item.qty ? qty / Math.abs(item.qty) : 1;
+          return {
+            ...item,
+            qty,
+            stock_qty: Math.abs(item.stock_qty || item.qty) * ratio,
+            amount: Math.abs(item.amount) * ratio
+          };
+        })
+        .filter(item => item.qty > 0);
+
       return {
-        items: return_doc.items.map(item => ({
+        items: returnable_items.map(item => ({
           ...item,
           qty: Math.abs(item.qty) * -1,
           stock_qty: Math.abs(item.stock_qty || item.qty) * -1,
@@ -192,6 +220,9 @@ export default {
       }
 
       const return_doc = selectedItem;
+      if (!return_doc.items.length) {
+        return_doc.items = await this.fetchReturnItems(return_doc.name);
+      }
       const original_invoice = await this.fetchOriginalInvoice(return_doc.name);
 
       if (!original_invoice) {
@@ -204,6 +235,10 @@ export default {
       }
 
       const invoice_doc = this.createReturnInvoiceDoc(return_doc);
+      if (!invoice_doc.items.length) {
+        this.showMessage('All items of this invoice were already returned', 'info');
+        return;
+      }
 
       // Close dialog first
       this.invoicesDialog = false;
@@ -0,0 +1,344 @@
+// ===== IMPORTS =====
+import { API_MAP } from "./api_mapper.js";
+
+/**
+ * POS Awesome Offer Engine
+ *
+ * Evaluates the profile's offer bundle (offer_index.get_offer_bundle) in the
+ * browser with the same rules as the server's offer index /
+ * check_offer_applicable_for_data, so cart changes need no round trip.
+ * The server re-verifies the applied offers once at submit.
+ *
+ * optimizeOffers is the browser port of offer_optimizer.optimize_offers,
+ * used when the profile's bundle carries an optimizer budget.
+ */
+
+const ITEM_OFFER_TYPES = ["item_code", "item_group", "brand"];
+const TRANSACTION_OFFER_TYPES = ["grand_total", "customer", "customer_group", ""];
+
+// Optimizer defaults (site config overrides arrive in the bundle)
+const DEFAULT_TIME_BUDGET_MS = 5;
+const DEFAULT_NODE_BUDGET = 20000;
+// Nodes between two clock reads
+const CLOCK_CHECK_INTERVAL = 64;
+// Values closer than this are ties
+const EPSILON = 1e-9;
+
+function num(value) {
+  const parsed = parseFloat(value);
+  return isNaN(parsed) ? 0 : parsed;
+}
+
+// ===== SERVER =====
+/**
+ * Fetch the bundle, or keep `current` when the server says it is unchanged.
+ *
+ * @returns {Promise<{version, date, enabled, offers}>}
+ */
+export function loadOfferBundle(pos_profile, current) {
+  return new Promise((resolve, reject) => {
+    frappe.call({
+      method: API_MAP.POS_OFFER.GET_OFFER_BUNDLE,
+      args: { pos_profile, version: current?.version || null },
+      callback: (r) => {
+        const bundle = r.message;
+        if (!bundle) {
+          reject(new Error("Empty offer bundle"));
+        } else if (bundle.unchanged && current) {
+          resolve(current);
+        } else {
+          resolve(decodeOfferBundle(bundle));
+        }
+      },
+      error: reject,
+    });
+  });
+}
+
+export function decodeOfferBundle(bundle) {
+  const { fields, offers } = bundle;
+  return {
+    version: bundle.version,
+    date: bundle.date,
+    enabled: !!bundle.enabled,
+    optimizer: bundle.optimizer || null,
+    offers: offers.map((row) => {
+      const offer = {};
+      fields.forEach((field, i) => {
+        offer[field] = row[i];
+      });
+      return offer;
+    }),
+  };
+}
+
+// ===== EVALUATION =====
+/**
+ * Totals and trigger keys of a cart.
+ */
+export function summarizeCart(items) {
+  const summary = {
+    total_qty: 0,
+    total_amount: 0,
+    item_code: new Set(),
+    item_group: new Set(),
+    brand: new Set(),
+  };
+
+  (items || []).forEach((item) => {
+    const qty = num(item.qty);
+    summary.total_qty += qty;
+    summary.total_amount += qty * num(item.rate);
+    ITEM_OFFER_TYPES.forEach((field) => {
+      if (item[field]) summary[field].add(item[field]);
+    });
+  });
+  return summary;
+}
+
+/**
+ * Whether an offer applies to a cart summary. Empty / 0 bounds are no limit.
+ *
+ * @param {Object} context - {customer, customer_group, date}; date only
+ *   matters for offer lists that carry valid_from / valid_upto
+ */
+export function isOfferApplicable(offer, summary, context = {}) {
+  if (context.date) {
+    if (offer.valid_from && context.date < offer.valid_from) return false;
+    if (offer.valid_upto && context.date > offer.valid_upto) return false;
+  }
+
+  if (offer.min_qty && summary.total_qty < num(offer.min_qty)) return false;
+  if (offer.max_qty && summary.total_qty > num(offer.max_qty)) return false;
+  if (offer.min_amt && summary.total_amount < num(offer.min_amt)) return false;
+  if (offer.max_amt && summary.total_amount > num(offer.max_amt)) return false;
+
+  const offer_type = offer.offer_type || "";
+  if (offer_type === "" || offer_type === "grand_total") return true;
+  if (ITEM_OFFER_TYPES.includes(offer_type)) {
+    return !!offer[offer_type] && summary[offer_type].has(offer[offer_type]);
+  }
+  if (offer_type === "customer") {
+    return !!offer.customer && offer.customer === context.customer;
+  }
+  if (offer_type === "customer_group") {
+    return !!offer.customer_group && offer.customer_group === context.customer_group;
+  }
+  return false;
+}
+
+/**
+ * Applicable offers for a cart, in the order of `offers`.
+ */
+export function evaluateOffers(offers, items, context = {}) {
+  const summary = summarizeCart(items);
+  return (offers || []).filter((offer) => isOfferApplicable(offer, summary, context));
+}
+
+// ===== APPLICATION =====
+/**
+ * Whether an item-level offer discounts this cart line (apply_offer_by_type).
+ */
+export function offerTargetsItem(offer, item) {
+  const offer_type = offer.offer_type;
+  return (
+    ITEM_OFFER_TYPES.includes(offer_type) &&
+    !!offer[offer_type] &&
+    item[offer_type] === offer[offer_type]
+  );
+}
+
+/**
+ * Whether an offer discounts the whole invoice (apply_offer_by_type).
+ */
+export function isTransactionOffer(offer) {
+  return TRANSACTION_OFFER_TYPES.includes(offer.offer_type || "");
+}
+
+// ===== OPTIMIZER =====
+/**
+ * Best non-conflicting combination of applicable offers: item-level offers
+ * covering a common line conflict, transaction-level offers all conflict.
+ * Same search as the server (memoized branch-and-bound per conflict group,
+ * seeded with the greedy pick), so an exhausted budget still returns a
+ * valid, never-worse-than-greedy selection.
+ *
+ * @param {Array} offers - applicable offers
+ * @param {Array} items - cart lines (qty, price_list_rate / rate, trigger fields)
+ * @param {Object} budget - {time_ms, max_nodes} from the bundle
+ * @returns {{offers, discount, nodes, complete}} offers in their original order
+ */
+export function optimizeOffers(offers, items, budget = {}) {
+  const search = {
+    deadline: performance.now() + num(budget?.time_ms ?? DEFAULT_TIME_BUDGET_MS),
+    max_nodes: Math.max(parseInt(budget?.max_nodes ?? DEFAULT_NODE_BUDGET, 10) || 0, 1),
+    nodes: 0,
+    exhausted: false,
+  };
+
+  const lines = items || [];
+  const amounts = lines.map((item) => num(item.qty) * num(item.price_list_rate || item.rate));
+
+  // offer_type -> trigger value -> line indexes
+  const linesByKey = {};
+  ITEM_OFFER_TYPES.forEach((offer_type) => {
+    linesByKey[offer_type] = new Map();
+  });
+  lines.forEach((item, index) => {
+    ITEM_OFFER_TYPES.forEach((offer_type) => {
+      const value = item[offer_type];
+      if (!value) return;
+      if (!linesByKey[offer_type].has(value)) linesByKey[offer_type].set(value, []);
+      linesByKey[offer_type].get(value).push(index);
+    });
+  });
+
+  const itemOffers = [];
+  const transactionOffers = [];
+  (offers || []).forEach((offer, position) => {
+    const percentage = num(offer.discount_percentage);
+    if (!percentage) return;
+
+    if (ITEM_OFFER_TYPES.includes(offer.offer_type)) {
+      const offerLines = linesByKey[offer.offer_type].get(offer[offer.offer_type]) || [];
+      const value = offerLines.reduce((sum, index) => sum + amounts[index], 0) * percentage / 100;
+      if (value > EPSILON) itemOffers.push({ position, lines: offerLines, value });
+    } else if (isTransactionOffer(offer)) {
+      transactionOffers.push(position);
+    }
+  });
+
+  const chosen = [];
+  let itemDiscount = 0;
+  conflictGroups(itemOffers).forEach((group) => {
+    const { value, positions } = solveGroup(group, search);
+    itemDiscount += value;
+    chosen.push(...positions);
+  });
+
+  // Transaction discount applies after item discounts: the highest
+  // percentage completes the optimum (see optimize_offers)
+  let transactionDiscount = 0;
+  if (transactionOffers.length) {
+    const best = transactionOffers.reduce((current, position) =>
+      num(offers[position].discount_percentage) > num(offers[current].discount_percentage) ? position : current
+    );
+    chosen.push(best);
+    const total = amounts.reduce((sum, amount) => sum + amount, 0);
+    transactionDiscount = (total - itemDiscount) * num(offers[best].discount_percentage) / 100;
+  }
+
+  return {
+    offers: chosen.sort((a, b) => a - b).map((position) => offers[position]),
+    discount: itemDiscount + transactionDiscount,
+    nodes: search.nodes,
+    complete: !search.exhausted,
+  };
+}
+
+function tick(search) {
+  search.nodes += 1;
+  if (search.nodes >= search.max_nodes) {
+    search.exhausted = true;
+  } else if (search.nodes % CLOCK_CHECK_INTERVAL === 0 && performance.now() >= search.deadline) {
+    search.exhausted = true;
+  }
+  return !search.exhausted;
+}
+
+/**
+ * Split {position, lines, value} entries into groups connected by shared lines.
+ */
+function conflictGroups(itemOffers) {
+  const parent = itemOffers.map((_entry, index) => index);
+  const find = (index) => {
+    while (parent[index] !== index) {
+      parent[index] = parent[parent[index]];
+      index = parent[index];
+    }
+    return index;
+  };
+
+  const owner = new Map();
+  itemOffers.forEach((entry, index) => {
+    entry.lines.forEach((line) => {
+      if (owner.has(line)) {
+        parent[find(index)] = find(owner.get(line));
+      } else {
+        owner.set(line, index);
+      }
+    });
+  });
+
+  const groups = new Map();
+  itemOffers.forEach((entry, index) => {
+    const root = find(index);
+    if (!groups.has(root)) groups.set(root, []);
+    groups.get(root).push(entry);
+  });
+  return [...groups.values()];
+}
+
+/**
+ * Max-value subset of a conflict group with pairwise disjoint lines
+ * (_solve_group): depth-first, "take" before "skip", pruned on the
+ * remaining value bound, memoized on (depth, lines used). Line sets are
+ * BigInt masks, so carts of any size fit.
+ */
+function solveGroup(group, search) {
+  if (group.length === 1) {
+    return { value: group[0].value, positions: [group[0].position] };
+  }
+
+  group = [...group].sort((a, b) => b.value - a.value || a.position - b.position);
+  const lineBits = new Map();
+  const masks = group.map((entry) =>
+    entry.lines.reduce((mask, line) => {
+      if (!lineBits.has(line)) lineBits.set(line, BigInt(lineBits.size));
+      return mask | (1n << lineBits.get(line));
+    }, 0n)
+  );
+  const values = group.map((entry) => entry.value);
+
+  const remaining = new Array(group.length + 1).fill(0);
+  for (let index = group.length - 1; index >= 0; index--) {
+    remaining[index] = remaining[index + 1] + values[index];
+  }
+
+  // Greedy seed: the answer when the budget is already spent
+  let bestValue = 0;
+  let bestTaken = [];
+  let seedUsed = 0n;
+  masks.forEach((mask, index) => {
+    if (!(seedUsed & mask)) {
+      seedUsed |= mask;
+      bestValue += values[index];
+      bestTaken.push(index);
+    }
+  });
+
+  const memo = new Map();
+  const stack = [[0, 0n, 0, []]];
+  while (stack.length && tick(search)) {
+    const [depth, used, value, taken] = stack.pop();
+
+    if (value > bestValue + EPSILON) {
+      bestValue = value;
+      bestTaken = taken;
+    }
+
+    if (depth === group.length || value + remaining[depth] <= bestValue + EPSILON) continue;
+
+    const key = `${depth}:${used.toString(36)}`;
+    if ((memo.get(key) ?? -1) >= value) continue;
+    memo.set(key, value);
+
+    // LIFO: "take" is explored first
+    stack.push([depth + 1, used, value, taken]);
+    if (!(used & masks[depth])) {
+      stack.push([depth + 1, used | masks[depth], value + values[depth], [...taken, depth]]);
+    }
+  }
+
+  return { value: bestValue, positions: bestTaken.map((index) => group[index].position) };
+}